@@ -0,0 +1,151 @@
+"""
+eBanking Metrics Exporter - asyncio engine with independent producers
+
+Each subsystem is its own producer coroutine on one asyncio event loop:
+
+- event producers (transactions, API requests, logins, ...) have a rate in
+  events/s. On each wake they draw Poisson(rate x elapsed) events and apply
+  them through the vectorized BatchEngine subsystem methods. They wake every
+  1/rate seconds, bounded to [min_interval, max_interval], so a 1 kHz producer
+  handles ~50 events per wake at the default 50 ms instead of waking 1000
+  times per second.
+- gauge producers (balances, accounts, sessions, connections, business) set
+  their gauges every `interval` seconds and cost nothing in between.
+
+Producers are scheduled on absolute deadlines (no drift). When the loop falls
+behind, the elapsed time still drives the event count, so rates hold. By
+default the event rates split TARGET_EVENT_RATE like the batch engine's mix.
+PRODUCER_RATES overrides them per producer, e.g.
+"transactions=1000,api_requests=400,balances=30s": a plain number is events/s,
+and a number with an `s` suffix is an interval in seconds.
+"""
+
+import asyncio
+import logging
+
+from batch_engine import BatchEngine
+from observability_common.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# Event producers: name -> BatchEngine method taking an event count
+EVENT_PRODUCERS = ('transactions', 'api_requests', 'logins', 'sessions', 'errors', 'fraud', 'db_queries')
+
+# Gauge producers: name -> default interval in seconds
+GAUGE_PRODUCERS = {
+    'active_sessions': 5.0,
+    'db_connections': 5.0,
+    'business': 15.0,
+    'balances': 30.0,
+    'accounts': 30.0,
+}
+
+# Gauge producers replaced by metrics.ScrapeTimeGauges when gauges are computed at scrape time
+SCRAPE_TIME_PRODUCERS = ('db_connections', 'business', 'balances', 'accounts')
+
+
+def parse_rates(spec: str) -> dict:
+    """Parse PRODUCER_RATES into {name: events/s}; an interval of N s is a rate of 1/N"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, value = item.partition('=')
+        name, value = name.strip(), value.strip()
+        if name not in EVENT_PRODUCERS and name not in GAUGE_PRODUCERS:
+            raise ValueError(f"Unknown producer '{name}', expected one of "
+                             f"{list(EVENT_PRODUCERS) + list(GAUGE_PRODUCERS)}")
+        if value.endswith('s'):
+            interval = float(value[:-1])
+            if interval == 0:
+                raise ValueError(f"Producer '{name}': interval must be > 0")
+            rate = 1.0 / interval
+        else:
+            rate = float(value)
+        if rate < 0:
+            raise ValueError(f"Producer '{name}': rate must be >= 0")
+        rates[name] = rate
+    return rates
+
+
+class AsyncEngine:
+    def __init__(self, environment: str, target_rate: float, rates: dict = None, min_interval: float = 0.05,
+                 max_interval: float = 5.0, seed=None, gauges: bool = True, instance_labels: tuple = ()):
+        self.batch = BatchEngine(environment, target_rate, seed=seed, gauges=gauges, instance_labels=instance_labels)
+        self.environment = environment
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        mix, total = self.batch._mix, self.batch._events_per_iteration
+        self.rates = {name: target_rate * mix[name] / total for name in EVENT_PRODUCERS}
+        self.rates.update({name: 1.0 / interval for name, interval in GAUGE_PRODUCERS.items()})
+        self.rates.update(rates or {})
+        if not gauges:
+            self.rates.update(dict.fromkeys(SCRAPE_TIME_PRODUCERS, 0.0))
+        self.events = dict.fromkeys(EVENT_PRODUCERS, 0)
+
+    def _interval(self, rate: float) -> float:
+        return min(max(1.0 / rate, self.min_interval), self.max_interval)
+
+    async def _events(self, name: str, trace: bool):
+        loop = asyncio.get_running_loop()
+        rate = self.rates[name]
+        produce = getattr(self.batch, name)
+        rng = self.batch.rng
+        interval = self._interval(rate)
+        last = deadline = loop.time()
+        while True:
+            deadline += interval
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            now = loop.time()
+            if now - deadline > interval:
+                # Falling behind: skip missed wakes, the elapsed time below still counts them
+                deadline = now
+            k = int(rng.poisson(rate * (now - last)))
+            last = now
+            try:
+                if trace:
+                    with start_span(f'ebanking.{name}', attributes={'events': k}):
+                        produce(k)
+                else:
+                    produce(k)
+                self.events[name] += k
+            except Exception as e:
+                logger.error(f"Error in {name} producer: {e}")
+
+    async def _gauges(self, name: str):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.rates[name]
+        produce = getattr(self.batch, name)
+        step = 0
+        deadline = loop.time()
+        while True:
+            try:
+                if name == 'active_sessions':
+                    # 24-step daily curve, like the other engines
+                    produce(step)
+                else:
+                    produce()
+            except Exception as e:
+                logger.error(f"Error in {name} producer: {e}")
+            step += 1
+            deadline += interval
+            if deadline < loop.time():
+                deadline = loop.time()
+            await asyncio.sleep(deadline - loop.time())
+
+    async def run(self, trace: bool = False, log_interval: float = 60.0):
+        """Run every producer with a non-zero rate forever"""
+        logger.info(f"Starting async engine for {self.environment} environment")
+        logger.info(self.batch.profile['banner'])
+        tasks = []
+        for name, rate in self.rates.items():
+            if rate <= 0:
+                logger.info(f"  {name:<16} disabled")
+                continue
+            if name in EVENT_PRODUCERS:
+                logger.info(f"  {name:<16} {rate:>10.2f} events/s, wake every {self._interval(rate):.3f}s")
+                tasks.append(asyncio.create_task(self._events(name, trace), name=name))
+            else:
+                logger.info(f"  {name:<16} every {1.0 / rate:.1f}s")
+                tasks.append(asyncio.create_task(self._gauges(name), name=name))
+        while True:
+            await asyncio.sleep(log_interval)
+            logger.info("Async engine running... " + ", ".join(f"{n}={c}" for n, c in self.events.items()))
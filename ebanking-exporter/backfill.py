@@ -0,0 +1,224 @@
+"""
+eBanking Metrics Exporter - historical backfill as OpenMetrics files
+
+Generates days or months of exporter history offline, for dashboards and alert
+rules that look back 30/90 days, then loads it with promtool:
+
+    python backfill.py --days 90 --out backfill/ebanking --workers 8
+    for f in backfill/ebanking/*.om; do
+        promtool tsdb create-blocks-from openmetrics "$f" /prometheus
+    done
+
+Each shard of the range (--shard-hours, 24 by default) is simulated by the
+batch engine, ticked every --step seconds at the loop engine's event rate (or
+--rate events/s), with active sessions following the time of day. Shards run
+in parallel in a process pool and each one writes its own file, in two passes:
+
+1. every shard simulates its ticks into a values matrix (one column per
+   sample: counter, gauge, histogram bucket/count/sum) saved next to the
+   output, and returns its final counter totals;
+2. every shard adds the totals of all earlier shards to its cumulative columns,
+   so counters never reset at a shard boundary, and formats its file.
+
+Shards are seeded with --seed + shard number: the same arguments give the
+same data, whatever the number of workers. Samples carry the scrape labels of a live exporter (--labels,
+job and instance by default); Prometheus refuses samples older than its
+retention, so keep --days below --storage.tsdb.retention.time.
+"""
+
+import argparse
+import itertools
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from prometheus_client.utils import floatToGoString
+
+import metrics
+from batch_engine import BatchEngine
+from metrics import BoundChildren
+from profiles import ENVIRONMENT_PROFILES
+from recording import series_table
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LABELS = 'job=ebanking-exporter,instance=ebanking_metrics_exporter:9200'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(pairs) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+
+class Layout:
+    """Columns of the values matrix: one per exposed sample, grouped by metric family and child"""
+
+    def __init__(self, children, extra_labels=()):
+        self.families = []  # (metric, [(child, label pairs)])
+        for name, child in series_table(children):
+            metric = getattr(metrics, name.partition('[')[0])
+            if not self.families or self.families[-1][0] is not metric:
+                self.families.append((metric, []))
+            labelvalues = next(values for values, c in metric._metrics.items() if c is child)
+            pairs = (*zip(metric._labelnames, labelvalues), *extra_labels)
+            self.families[-1][1].append((child, pairs))
+        self.columns = sum(self._width(metric) for metric, children in self.families for _ in children)
+        # Counters, histogram buckets, counts and sums only grow
+        self.cumulative = np.concatenate([
+            np.full(self._width(metric), metric._type != 'gauge')
+            for metric, children in self.families for _ in children
+        ])
+
+    @staticmethod
+    def _width(metric) -> int:
+        return len(metric._upper_bounds) + 2 if metric._type == 'histogram' else 1
+
+    def snapshot(self) -> list:
+        """Current value of every column"""
+        values = []
+        for metric, children in self.families:
+            if metric._type == 'histogram':
+                for child, _ in children:
+                    buckets = list(itertools.accumulate(bucket.get() for bucket in child._buckets))
+                    values += buckets
+                    values.append(buckets[-1])
+                    values.append(child._sum.get())
+            else:
+                values += [child._value.get() for child, _ in children]
+        return values
+
+    def write(self, f, values: np.ndarray, timestamps: list):
+        """Write a (ticks x columns) matrix, series by series in time order"""
+        column = 0
+        for metric, children in self.families:
+            name = metric._name
+            f.write(f'# HELP {name} {metric._documentation}\n# TYPE {name} {metric._type}\n')
+            if metric._type == 'histogram':
+                bounds = [floatToGoString(bound) for bound in metric._upper_bounds]
+                for _, pairs in children:
+                    prefixes = [f'{name}_bucket{_labels((*pairs, ("le", le)))} ' for le in bounds]
+                    prefixes += [f'{name}_count{_labels(pairs)} ', f'{name}_sum{_labels(pairs)} ']
+                    width = len(prefixes)
+                    # One histogram point (buckets, count, sum) per timestamp
+                    for row, ts in zip(values[:, column:column + width].tolist(), timestamps):
+                        f.write(''.join(f'{prefix}{value} {ts}\n' for prefix, value in zip(prefixes, row)))
+                    column += width
+            else:
+                sample = f'{name}_total' if metric._type == 'counter' else name
+                for _, pairs in children:
+                    prefix = f'{sample}{_labels(pairs)} '
+                    f.write(''.join(f'{prefix}{value} {ts}\n'
+                                    for value, ts in zip(values[:, column].tolist(), timestamps)))
+                    column += 1
+        f.write('# EOF\n')
+
+
+def _engine(environment: str, rate: float, seed: int) -> BatchEngine:
+    engine = BatchEngine(environment, 0.0, seed=seed)
+    # Default: the loop engine's rate, one simulate_iteration() every 1.25 s on average
+    engine.target_rate = rate or engine._events_per_iteration / 1.25
+    return engine
+
+
+def simulate_shard(shard: int, start: int, ticks: int, args) -> tuple:
+    """Pass 1: simulate one shard into <out>/shard-<n>.npy; (shard, events, final totals)"""
+    engine = _engine(args.environment, args.rate, args.seed + shard)
+    layout = Layout(engine.children)
+    # Metric children are process-wide: start from whatever earlier shards of this worker left
+    baseline = np.array(layout.snapshot())
+    values = np.empty((ticks, layout.columns))
+    events = 0
+    for i in range(ticks):
+        events += engine.tick(args.step)
+        engine.active_sessions(datetime.fromtimestamp(start + i * args.step, timezone.utc).hour)
+        values[i] = layout.snapshot()
+    values[:, layout.cumulative] -= baseline[layout.cumulative]
+    np.save(os.path.join(args.out, f'shard-{shard}.npy'), values)
+    return shard, events, values[-1] * layout.cumulative
+
+
+def write_shard(shard: int, start: int, ticks: int, offsets: np.ndarray, args) -> tuple:
+    """Pass 2: add the earlier shards' totals and write <out>/ebanking-<start>.om; (path, bytes)"""
+    layout = Layout(BoundChildren(args.environment), args.labels)
+    matrix = os.path.join(args.out, f'shard-{shard}.npy')
+    values = np.load(matrix) + offsets
+    os.remove(matrix)
+    timestamps = [start + i * args.step for i in range(ticks)]
+    path = os.path.join(args.out, f"ebanking-{datetime.fromtimestamp(start, timezone.utc):%Y%m%dT%H%M}.om")
+    with open(path, 'w', buffering=1 << 20) as f:
+        layout.write(f, values, timestamps)
+    return path, os.path.getsize(path)
+
+
+def parse_labels(spec: str) -> tuple:
+    """"job=ebanking-exporter,instance=host:9200" -> (("job", "ebanking-exporter"), ("instance", "host:9200"))"""
+    pairs = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, sep, value = item.partition('=')
+        if not sep or not name.strip():
+            raise ValueError(f"Invalid label '{item}', expected name=value")
+        pairs.append((name.strip(), value.strip()))
+    return tuple(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=float, default=30, help='length of the backfilled range')
+    parser.add_argument('--end', default=None, help='end of the range, ISO 8601 UTC (default: now, hour aligned)')
+    parser.add_argument('--environment', default=os.getenv('ENVIRONMENT', 'training'),
+                        choices=list(ENVIRONMENT_PROFILES))
+    parser.add_argument('--rate', type=float, default=0.0, help="events/s (default: the loop engine's rate)")
+    parser.add_argument('--step', type=int, default=60, help='seconds between samples (the scrape interval)')
+    parser.add_argument('--shard-hours', type=int, default=24, help='hours per shard and output file')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--labels', default=DEFAULT_LABELS, help='labels added to every sample')
+    parser.add_argument('--out', default='backfill')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if metrics.NATIVE_HISTOGRAMS:
+        parser.error('native histograms cannot be backfilled from OpenMetrics text, unset NATIVE_HISTOGRAMS')
+    if metrics.INSTANCE_LABELS:
+        parser.error('backfill simulates a single instance, unset INSTANCES_CONFIG and use --labels')
+    if args.step <= 0 or (args.shard_hours * 3600) % args.step:
+        parser.error('--step must divide --shard-hours')
+    args.labels = parse_labels(args.labels)
+    if args.seed is None:
+        args.seed = random.randrange(2 ** 31)
+        logger.info(f"Seed {args.seed} (pass --seed {args.seed} to regenerate the same files)")
+
+    end = datetime.fromisoformat(args.end) if args.end else datetime.now(timezone.utc)
+    end = (end if end.tzinfo else end.replace(tzinfo=timezone.utc)).replace(minute=0, second=0, microsecond=0)
+    shard_seconds = args.shard_hours * 3600
+    shards = max(1, round(args.days * 24 / args.shard_hours))
+    first = int((end - timedelta(seconds=shards * shard_seconds)).timestamp())
+    starts = [first + shard * shard_seconds for shard in range(shards)]
+    ticks = shard_seconds // args.step
+    os.makedirs(args.out, exist_ok=True)
+    logger.info(f"Backfilling {args.environment}: {shards} shards of {args.shard_hours}h from "
+                f"{datetime.fromtimestamp(first, timezone.utc):%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} UTC, "
+                f"{ticks} samples per series and shard, {args.workers} workers")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = sorted(pool.map(simulate_shard, range(shards), starts, [ticks] * shards, [args] * shards))
+        events = sum(shard_events for _, shard_events, _ in results)
+        offsets = list(itertools.accumulate((totals for _, _, totals in results[:-1]),
+                                            initial=np.zeros_like(results[0][2])))
+        simulated = time.perf_counter()
+        logger.info(f"Simulated {events:,} events in {simulated - started:.1f}s")
+        files = list(pool.map(write_shard, range(shards), starts, [ticks] * shards, offsets, [args] * shards))
+    size = sum(file_size for _, file_size in files)
+    logger.info(f"Wrote {len(files)} files ({size / 1e6:,.1f} MB) to {args.out} in {time.perf_counter() - simulated:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,293 @@
+"""
+eBanking Metrics Exporter - Vectorized batch engine
+
+Instead of drawing events one at a time, each tick draws all of its events at
+once with NumPy (Poisson event counts, categorical label draws, amount and
+duration distributions), pre-aggregates them per label set and applies a single
+inc(n) / bulk observation per series, resolved through the pre-bound
+BoundChildren tables. The event mix and distributions match simulate_iteration()
+in main.py; only the volume is set by a target event rate.
+"""
+
+import logging
+import time
+
+import numpy as np
+
+from metrics import BoundChildren, NATIVE_HISTOGRAMS, NATIVE_HISTOGRAM_SCHEMA
+from observability_common.tracing import start_span
+from profiles import (
+    TRANSACTION_TYPES, STATUSES, CHANNELS, CURRENCIES, ACCOUNT_TYPES, ENDPOINTS, METHODS,
+    STATUS_CODES, STATUS_CODE_WEIGHTS, LOGIN_STATUSES, LOGIN_STATUS_WEIGHTS, LOGIN_METHODS,
+    LOGIN_FAILURE_REASONS, ERROR_TYPES, FRAUD_TYPES, SEVERITIES, DB_POOLS, QUERY_TYPES,
+    WITHDRAWAL_AMOUNTS, get_environment_profile
+)
+
+logger = logging.getLogger(__name__)
+
+# Per-type amount ranges (uniform), withdrawals use WITHDRAWAL_AMOUNTS instead
+_AMOUNT_LOW = np.array([10, 10, 0, 10, 20], dtype=float)
+_AMOUNT_HIGH = np.array([10000, 5000, 0, 5000, 500], dtype=float)
+_WITHDRAWAL = TRANSACTION_TYPES.index('withdrawal')
+_GET = METHODS.index('GET')
+_FAILED_LOGIN = LOGIN_STATUSES.index('failed')
+
+
+def _probabilities(weights) -> np.ndarray:
+    p = np.asarray(weights, dtype=float)
+    return p / p.sum()
+
+
+def observe_many(child, bucket_counts, total: float):
+    """Bulk Histogram.observe(): add per-bucket (non-cumulative) counts and their sum
+
+    Writes the child's internals (_sum, _buckets) as of the prometheus-client
+    pinned in requirements.txt; tests/test_batch_engine.py checks the result
+    against observe().
+    """
+    child._sum.inc(float(total))
+    for i in np.flatnonzero(bucket_counts):
+        child._buckets[i].inc(int(bucket_counts[i]))
+
+
+class BatchEngine:
+    """Generates TARGET_EVENT_RATE events/s in ticks of `tick_interval` seconds"""
+
+    def __init__(self, environment: str, target_rate: float, tick_interval: float = 1.0, seed=None,
+                 gauges: bool = True, instance_labels: tuple = ()):
+        self.environment = environment
+        self.profile = get_environment_profile(environment)
+        self.target_rate = target_rate
+        self.tick_interval = tick_interval
+        self.rng = np.random.default_rng(seed)
+        self.iteration = 0
+        self.children = BoundChildren(environment, instance_labels)
+        self.gauges = gauges  # False: slow-changing gauges come from metrics.ScrapeTimeGauges
+
+        p = self.profile
+        self._status_p = _probabilities(p['success_rate_weights'])
+        self._code_p = _probabilities(STATUS_CODE_WEIGHTS)
+        self._login_p = _probabilities(LOGIN_STATUS_WEIGHTS)
+        self._error_severity_p = _probabilities(p['error_severity_weights'])
+        self._fraud_severity_p = _probabilities(p['fraud_severity_weights'])
+
+        # Mean events per simulate_iteration(), used to split the target rate
+        self._mix = {
+            'transactions': 3.5 * p['transaction_multiplier'],
+            'sessions': 1.0,
+            'api_requests': 5.5,
+            'logins': 1.0,
+            'errors': p['error_rate'],
+            'fraud': p['fraud_rate'],
+            'db_queries': float(len(QUERY_TYPES)),
+        }
+        self._events_per_iteration = sum(self._mix.values())
+
+        # Flat child lists for grouped histogram updates, upper bounds for np.searchsorted
+        c = self.children
+        self._request_children = [child for by_method in c.request_duration for child in by_method]
+        self._amount_bounds = np.array(c.transaction_amount[0]._upper_bounds)
+        self._request_bounds = None if NATIVE_HISTOGRAMS else np.array(c.request_duration[0][0]._upper_bounds)
+        self._session_bounds = np.array(c.session_duration._upper_bounds)
+        self._query_bounds = np.array(c.database_query_duration[0]._upper_bounds)
+
+    # ============================================
+    # Helpers
+    # ============================================
+
+    def _counts(self, codes: np.ndarray, size: int) -> np.ndarray:
+        return np.bincount(codes, minlength=size)
+
+    def _observe_grouped(self, children, groups, values, bounds):
+        """Bucket `values` per group and apply one bulk observation per non-empty group"""
+        n_buckets = len(bounds)
+        buckets = np.searchsorted(bounds, values, side='left')
+        counts = np.bincount(groups * n_buckets + buckets, minlength=len(children) * n_buckets)
+        counts = counts.reshape(len(children), n_buckets)
+        sums = np.bincount(groups, weights=values, minlength=len(children))
+        for g in np.flatnonzero(counts.sum(axis=1)):
+            observe_many(children[g], counts[g], sums[g])
+
+    def _observe_native(self, children, groups, values):
+        """_observe_grouped for native histograms: exponential bucket indices instead of fixed bounds"""
+        keys = np.ceil(np.log2(values) * 2.0 ** NATIVE_HISTOGRAM_SCHEMA).astype(np.int64)
+        lowest = keys.min()
+        width = int(keys.max() - lowest) + 1
+        pairs, counts = np.unique(groups * width + (keys - lowest), return_counts=True)
+        pair_groups, pair_keys = np.divmod(pairs, width)
+        sums = np.bincount(groups, weights=values, minlength=len(children))
+        starts = np.flatnonzero(np.diff(pair_groups)) + 1
+        for g, k, n in zip(np.split(pair_groups, starts), np.split(pair_keys, starts), np.split(counts, starts)):
+            children[int(g[0])].observe_buckets(k + lowest, n, sums[g[0]], NATIVE_HISTOGRAM_SCHEMA)
+
+    # ============================================
+    # Subsystems (also driven one by one by async_engine.py)
+    # ============================================
+
+    def transactions(self, k: int):
+        """Type x status x channel counters, amount histogram per type"""
+        if not k:
+            return
+        rng, c = self.rng, self.children
+        types = rng.integers(0, len(TRANSACTION_TYPES), k)
+        statuses = rng.choice(len(STATUSES), k, p=self._status_p)
+        channels = rng.integers(0, len(CHANNELS), k)
+        combo = (types * len(STATUSES) + statuses) * len(CHANNELS) + channels
+        counts = self._counts(combo, len(TRANSACTION_TYPES) * len(STATUSES) * len(CHANNELS))
+        for code in np.flatnonzero(counts):
+            t, rest = divmod(int(code), len(STATUSES) * len(CHANNELS))
+            s, ch = divmod(rest, len(CHANNELS))
+            c.transactions_processed[t][s][ch].inc(int(counts[code]))
+
+        amounts = rng.uniform(_AMOUNT_LOW[types], _AMOUNT_HIGH[types])
+        withdrawals = types == _WITHDRAWAL
+        amounts[withdrawals] = rng.choice(WITHDRAWAL_AMOUNTS, int(withdrawals.sum()))
+        self._observe_grouped(c.transaction_amount, types, amounts, self._amount_bounds)
+
+    def active_sessions(self, step: int):
+        base_sessions = self.profile['base_sessions']
+        hour_factor = (step % 24) / 24.0
+        sessions = base_sessions + int(base_sessions * abs(0.5 - hour_factor) * 2)  # Peak at noon
+        self.children.active_sessions.set(sessions + int(self.rng.integers(-20, 21)))
+
+    def sessions(self, k: int):
+        """Session duration observations"""
+        if k:
+            durations = self.rng.uniform(60, 3600, k)
+            self._observe_grouped([self.children.session_duration], np.zeros(k, dtype=np.int64),
+                                  durations, self._session_bounds)
+
+    def balances(self):
+        balances = self.rng.uniform(1000, 500000, (len(CURRENCIES), len(ACCOUNT_TYPES)))
+        for i, by_type in enumerate(self.children.account_balance):
+            for j, balance in enumerate(by_type):
+                balance.set(balances[i, j])
+
+    def accounts(self):
+        for accounts, count in zip(self.children.active_accounts, self.rng.integers(100, 1001, len(ACCOUNT_TYPES))):
+            accounts.set(int(count))
+
+    def api_requests(self, k: int):
+        """Endpoint x method x status_code counters, duration per endpoint x method"""
+        if not k:
+            return
+        rng, c = self.rng, self.children
+        endpoints = rng.integers(0, len(ENDPOINTS), k)
+        methods = rng.integers(0, len(METHODS), k)
+        codes = rng.choice(len(STATUS_CODES), k, p=self._code_p)
+        pair = endpoints * len(METHODS) + methods
+        counts = self._counts(pair * len(STATUS_CODES) + codes, len(ENDPOINTS) * len(METHODS) * len(STATUS_CODES))
+        for code in np.flatnonzero(counts):
+            p, sc = divmod(int(code), len(STATUS_CODES))
+            e, m = divmod(p, len(METHODS))
+            c.api_requests[e][m][sc].inc(int(counts[code]))
+
+        is_get = methods == _GET
+        durations = np.where(is_get, rng.uniform(0.01, 0.5, k), rng.uniform(0.1, 2.0, k))
+        if NATIVE_HISTOGRAMS:
+            self._observe_native(self._request_children, pair, durations)
+        else:
+            self._observe_grouped(self._request_children, pair, durations, self._request_bounds)
+
+    def logins(self, k: int):
+        if not k:
+            return
+        rng, c = self.rng, self.children
+        statuses = rng.choice(len(LOGIN_STATUSES), k, p=self._login_p)
+        methods = rng.integers(0, len(LOGIN_METHODS), k)
+        counts = self._counts(statuses * len(LOGIN_METHODS) + methods, len(LOGIN_STATUSES) * len(LOGIN_METHODS))
+        for code in np.flatnonzero(counts):
+            s, m = divmod(int(code), len(LOGIN_METHODS))
+            c.login_attempts[s][m].inc(int(counts[code]))
+        failed = int((statuses == _FAILED_LOGIN).sum())
+        if failed:
+            reasons = self._counts(rng.integers(0, len(LOGIN_FAILURE_REASONS), failed), len(LOGIN_FAILURE_REASONS))
+            for r in np.flatnonzero(reasons):
+                c.failed_login_attempts[r].inc(int(reasons[r]))
+
+    def _alerts(self, k: int, table, kinds, severity_p):
+        if not k:
+            return
+        kind = self.rng.integers(0, len(kinds), k)
+        severity = self.rng.choice(len(SEVERITIES), k, p=severity_p)
+        counts = self._counts(kind * len(SEVERITIES) + severity, len(kinds) * len(SEVERITIES))
+        for code in np.flatnonzero(counts):
+            t, s = divmod(int(code), len(SEVERITIES))
+            table[t][s].inc(int(counts[code]))
+
+    def errors(self, k: int):
+        self._alerts(k, self.children.api_errors, ERROR_TYPES, self._error_severity_p)
+
+    def fraud(self, k: int):
+        self._alerts(k, self.children.fraud_alerts, FRAUD_TYPES, self._fraud_severity_p)
+
+    def db_connections(self):
+        for pool, connections in zip(self.children.database_connections, self.rng.integers(5, 51, len(DB_POOLS))):
+            pool.set(int(connections))
+
+    def db_queries(self, k: int):
+        if k:
+            query_types = self.rng.integers(0, len(QUERY_TYPES), k)
+            self._observe_grouped(self.children.database_query_duration, query_types,
+                                  self.rng.uniform(0.001, 0.5, k), self._query_bounds)
+
+    def business(self):
+        self.children.daily_revenue.set(self.profile['base_revenue'] * self.rng.uniform(0.9, 1.1))
+        self.children.customer_satisfaction.set(self.rng.uniform(*self.profile['satisfaction_range']))
+
+    # ============================================
+    # Tick
+    # ============================================
+
+    def tick(self, dt: float) -> int:
+        """Draw and apply dt seconds worth of events, return the number of events"""
+        self.iteration += 1
+        scale = self.target_rate * dt / self._events_per_iteration
+        n = {name: self.rng.poisson(mean * scale) for name, mean in self._mix.items()}
+
+        self.transactions(n['transactions'])
+        self.active_sessions(self.iteration)
+        self.sessions(n['sessions'])
+        # Account gauges (one value per series per tick)
+        if self.gauges:
+            self.balances()
+            self.accounts()
+        self.api_requests(n['api_requests'])
+        self.logins(n['logins'])
+        self.errors(n['errors'])
+        self.fraud(n['fraud'])
+        if self.gauges:
+            self.db_connections()
+        self.db_queries(n['db_queries'])
+        if self.gauges:
+            self.business()
+
+        return sum(n.values())
+
+    def run(self, trace: bool = False):
+        """Tick forever at a fixed cadence; with `trace`, one span per tick"""
+        logger.info(f"Starting batch engine for {self.environment} environment: "
+                    f"{self.target_rate:.0f} events/s, tick {self.tick_interval}s")
+        logger.info(self.profile['banner'])
+        next_tick = time.monotonic()
+        while True:
+            try:
+                started = time.monotonic()
+                if trace:
+                    with start_span('ebanking.batch_tick', attributes={'tick': self.iteration + 1}) as span:
+                        events = self.tick(self.tick_interval)
+                        span.set_attribute('events', events)
+                else:
+                    events = self.tick(self.tick_interval)
+                if self.iteration % 100 == 0:
+                    logger.info(f"Batch engine running... (tick {self.iteration}, {events} events, "
+                                f"{(time.monotonic() - started) * 1000:.1f} ms)")
+            except Exception as e:
+                logger.error(f"Error in batch engine tick: {e}")
+            next_tick += self.tick_interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Falling behind: skip missed ticks rather than bursting to catch up
+                next_tick = time.monotonic()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-event cost of resolving a label child
+
+Compares, for one transactions_processed increment with random labels:
+- labels(**kwargs): keyword lookup + lock per call (the previous hot loop)
+- labels(*args):    positional lookup + lock per call
+- pre-bound table:  BoundChildren.transactions_processed[t][s][c]
+
+    python benchmarks/bench_children.py --events 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from metrics import BoundChildren, transactions_processed  # noqa: E402
+from profiles import TRANSACTION_TYPES, STATUSES, CHANNELS  # noqa: E402
+
+ENVIRONMENT = 'training'
+
+
+def draws(n: int):
+    """Pre-drawn label codes so only the metric update is timed"""
+    rnd = random.Random(42)
+    return [(rnd.randrange(len(TRANSACTION_TYPES)), rnd.randrange(len(STATUSES)), rnd.randrange(len(CHANNELS)))
+            for _ in range(n)]
+
+
+def bench_kwargs(codes) -> float:
+    start = time.perf_counter()
+    for t, s, c in codes:
+        transactions_processed.labels(
+            transaction_type=TRANSACTION_TYPES[t],
+            status=STATUSES[s],
+            channel=CHANNELS[c],
+            environment=ENVIRONMENT
+        ).inc()
+    return time.perf_counter() - start
+
+
+def bench_positional(codes) -> float:
+    start = time.perf_counter()
+    for t, s, c in codes:
+        transactions_processed.labels(TRANSACTION_TYPES[t], STATUSES[s], CHANNELS[c], ENVIRONMENT).inc()
+    return time.perf_counter() - start
+
+
+def bench_bound(codes) -> float:
+    table = BoundChildren(ENVIRONMENT).transactions_processed
+    start = time.perf_counter()
+    for t, s, c in codes:
+        table[t][s][c].inc()
+    return time.perf_counter() - start
+
+
+def bench_baseline(codes) -> float:
+    """Loop + tuple unpacking only, subtracted from every result"""
+    start = time.perf_counter()
+    for t, s, c in codes:
+        pass
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=1000000)
+    args = parser.parse_args()
+
+    codes = draws(args.events)
+    baseline = bench_baseline(codes)
+    print(f"{'variant':<20} {'ns/event':>10}")
+    for name, fn in (("labels(**kwargs)", bench_kwargs), ("labels(*args)", bench_positional),
+                     ("pre-bound table", bench_bound)):
+        elapsed = fn(codes) - baseline
+        print(f"{name:<20} {elapsed / args.events * 1e9:>10.0f}")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark: events/s per core, per-event loop vs. vectorized batch engine
+
+Runs each engine flat out on one core (no sleeps) for --seconds and reports
+generated events per second. The async engine runs in real time, so it is run
+for --seconds at each --async-rates total rate (split like the batch mix,
+default gauge intervals) and the CPU share it used is reported instead.
+With --scrape-time-gauges, the engines leave the slow-changing gauges to
+metrics.ScrapeTimeGauges, as with SCRAPE_TIME_GAUGES=true.
+
+    python benchmarks/bench_engines.py --seconds 5 --tick-events 1000 10000 100000 --async-rates 1000 100000
+    python benchmarks/bench_engines.py --seconds 5 --tick-events 100 1000 --async-rates 1000 --scrape-time-gauges
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+logging.disable(logging.INFO)
+
+import main  # noqa: E402
+from async_engine import AsyncEngine  # noqa: E402
+from batch_engine import BatchEngine  # noqa: E402
+
+
+def bench_loop(seconds: float, gauges: bool = True) -> float:
+    profile = main.get_environment_profile(main.ENVIRONMENT)
+    children = main.BoundChildren(main.ENVIRONMENT)
+    events, iteration = 0, 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        iteration += 1
+        events += main.simulate_iteration(iteration, profile, children, gauges=gauges)
+    return events / (time.perf_counter() - start)
+
+
+def bench_batch(seconds: float, tick_events: int, gauges: bool = True) -> float:
+    # One tick of dt=1s at target_rate=tick_events draws ~tick_events events
+    engine = BatchEngine(main.ENVIRONMENT, target_rate=tick_events, seed=42, gauges=gauges)
+    events = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        events += engine.tick(1.0)
+    return events / (time.perf_counter() - start)
+
+
+def bench_async(seconds: float, rate: float, gauges: bool = True) -> tuple:
+    engine = AsyncEngine(main.ENVIRONMENT, rate, seed=42, gauges=gauges)
+
+    async def run():
+        task = asyncio.create_task(engine.run(log_interval=3600))
+        cpu, wall = time.process_time(), time.perf_counter()
+        await asyncio.sleep(seconds)
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        task.cancel()
+        return sum(engine.events.values()) / wall, cpu / wall
+
+    return asyncio.run(run())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--tick-events", type=int, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--async-rates", type=float, nargs="*", default=[1000, 10000, 100000])
+    parser.add_argument("--scrape-time-gauges", action="store_true")
+    args = parser.parse_args()
+    gauges = not args.scrape_time_gauges
+
+    print(f"{'engine':<28} {'events/s/core':>14}")
+    print(f"{'loop (per event)':<28} {bench_loop(args.seconds, gauges):>14,.0f}")
+    for tick_events in args.tick_events:
+        label = f"batch ({tick_events:,} events/tick)"
+        print(f"{label:<28} {bench_batch(args.seconds, tick_events, gauges):>14,.0f}")
+
+    if args.async_rates:
+        print(f"\n{'engine':<28} {'events/s':>14} {'CPU':>7}")
+        for rate in args.async_rates:
+            events, cpu = bench_async(args.seconds, rate, gauges)
+            label = f"async ({rate:,.0f} events/s)"
+            print(f"{label:<28} {events:>14,.0f} {cpu:>6.1%}")
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: classic vs. native histogram for ebanking_request_duration_seconds
+
+Feeds the same request durations (GET: uniform 0.01-0.5 s, other methods:
+uniform 0.1-2.0 s, as in the simulation) over the 7 endpoints x 4 methods into
+the 8-bucket classic histogram and into a native histogram. Reports stored
+series (classic: one per bucket plus _count and _sum; native: one per label
+set), scrape size (text and protobuf) and the error of service-wide quantiles
+against the exact values, interpolating linearly inside a bucket like
+histogram_quantile().
+
+    python benchmarks/bench_native_histogram.py --observations 200000 --schema 3
+"""
+
+import argparse
+import gzip
+import os
+import sys
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from prometheus_client import CollectorRegistry, Histogram, generate_latest  # noqa: E402
+
+from observability_common.native_histogram import NativeHistogram, generate_protobuf  # noqa: E402
+from profiles import ENDPOINTS, METHODS  # noqa: E402
+
+LABELS = ['endpoint', 'method', 'environment']
+BUCKETS = [0.01, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+
+def classic_quantile(q: float, counts: list) -> float:
+    bounds = BUCKETS + [float("inf")]
+    rank = q * counts[-1]
+    for i, cumulative in enumerate(counts):
+        if cumulative >= rank:
+            lower = bounds[i - 1] if i else 0.0
+            previous = counts[i - 1] if i else 0
+            if bounds[i] == float("inf"):
+                return lower
+            return lower + (bounds[i] - lower) * (rank - previous) / max(cumulative - previous, 1)
+    return bounds[-2]
+
+
+def native_quantile(q: float, histogram) -> float:
+    snapshots = [child.snapshot() for child in histogram._children.values()]
+    schema = min(s[0] for s in snapshots)
+    buckets = {}
+    for child_schema, _, _, _, _, child_buckets in snapshots:
+        for key, count in child_buckets.items():
+            key = -((-key) >> (child_schema - schema))
+            buckets[key] = buckets.get(key, 0) + count
+    base = 2 ** (2.0 ** -schema)
+    rank, seen = q * sum(buckets.values()), 0
+    for key in sorted(buckets):
+        if seen + buckets[key] >= rank:
+            lower, upper = base ** (key - 1), base ** key
+            return lower + (upper - lower) * (rank - seen) / buckets[key]
+        seen += buckets[key]
+    return base ** max(buckets)
+
+
+def report(mode: str, registry):
+    series = 0
+    for family in registry.collect():
+        native = getattr(family, "native_histograms", None)
+        series += len(native) if native is not None else sum(
+            1 for sample in family.samples if not sample.name.endswith("_created"))
+    text, proto = generate_latest(registry), generate_protobuf(registry)
+    sizes = (series, len(text), len(gzip.compress(text)), len(proto), len(gzip.compress(proto)))
+    print(f"{mode:<10} " + " ".join(f"{v:>{w},}" for v, w in zip(sizes, (7, 9, 10, 9, 11))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--observations", type=int, default=200000)
+    parser.add_argument("--schema", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    n = args.observations
+    endpoints = rng.integers(0, len(ENDPOINTS), n)
+    methods = rng.integers(0, len(METHODS), n)
+    get = methods == METHODS.index('GET')
+    durations = np.where(get, rng.uniform(0.01, 0.5, n), rng.uniform(0.1, 2.0, n))
+
+    name = "ebanking_request_duration_seconds"
+    classic_registry, native_registry = CollectorRegistry(), CollectorRegistry()
+    classic = Histogram(name, "Time taken to process API requests", LABELS, buckets=BUCKETS,
+                        registry=classic_registry)
+    native = NativeHistogram(name, "Time taken to process API requests", LABELS, schema=args.schema,
+                             registry=native_registry)
+    for e, m, d in zip(endpoints.tolist(), methods.tolist(), durations.tolist()):
+        classic.labels(ENDPOINTS[e], METHODS[m], "training").observe(d)
+        native.labels(ENDPOINTS[e], METHODS[m], "training").observe(d)
+
+    print(f"{'mode':<10} {'series':>7} {'text B':>9} {'text gz B':>10} {'proto B':>9} {'proto gz B':>11}")
+    report("classic", classic_registry)
+    report("native", native_registry)
+
+    counts = [0.0] * (len(BUCKETS) + 1)
+    for family in classic_registry.collect():
+        for sample in family.samples:
+            if sample.name == name + "_bucket":
+                le = sample.labels["le"]
+                counts[-1 if le == "+Inf" else BUCKETS.index(float(le))] += sample.value
+
+    exact = np.sort(durations)
+    print(f"\n{'quantile':<9} {'exact s':>8} {'classic s':>10} {'error':>7} {'native s':>9} {'error':>7}")
+    for q in QUANTILES:
+        true = float(exact[min(n - 1, int(q * n))])
+        c, nq = classic_quantile(q, counts), native_quantile(q, native)
+        print(f"p{q * 100:<8g} {true:>8.3f} {c:>10.3f} {abs(c - true) / true:>6.1%} {nq:>9.3f} {abs(nq - true) / true:>6.1%}")
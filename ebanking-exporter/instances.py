@@ -0,0 +1,62 @@
+"""
+eBanking Metrics Exporter - Multi-instance configuration
+
+One process can simulate many service instances (environments, regions,
+replicas) instead of one container per ENVIRONMENT. INSTANCES_CONFIG points to
+a JSON file listing instance groups:
+
+    {
+      "defaults": {"service": "ebanking-api", "cluster": "scale-test"},
+      "instances": [
+        {"environment": "production", "region": "eu-west-1", "replicas": 20},
+        {"environment": "production", "region": "us-east-1", "replicas": 20, "target_event_rate": 500},
+        {"environment": "staging", "region": "eu-west-1", "replicas": 10},
+        {"environment": "training", "instance": "training-lab"}
+      ]
+    }
+
+Every key is optional and falls back to "defaults", then to the process
+settings (ENVIRONMENT, SERVICE_NAME, REGION, CLUSTER, APP_VERSION,
+TARGET_EVENT_RATE). A group with "replicas": N expands to N instances named
+<instance>-1 .. <instance>-N, and the instance name defaults to
+<service>-<environment>-<region>.
+
+All instances share the metric objects, the registry and the HTTP server.
+Their series are told apart by the INSTANCE_LABELS in metrics.py.
+"""
+
+import json
+
+from profiles import ENVIRONMENT_PROFILES
+
+INSTANCE_KEYS = ('environment', 'service', 'region', 'cluster', 'version', 'instance', 'target_event_rate', 'replicas')
+
+
+def load_instances(path: str, defaults: dict) -> list:
+    """Expand the groups of an INSTANCES_CONFIG file into one settings dict per instance"""
+    with open(path) as f:
+        config = json.load(f)
+    if isinstance(config, list):
+        config = {'instances': config}
+    base = {**defaults, **config.get('defaults', {})}
+
+    instances, names = [], set()
+    for group in config.get('instances', []):
+        unknown = set(group) - set(INSTANCE_KEYS)
+        if unknown:
+            raise ValueError(f"{path}: unknown instance keys {sorted(unknown)}, expected {list(INSTANCE_KEYS)}")
+        settings = {**base, **group}
+        if settings['environment'] not in ENVIRONMENT_PROFILES:
+            raise ValueError(f"{path}: unknown environment '{settings['environment']}', "
+                             f"expected one of {list(ENVIRONMENT_PROFILES)}")
+        replicas = int(settings.pop('replicas', 1))
+        name = settings.get('instance') or f"{settings['service']}-{settings['environment']}-{settings['region']}"
+        for replica in range(1, replicas + 1):
+            instance = dict(settings, instance=f'{name}-{replica}' if replicas > 1 else name)
+            if instance['instance'] in names:
+                raise ValueError(f"{path}: duplicate instance '{instance['instance']}'")
+            names.add(instance['instance'])
+            instances.append(instance)
+    if not instances:
+        raise ValueError(f"{path}: no instances configured")
+    return instances
@@ -8,6 +8,23 @@ Best Practices:
 - All metrics include 'environment' label for multi-environment support
 - Enables dynamic alert routing based on environment
 - Supports production, staging, development, and training environments
+
+Simulation engines (SIMULATION_ENGINE):
+- loop:  one event at a time, 0.5-2 s between iterations (default)
+- batch: NumPy-vectorized ticks at TARGET_EVENT_RATE events/s (see batch_engine.py)
+- async: one asyncio producer per subsystem, each at its own rate (see async_engine.py)
+
+Multi-instance mode (INSTANCES_CONFIG=instances.json): one process simulates
+every instance listed in the file, each with its own engine, sharing the
+metrics and the HTTP server (see instances.py).
+
+Record/replay (see recording.py): EVENT_RECORD=events.evlog records the loop
+engine's events, EVENT_REPLAY=events.evlog replays them at REPLAY_SPEED (1, 10,
+... or max) instead of simulating.
+
+Tracing (OTEL_TRACES_EXPORTER=otlp|file|memory): the loop engine emits one server
+span per simulated API request, the batch engine one span per tick and the async
+engine one span per event producer wake (see observability_common.otlp).
 """
 
 import time
@@ -15,8 +32,21 @@ import random
 import os
 import uuid
 from datetime import datetime
-from prometheus_client import start_http_server, Counter, Gauge, Histogram, Info
+from prometheus_client import start_http_server, REGISTRY
 import logging
+import threading
+
+from metrics import (
+    app_info, BoundChildren, ScrapeTimeGauges, NATIVE_HISTOGRAMS, SCRAPE_TIME_GAUGES, GAUGE_REFRESH_INTERVAL,
+    INSTANCES_CONFIG, INSTANCE_LABELS
+)
+from observability_common.tracing import start_span
+from observability_common.otlp import setup_tracing
+from profiles import (
+    TRANSACTION_TYPES, STATUSES, CHANNELS, ENDPOINTS, METHODS, STATUS_CODES, STATUS_CODE_WEIGHTS,
+    LOGIN_STATUSES, LOGIN_STATUS_WEIGHTS, LOGIN_METHODS, LOGIN_FAILURE_REASONS, ERROR_TYPES,
+    FRAUD_TYPES, SEVERITIES, WITHDRAWAL_AMOUNTS, get_environment_profile
+)
 
 # Configure logging
 logging.basicConfig(
@@ -34,364 +64,311 @@ REGION = os.getenv('REGION', 'eu-west-1')
 CLUSTER = os.getenv('CLUSTER', 'training-cluster')
 APP_VERSION = os.getenv('APP_VERSION', '1.0.0')
 
+# Simulation engine configuration
+SIMULATION_ENGINE = os.getenv('SIMULATION_ENGINE', 'loop')  # loop, batch, async
+TARGET_EVENT_RATE = float(os.getenv('TARGET_EVENT_RATE', '1000'))  # events/s (batch and async engines)
+TICK_INTERVAL = float(os.getenv('TICK_INTERVAL', '1.0'))  # seconds per tick (batch engine)
+PRODUCER_RATES = os.getenv('PRODUCER_RATES', '')  # e.g. transactions=1000,balances=30s (async engine)
+PRODUCER_MIN_INTERVAL = float(os.getenv('PRODUCER_MIN_INTERVAL', '0.05'))  # fastest producer wake (async engine)
+
+# Event log: record the loop engine's events, or replay a recording instead of simulating
+EVENT_RECORD = os.getenv('EVENT_RECORD', '')
+EVENT_REPLAY = os.getenv('EVENT_REPLAY', '')
+REPLAY_SPEED = os.getenv('REPLAY_SPEED', '1')  # 1, 10, ... or max
+
+# Tracing: OTLP/HTTP to Tempo or the Collector, head sampling + tail sampling (errors, slow requests)
+TRACING_CONFIG = {
+    'exporter': os.getenv('OTEL_TRACES_EXPORTER', 'none'),  # otlp, file, memory, none
+    'service_name': os.getenv('OTEL_SERVICE_NAME', SERVICE_NAME),
+    'endpoint': os.getenv('OTEL_EXPORTER_OTLP_ENDPOINT', 'http://tempo:4318'),
+    'file': os.getenv('TRACES_FILE', 'traces.jsonl'),
+    'sample_ratio': float(os.getenv('OTEL_TRACES_SAMPLER_ARG', '0.01')),
+    # Simulated requests at least this slow (seconds) are always exported; 0 disables
+    'tail_latency': float(os.getenv('TRACES_TAIL_LATENCY', '1.5')) or None,
+    'max_queue_size': int(os.getenv('OTEL_BSP_MAX_QUEUE_SIZE', '2048')),
+    'max_export_batch_size': int(os.getenv('OTEL_BSP_MAX_EXPORT_BATCH_SIZE', '512')),
+    'schedule_delay': float(os.getenv('OTEL_BSP_SCHEDULE_DELAY', '5000')) / 1000,
+}
+
+# Integer label codes used with the BoundChildren tables
+N_TRANSACTION_TYPES = len(TRANSACTION_TYPES)
+N_CHANNELS = len(CHANNELS)
+N_ENDPOINTS = len(ENDPOINTS)
+N_METHODS = len(METHODS)
+N_LOGIN_METHODS = len(LOGIN_METHODS)
+N_LOGIN_FAILURE_REASONS = len(LOGIN_FAILURE_REASONS)
+N_ERROR_TYPES = len(ERROR_TYPES)
+N_FRAUD_TYPES = len(FRAUD_TYPES)
+STATUS_INDEX = range(len(STATUSES))
+STATUS_CODE_INDEX = range(len(STATUS_CODES))
+LOGIN_STATUS_INDEX = range(len(LOGIN_STATUSES))
+SEVERITY_INDEX = range(len(SEVERITIES))
+WITHDRAWAL = TRANSACTION_TYPES.index('withdrawal')
+TRANSFER = TRANSACTION_TYPES.index('transfer')
+BILL_PAYMENT = TRANSACTION_TYPES.index('bill_payment')
+GET = METHODS.index('GET')
+FAILED_LOGIN = LOGIN_STATUSES.index('failed')
+
 # Generate unique instance ID for each restart
 INSTANCE_ID = str(uuid.uuid4())[:8]  # Short UUID
 START_TIME = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')
 
 logger.info(f"Starting eBanking Exporter - Environment: {ENVIRONMENT}, Service: {SERVICE_NAME}, Version: {APP_VERSION}, Instance: {INSTANCE_ID}")
 
+
+def publish_app_info(instance: dict = None):
+    """ebanking_app_info for this process, or for one instance of INSTANCES_CONFIG"""
+    settings = instance or {}
+    info = {
+        'version': settings.get('version', APP_VERSION),
+        'environment': settings.get('environment', ENVIRONMENT),
+        'service': settings.get('service', SERVICE_NAME),
+        'region': settings.get('region', REGION),
+        'cluster': settings.get('cluster', CLUSTER),
+        'organization': 'Data2AI Academy',
+        'instance_id': INSTANCE_ID,
+        'start_time': START_TIME
+    }
+    if instance is None:
+        app_info.info(info)
+    else:
+        app_info.labels(instance['instance']).info(info)
+
+
 # Application info
-app_info = Info('ebanking_app', 'eBanking Application Information')
-app_info.info({
-    'version': APP_VERSION,
-    'environment': ENVIRONMENT,
-    'service': SERVICE_NAME,
-    'region': REGION,
-    'cluster': CLUSTER,
-    'organization': 'Data2AI Academy',
-    'instance_id': INSTANCE_ID,
-    'start_time': START_TIME
-})
+if not INSTANCES_CONFIG:
+    publish_app_info()
 
-# ============================================
-# Transaction Metrics (with environment label)
-# ============================================
-transactions_processed = Counter(
-    'ebanking_transactions_processed_total',
-    'Total number of processed transactions',
-    ['transaction_type', 'status', 'channel', 'environment']
-)
 
-transaction_amount = Histogram(
-    'ebanking_transaction_amount_eur',
-    'Transaction amounts in EUR',
-    ['transaction_type', 'environment'],
-    buckets=[10, 50, 100, 500, 1000, 5000, 10000, 50000]
-)
+def simulate_iteration(iteration: int, profile: dict, children: BoundChildren, trace: bool = False,
+                       gauges: bool = True) -> int:
+    """Run one iteration of the per-event simulation, return the number of events generated
 
-# ============================================
-# Session Metrics (with environment label)
-# ============================================
-active_sessions = Gauge(
-    'ebanking_active_sessions',
-    'Current number of active user sessions',
-    ['environment']
-)
+    Labels are drawn as integer codes and resolved through the pre-bound children
+    tables, so no labels() lookup happens per event. With `trace`, every simulated
+    API request also ends a span back-dated by its simulated duration. Without
+    `gauges`, the slow-changing gauges are left to ScrapeTimeGauges.
+    """
+    randrange = random.randrange
+    uniform = random.uniform
+    events = 0
 
-session_duration = Histogram(
-    'ebanking_session_duration_seconds',
-    'User session duration in seconds',
-    ['environment'],
-    buckets=[60, 300, 600, 1800, 3600, 7200]
-)
+    # Simulate transaction processing (environment-specific volume)
+    num_transactions = int(random.randint(2, 5) * profile['transaction_multiplier'])
+    # Use environment-specific success rates
+    statuses = random.choices(STATUS_INDEX, weights=profile['success_rate_weights'], k=num_transactions)
+    transactions = children.transactions_processed
+    amounts = children.transaction_amount
+    for status in statuses:
+        trans_type = randrange(N_TRANSACTION_TYPES)
+        transactions[trans_type][status][randrange(N_CHANNELS)].inc()
 
-# ============================================
-# Account Metrics (with environment label)
-# ============================================
-account_balance = Gauge(
-    'ebanking_account_balance_total',
-    'Total account balance across all accounts',
-    ['currency', 'account_type', 'environment']
-)
+        # Transaction amount (realistic distribution)
+        if trans_type == WITHDRAWAL:
+            amount = random.choice(WITHDRAWAL_AMOUNTS)
+        elif trans_type == TRANSFER:
+            amount = uniform(10, 10000)
+        elif trans_type == BILL_PAYMENT:
+            amount = uniform(20, 500)
+        else:
+            amount = uniform(10, 5000)
 
-active_accounts = Gauge(
-    'ebanking_active_accounts_total',
-    'Total number of active accounts',
-    ['account_type', 'environment']
-)
+        amounts[trans_type].observe(amount)
+    events += num_transactions
 
-# ============================================
-# API Performance Metrics (with environment label)
-# ============================================
-request_duration = Histogram(
-    'ebanking_request_duration_seconds',
-    'Time taken to process API requests',
-    ['endpoint', 'method', 'environment'],
-    buckets=[0.01, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
-)
+    # Simulate active sessions (varies by time of day simulation, environment-specific)
+    base_sessions = profile['base_sessions']
+    hour_factor = (iteration % 24) / 24.0
+    sessions = base_sessions + int(base_sessions * abs(0.5 - hour_factor) * 2)  # Peak at noon
+    children.active_sessions.set(sessions + random.randint(-20, 20))
 
-api_requests = Counter(
-    'ebanking_api_requests_total',
-    'Total number of API requests',
-    ['endpoint', 'method', 'status_code', 'environment']
-)
+    # Simulate session durations
+    children.session_duration.observe(uniform(60, 3600))
+    events += 1
 
-# ============================================
-# Authentication Metrics (with environment label)
-# ============================================
-login_attempts = Counter(
-    'ebanking_login_attempts_total',
-    'Total number of login attempts',
-    ['status', 'method', 'environment']
-)
+    if gauges:
+        # Simulate account balances
+        for by_type in children.account_balance:
+            for balance in by_type:
+                balance.set(uniform(1000, 500000))
 
-failed_login_attempts = Counter(
-    'ebanking_failed_login_attempts_total',
-    'Total number of failed login attempts',
-    ['reason', 'environment']
-)
+        # Simulate active accounts
+        for accounts in children.active_accounts:
+            accounts.set(random.randint(100, 1000))
 
-# ============================================
-# Error Metrics (with environment label)
-# ============================================
-api_errors = Counter(
-    'ebanking_api_errors_total',
-    'Total number of API errors',
-    ['error_type', 'severity', 'environment']
-)
+    # Simulate API requests (3-8 requests per iteration)
+    num_requests = random.randint(3, 8)
+    status_codes = random.choices(STATUS_CODE_INDEX, weights=STATUS_CODE_WEIGHTS, k=num_requests)
+    for status_code in status_codes:
+        endpoint = randrange(N_ENDPOINTS)
+        method = randrange(N_METHODS)
 
-fraud_alerts = Counter(
-    'ebanking_fraud_alerts_total',
-    'Total number of fraud alerts',
-    ['alert_type', 'severity', 'environment']
-)
+        # Request duration (faster for GET, slower for POST)
+        if method == GET:
+            duration = uniform(0.01, 0.5)
+        else:
+            duration = uniform(0.1, 2.0)
 
-# ============================================
-# Database Metrics (with environment label)
-# ============================================
-database_connections = Gauge(
-    'ebanking_database_connections',
-    'Current number of database connections',
-    ['pool', 'environment']
-)
+        children.request_duration[endpoint][method].observe(duration)
+        children.api_requests[endpoint][method][status_code].inc()
+        if trace:
+            trace_request(endpoint, method, status_code, duration, children)
+    events += num_requests
 
-database_query_duration = Histogram(
-    'ebanking_database_query_duration_seconds',
-    'Database query execution time',
-    ['query_type', 'environment'],
-    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0]
-)
-  
-# ============================================
-# Business Metrics (with environment label)
-# ============================================
-daily_revenue = Gauge(
-    'ebanking_daily_revenue_eur',
-    'Daily revenue in EUR',
-    ['environment']
-)
+    # Simulate login attempts
+    login_status = random.choices(LOGIN_STATUS_INDEX, weights=LOGIN_STATUS_WEIGHTS)[0]
+    children.login_attempts[login_status][randrange(N_LOGIN_METHODS)].inc()
+    events += 1
 
-customer_satisfaction = Gauge(
-    'ebanking_customer_satisfaction_score',
-    'Customer satisfaction score (0-100)',
-    ['environment']
-)
+    if login_status == FAILED_LOGIN:
+        children.failed_login_attempts[randrange(N_LOGIN_FAILURE_REASONS)].inc()
+
+    # Simulate occasional errors (environment-specific rate and severity)
+    if random.random() < profile['error_rate']:
+        severity = random.choices(SEVERITY_INDEX, weights=profile['error_severity_weights'])[0]
+        children.api_errors[randrange(N_ERROR_TYPES)][severity].inc()
+        events += 1
+
+    # Simulate fraud alerts (environment-specific rate and severity)
+    if random.random() < profile['fraud_rate']:
+        severity = random.choices(SEVERITY_INDEX, weights=profile['fraud_severity_weights'])[0]
+        children.fraud_alerts[randrange(N_FRAUD_TYPES)][severity].inc()
+        events += 1
+
+    # Simulate database connections
+    if gauges:
+        for connections in children.database_connections:
+            connections.set(random.randint(5, 50))
+
+    # Simulate database queries
+    for query_duration in children.database_query_duration:
+        query_duration.observe(uniform(0.001, 0.5))
+    events += len(children.database_query_duration)
+
+    if gauges:
+        # Simulate business metrics (environment-specific)
+        revenue_variation = uniform(0.9, 1.1)
+        children.daily_revenue.set(profile['base_revenue'] * revenue_variation)
+
+        # Customer satisfaction (environment-specific ranges)
+        children.customer_satisfaction.set(uniform(*profile['satisfaction_range']))
+
+    return events
+
+
+def trace_request(endpoint: int, method: int, status_code: int, duration: float, children: BoundChildren):
+    now = time.time_ns()
+    code = STATUS_CODES[status_code]
+    attributes = {
+        'http.method': METHODS[method],
+        'http.route': ENDPOINTS[endpoint],
+        'http.status_code': int(code),
+        'deployment.environment': children.environment,
+    }
+    if children.instance_labels:
+        attributes['service.instance.id'] = children.instance_labels[-1]
+    if code.startswith('5'):
+        attributes['error'] = f'HTTP {code}'
+    span = start_span(f'{METHODS[method]} {ENDPOINTS[endpoint]}', attributes=attributes, kind='server',
+                      start_ns=now - int(duration * 1e9))
+    span.end(now)
 
 
-def simulate_realistic_metrics():
+def simulate_realistic_metrics(trace: bool = False, environment: str = ENVIRONMENT, instance_labels: tuple = (),
+                               record: str = None):
     """Simulate realistic eBanking metrics for training purposes with environment-specific behavior"""
-    logger.info(f"Starting eBanking metrics simulation for {ENVIRONMENT} environment...")
-    
-    # Configuration
-    transaction_types = ['transfer', 'payment', 'withdrawal', 'deposit', 'bill_payment']
-    statuses = ['success', 'failed', 'pending', 'cancelled']
-    channels = ['web', 'mobile', 'atm', 'branch']
-    currencies = ['EUR', 'USD', 'GBP', 'CHF']
-    account_types = ['checking', 'savings', 'business', 'investment']
-    endpoints = [
-        '/api/v1/transfer',
-        '/api/v1/balance',
-        '/api/v1/transactions',
-        '/api/v1/login',
-        '/api/v1/accounts',
-        '/api/v1/cards',
-        '/api/v1/statements'
-    ]
-    methods = ['GET', 'POST', 'PUT', 'DELETE']
-    error_types = ['timeout', 'validation', 'authentication', 'network', 'database']
-    fraud_types = ['suspicious_amount', 'unusual_location', 'velocity', 'pattern_anomaly']
-    
-    # ============================================
-    # Environment-Specific Configuration
-    # ============================================
-    if ENVIRONMENT == 'production':
-        # Production: High volume, low errors, strict SLAs
-        transaction_multiplier = 5.0
-        error_rate = 0.01  # 1% error rate
-        fraud_rate = 0.005  # 0.5% fraud rate
-        base_revenue = 250000
-        base_sessions = 500
-        success_rate_weights = [97, 2, 0.5, 0.5]  # 97% success
-        logger.info("🏭 PRODUCTION mode: High volume, low errors, strict SLAs")
-        
-    elif ENVIRONMENT == 'staging':
-        # Staging: Medium volume, slightly higher errors, pre-production testing
-        transaction_multiplier = 3.0
-        error_rate = 0.03  # 3% error rate
-        fraud_rate = 0.01  # 1% fraud rate
-        base_revenue = 150000
-        base_sessions = 300
-        success_rate_weights = [94, 4, 1, 1]  # 94% success
-        logger.info("🧪 STAGING mode: Medium volume, testing scenarios")
-        
-    elif ENVIRONMENT == 'development':
-        # Development: Low volume, higher errors, active development
-        transaction_multiplier = 1.5
-        error_rate = 0.08  # 8% error rate
-        fraud_rate = 0.02  # 2% fraud rate
-        base_revenue = 75000
-        base_sessions = 150
-        success_rate_weights = [88, 7, 3, 2]  # 88% success
-        logger.info("💻 DEVELOPMENT mode: Low volume, higher error rates for testing")
-        
-    else:  # training
-        # Training: Consistent volume, balanced for learning
-        transaction_multiplier = 2.0
-        error_rate = 0.05  # 5% error rate
-        fraud_rate = 0.015  # 1.5% fraud rate
-        base_revenue = 100000
-        base_sessions = 200
-        success_rate_weights = [90, 7, 2, 1]  # 90% success
-        logger.info("🎓 TRAINING mode: Balanced metrics for learning")
-    
+    logger.info(f"Starting eBanking metrics simulation for {environment} environment...")
+    profile = get_environment_profile(environment)
+    logger.info(profile['banner'])
+    children = BoundChildren(environment, instance_labels)
+    recording = None
+    if record:
+        from recording import Recording
+        recording = Recording(record, children)
+        children = recording.children
+        logger.info(f"Recording events to {record}")
+
     # Simulation state
     iteration = 0
-    
-    while True:
-        try:
-            iteration += 1
-            
-            # Simulate transaction processing (environment-specific volume)
-            num_transactions = int(random.randint(2, 5) * transaction_multiplier)
-            for _ in range(num_transactions):
-                trans_type = random.choice(transaction_types)
-                # Use environment-specific success rates
-                status = random.choices(statuses, weights=success_rate_weights)[0]
-                channel = random.choice(channels)
-                
-                transactions_processed.labels(
-                    transaction_type=trans_type,
-                    status=status,
-                    channel=channel,
-                    environment=ENVIRONMENT
-                ).inc()
-                
-                # Transaction amount (realistic distribution)
-                if trans_type == 'withdrawal':
-                    amount = random.choice([20, 50, 100, 200, 500])
-                elif trans_type == 'transfer':
-                    amount = random.uniform(10, 10000)
-                elif trans_type == 'bill_payment':
-                    amount = random.uniform(20, 500)
-                else:
-                    amount = random.uniform(10, 5000)
-                
-                transaction_amount.labels(transaction_type=trans_type, environment=ENVIRONMENT).observe(amount)
-            
-            # Simulate active sessions (varies by time of day simulation, environment-specific)
-            hour_factor = (iteration % 24) / 24.0
-            sessions = base_sessions + int(base_sessions * abs(0.5 - hour_factor) * 2)  # Peak at noon
-            active_sessions.labels(environment=ENVIRONMENT).set(sessions + random.randint(-20, 20))
-            
-            # Simulate session durations
-            session_duration.labels(environment=ENVIRONMENT).observe(random.uniform(60, 3600))
-            
-            # Simulate account balances
-            for currency in currencies:
-                for acc_type in account_types:
-                    balance = random.uniform(1000, 500000)
-                    account_balance.labels(
-                        currency=currency,
-                        account_type=acc_type,
-                        environment=ENVIRONMENT
-                    ).set(balance)
-            
-            # Simulate active accounts
-            for acc_type in account_types:
-                count = random.randint(100, 1000)
-                active_accounts.labels(account_type=acc_type, environment=ENVIRONMENT).set(count)
-            
-            # Simulate API requests (3-8 requests per iteration)
-            num_requests = random.randint(3, 8)
-            for _ in range(num_requests):
-                endpoint = random.choice(endpoints)
-                method = random.choice(methods)
-                # 95% success (200), 3% client error (400), 2% server error (500)
-                status_code = random.choices(['200', '400', '404', '500'], weights=[95, 2, 1, 2])[0]
-                
-                # Request duration (faster for GET, slower for POST)
-                if method == 'GET':
-                    duration = random.uniform(0.01, 0.5)
-                else:
-                    duration = random.uniform(0.1, 2.0)
-                
-                request_duration.labels(endpoint=endpoint, method=method, environment=ENVIRONMENT).observe(duration)
-                api_requests.labels(
-                    endpoint=endpoint,
-                    method=method,
-                    status_code=status_code,
-                    environment=ENVIRONMENT
-                ).inc()
-            
-            # Simulate login attempts
-            login_status = random.choices(['success', 'failed'], weights=[97, 3])[0]
-            login_method = random.choice(['password', 'biometric', 'otp', 'sso'])
-            login_attempts.labels(status=login_status, method=login_method, environment=ENVIRONMENT).inc()
-            
-            if login_status == 'failed':
-                reason = random.choice(['invalid_credentials', 'account_locked', 'expired_session'])
-                failed_login_attempts.labels(reason=reason, environment=ENVIRONMENT).inc()
-            
-            # Simulate occasional errors (environment-specific rate)
-            if random.random() < error_rate:
-                error_type = random.choice(error_types)
-                # Production has fewer critical errors
-                if ENVIRONMENT == 'production':
-                    severity = random.choices(['low', 'medium', 'high', 'critical'], weights=[50, 35, 13, 2])[0]
-                elif ENVIRONMENT == 'staging':
-                    severity = random.choices(['low', 'medium', 'high', 'critical'], weights=[40, 35, 20, 5])[0]
-                else:  # development or training
-                    severity = random.choices(['low', 'medium', 'high', 'critical'], weights=[30, 35, 25, 10])[0]
-                api_errors.labels(error_type=error_type, severity=severity, environment=ENVIRONMENT).inc()
-            
-            # Simulate fraud alerts (environment-specific rate)
-            if random.random() < fraud_rate:
-                alert_type = random.choice(fraud_types)
-                # Production has more critical fraud alerts
-                if ENVIRONMENT == 'production':
-                    severity = random.choices(['low', 'medium', 'high', 'critical'], weights=[20, 30, 35, 15])[0]
-                elif ENVIRONMENT == 'staging':
-                    severity = random.choices(['low', 'medium', 'high', 'critical'], weights=[30, 40, 25, 5])[0]
-                else:  # development or training
-                    severity = random.choices(['low', 'medium', 'high', 'critical'], weights=[40, 35, 20, 5])[0]
-                fraud_alerts.labels(alert_type=alert_type, severity=severity, environment=ENVIRONMENT).inc()
-            
-            # Simulate database connections
-            for pool in ['primary', 'replica', 'analytics']:
-                connections = random.randint(5, 50)
-                database_connections.labels(pool=pool, environment=ENVIRONMENT).set(connections)
-            
-            # Simulate database queries
-            query_types = ['select', 'insert', 'update', 'delete']
-            for query_type in query_types:
-                duration = random.uniform(0.001, 0.5)
-                database_query_duration.labels(query_type=query_type, environment=ENVIRONMENT).observe(duration)
-            
-            # Simulate business metrics (environment-specific)
-            revenue_variation = random.uniform(0.9, 1.1)
-            daily_revenue.labels(environment=ENVIRONMENT).set(base_revenue * revenue_variation)
-            
-            # Customer satisfaction (environment-specific ranges)
-            if ENVIRONMENT == 'production':
-                satisfaction = random.uniform(92, 98)  # Higher satisfaction in production
-            elif ENVIRONMENT == 'staging':
-                satisfaction = random.uniform(88, 96)  # Similar to production
-            elif ENVIRONMENT == 'development':
-                satisfaction = random.uniform(80, 92)  # Lower in development (testing)
-            else:  # training
-                satisfaction = random.uniform(85, 95)  # Balanced for training
-            customer_satisfaction.labels(environment=ENVIRONMENT).set(satisfaction)
-            
-            # Log progress every 100 iterations
-            if iteration % 100 == 0:
-                logger.info(f"Metrics simulation running... (iteration {iteration})")
-            
-            # Wait before next iteration (0.5-2 seconds)
-            time.sleep(random.uniform(0.5, 2.0))
-            
-        except Exception as e:
-            logger.error(f"Error in metrics simulation: {e}")
-            time.sleep(1)
+
+    try:
+        while True:
+            try:
+                iteration += 1
+                simulate_iteration(iteration, profile, children, trace, gauges=not SCRAPE_TIME_GAUGES)
+
+                # Log progress every 100 iterations
+                if iteration % 100 == 0:
+                    logger.info(f"Metrics simulation running... (iteration {iteration})")
+
+                # Wait before next iteration (0.5-2 seconds)
+                time.sleep(random.uniform(0.5, 2.0))
+
+            except Exception as e:
+                logger.error(f"Error in metrics simulation: {e}")
+                time.sleep(1)
+    finally:
+        if recording:
+            recording.close()
+
+
+def instance_labels(instance: dict) -> tuple:
+    """INSTANCE_LABELS values of one INSTANCES_CONFIG instance"""
+    return tuple(str(instance[name]) for name in INSTANCE_LABELS)
+
+
+def run_instances(instances: list, trace: bool = False):
+    """Simulate every instance of INSTANCES_CONFIG with SIMULATION_ENGINE, in this process"""
+    engines = []
+    for instance in instances:
+        publish_app_info(instance)
+        engines.append((instance['environment'], instance_labels(instance), float(instance['target_event_rate'])))
+    logger.info(f"Simulating {len(instances)} instances ({SIMULATION_ENGINE} engine)")
+
+    if SIMULATION_ENGINE == 'async':
+        # Every producer of every instance on one event loop
+        import asyncio
+        from async_engine import AsyncEngine, parse_rates
+
+        async def run_all():
+            rates = parse_rates(PRODUCER_RATES)
+            await asyncio.gather(*(
+                AsyncEngine(environment, rate, rates, PRODUCER_MIN_INTERVAL, gauges=not SCRAPE_TIME_GAUGES,
+                            instance_labels=labels).run(trace=trace)
+                for environment, labels, rate in engines
+            ))
+
+        asyncio.run(run_all())
+        return
+
+    # loop and batch: one thread per instance (both mostly sleep between iterations/ticks)
+    threads = []
+    for environment, labels, rate in engines:
+        if SIMULATION_ENGINE == 'batch':
+            from batch_engine import BatchEngine
+            engine = BatchEngine(environment, rate, TICK_INTERVAL, gauges=not SCRAPE_TIME_GAUGES,
+                                 instance_labels=labels)
+            target, args = engine.run, (trace,)
+        else:
+            target, args = simulate_realistic_metrics, (trace, environment, labels)
+        thread = threading.Thread(target=target, args=args, name=labels[-1], daemon=True)
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+
+
+def start_metrics_server(port: int):
+    """start_http_server(), also answering protobuf scrapes when native histograms are enabled"""
+    if not NATIVE_HISTOGRAMS:
+        start_http_server(port)
+        return
+    from wsgiref.simple_server import make_server
+    from prometheus_client.exposition import ThreadingWSGIServer, _SilentHandler
+    from observability_common.native_histogram import make_wsgi_app
+
+    httpd = make_server('0.0.0.0', port, make_wsgi_app(), ThreadingWSGIServer, handler_class=_SilentHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
 
 
 if __name__ == '__main__':
@@ -402,11 +379,66 @@ if __name__ == '__main__':
     logger.info("Data2AI Academy")
     logger.info("=" * 60)
     logger.info(f"Starting metrics server on port {port}")
-    
-    start_http_server(port)
+
+    instances = None
+    if INSTANCES_CONFIG:
+        from instances import load_instances
+        instances = load_instances(INSTANCES_CONFIG, {
+            'environment': ENVIRONMENT,
+            'service': SERVICE_NAME,
+            'region': REGION,
+            'cluster': CLUSTER,
+            'version': APP_VERSION,
+            'target_event_rate': TARGET_EVENT_RATE,
+        })
+        logger.info(f"Loaded {len(instances)} instances from {INSTANCES_CONFIG}")
+    if EVENT_RECORD and (instances or SIMULATION_ENGINE != 'loop'):
+        raise ValueError("EVENT_RECORD records the loop engine of a single instance")
+    if SCRAPE_TIME_GAUGES:
+        scrape_time_gauges = ScrapeTimeGauges(refresh_interval=GAUGE_REFRESH_INTERVAL)
+        if instances:
+            for instance in instances:
+                scrape_time_gauges.add(instance['environment'], instance_labels(instance))
+        else:
+            scrape_time_gauges.add(ENVIRONMENT)
+        REGISTRY.register(scrape_time_gauges)
+        logger.info(f"Slow-changing gauges computed at scrape time (refresh every {GAUGE_REFRESH_INTERVAL}s)")
+    start_metrics_server(port)
+    span_processor = setup_tracing(
+        **TRACING_CONFIG,
+        resource_attributes={
+            'service.version': APP_VERSION,
+            'service.instance.id': INSTANCE_ID,
+            'deployment.environment': ENVIRONMENT,
+        },
+        metric_prefix='ebanking'
+    )
+    if span_processor:
+        span_processor.start()
     logger.info(f"✓ Metrics available at http://0.0.0.0:{port}/metrics")
-    logger.info("✓ Starting realistic eBanking metrics simulation...")
+    logger.info(f"✓ Starting realistic eBanking metrics simulation ({SIMULATION_ENGINE} engine)...")
     logger.info("=" * 60)
-    
+
     # Start metrics simulation
-    simulate_realistic_metrics()
+    if EVENT_REPLAY:
+        from recording import replay
+        from observability_common.event_log import parse_speed
+        speed = parse_speed(REPLAY_SPEED)
+        logger.info(f"Replaying {EVENT_REPLAY} at {f'{speed:g}x' if speed else 'max'} speed")
+        events = replay(EVENT_REPLAY, BoundChildren(ENVIRONMENT), speed)
+        logger.info(f"Replay finished ({events} events), still serving metrics")
+        threading.Event().wait()
+    elif instances:
+        run_instances(instances, trace=span_processor is not None)
+    elif SIMULATION_ENGINE == 'batch':
+        from batch_engine import BatchEngine
+        engine = BatchEngine(ENVIRONMENT, TARGET_EVENT_RATE, TICK_INTERVAL, gauges=not SCRAPE_TIME_GAUGES)
+        engine.run(trace=span_processor is not None)
+    elif SIMULATION_ENGINE == 'async':
+        import asyncio
+        from async_engine import AsyncEngine, parse_rates
+        engine = AsyncEngine(ENVIRONMENT, TARGET_EVENT_RATE, parse_rates(PRODUCER_RATES), PRODUCER_MIN_INTERVAL,
+                             gauges=not SCRAPE_TIME_GAUGES)
+        asyncio.run(engine.run(trace=span_processor is not None))
+    else:
+        simulate_realistic_metrics(trace=span_processor is not None, record=EVENT_RECORD or None)
@@ -0,0 +1,311 @@
+"""
+eBanking Metrics Exporter - Prometheus metric definitions
+Shared by the per-event simulation loop (main.py) and the batch engine (batch_engine.py)
+
+All metrics include the 'environment' label for multi-environment support
+"""
+
+import os
+import random
+import threading
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, Info, REGISTRY
+from prometheus_client.core import GaugeMetricFamily
+
+from observability_common.native_histogram import NativeHistogram
+
+from profiles import (
+    TRANSACTION_TYPES, STATUSES, CHANNELS, CURRENCIES, ACCOUNT_TYPES, ENDPOINTS, METHODS,
+    STATUS_CODES, LOGIN_STATUSES, LOGIN_METHODS, LOGIN_FAILURE_REASONS, ERROR_TYPES,
+    FRAUD_TYPES, SEVERITIES, DB_POOLS, QUERY_TYPES, get_environment_profile
+)
+
+# Opt-in sparse exponential-bucket request_duration (protobuf scrapes, see observability_common.native_histogram)
+NATIVE_HISTOGRAMS = os.getenv('NATIVE_HISTOGRAMS', 'false').lower() in ('1', 'true', 'yes')
+NATIVE_HISTOGRAM_SCHEMA = int(os.getenv('NATIVE_HISTOGRAM_SCHEMA', '3'))
+
+# Opt-in: slow-changing gauges are computed at scrape time by ScrapeTimeGauges
+# instead of being set by the simulation (see the end of this file)
+SCRAPE_TIME_GAUGES = os.getenv('SCRAPE_TIME_GAUGES', 'false').lower() in ('1', 'true', 'yes')
+GAUGE_REFRESH_INTERVAL = float(os.getenv('GAUGE_REFRESH_INTERVAL', '15'))
+
+# Multi-instance mode (see instances.py): every series also carries these labels
+INSTANCES_CONFIG = os.getenv('INSTANCES_CONFIG', '')
+INSTANCE_LABELS = ['service', 'region', 'cluster', 'instance'] if INSTANCES_CONFIG else []
+
+# Registry of the gauges ScrapeTimeGauges replaces (unregistered when it is on)
+_simulated_gauges_registry = None if SCRAPE_TIME_GAUGES else REGISTRY
+
+# Application info (one per instance in multi-instance mode)
+app_info = Info('ebanking_app', 'eBanking Application Information', ['instance'] if INSTANCE_LABELS else [])
+
+# ============================================
+# Transaction Metrics (with environment label)
+# ============================================
+transactions_processed = Counter(
+    'ebanking_transactions_processed_total',
+    'Total number of processed transactions',
+    ['transaction_type', 'status', 'channel', 'environment', *INSTANCE_LABELS]
+)
+
+transaction_amount = Histogram(
+    'ebanking_transaction_amount_eur',
+    'Transaction amounts in EUR',
+    ['transaction_type', 'environment', *INSTANCE_LABELS],
+    buckets=[10, 50, 100, 500, 1000, 5000, 10000, 50000]
+)
+
+# ============================================
+# Session Metrics (with environment label)
+# ============================================
+active_sessions = Gauge(
+    'ebanking_active_sessions',
+    'Current number of active user sessions',
+    ['environment', *INSTANCE_LABELS]
+)
+
+session_duration = Histogram(
+    'ebanking_session_duration_seconds',
+    'User session duration in seconds',
+    ['environment', *INSTANCE_LABELS],
+    buckets=[60, 300, 600, 1800, 3600, 7200]
+)
+
+# ============================================
+# Account Metrics (with environment label)
+# ============================================
+account_balance = Gauge(
+    'ebanking_account_balance_total',
+    'Total account balance across all accounts',
+    ['currency', 'account_type', 'environment', *INSTANCE_LABELS],
+    registry=_simulated_gauges_registry
+)
+
+active_accounts = Gauge(
+    'ebanking_active_accounts_total',
+    'Total number of active accounts',
+    ['account_type', 'environment', *INSTANCE_LABELS],
+    registry=_simulated_gauges_registry
+)
+
+# ============================================
+# API Performance Metrics (with environment label)
+# ============================================
+if NATIVE_HISTOGRAMS:
+    request_duration = NativeHistogram(
+        'ebanking_request_duration_seconds',
+        'Time taken to process API requests',
+        ['endpoint', 'method', 'environment', *INSTANCE_LABELS],
+        schema=NATIVE_HISTOGRAM_SCHEMA
+    )
+else:
+    request_duration = Histogram(
+        'ebanking_request_duration_seconds',
+        'Time taken to process API requests',
+        ['endpoint', 'method', 'environment', *INSTANCE_LABELS],
+        buckets=[0.01, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+    )
+
+api_requests = Counter(
+    'ebanking_api_requests_total',
+    'Total number of API requests',
+    ['endpoint', 'method', 'status_code', 'environment', *INSTANCE_LABELS]
+)
+
+# ============================================
+# Authentication Metrics (with environment label)
+# ============================================
+login_attempts = Counter(
+    'ebanking_login_attempts_total',
+    'Total number of login attempts',
+    ['status', 'method', 'environment', *INSTANCE_LABELS]
+)
+
+failed_login_attempts = Counter(
+    'ebanking_failed_login_attempts_total',
+    'Total number of failed login attempts',
+    ['reason', 'environment', *INSTANCE_LABELS]
+)
+
+# ============================================
+# Error Metrics (with environment label)
+# ============================================
+api_errors = Counter(
+    'ebanking_api_errors_total',
+    'Total number of API errors',
+    ['error_type', 'severity', 'environment', *INSTANCE_LABELS]
+)
+
+fraud_alerts = Counter(
+    'ebanking_fraud_alerts_total',
+    'Total number of fraud alerts',
+    ['alert_type', 'severity', 'environment', *INSTANCE_LABELS]
+)
+
+# ============================================
+# Database Metrics (with environment label)
+# ============================================
+database_connections = Gauge(
+    'ebanking_database_connections',
+    'Current number of database connections',
+    ['pool', 'environment', *INSTANCE_LABELS],
+    registry=_simulated_gauges_registry
+)
+
+database_query_duration = Histogram(
+    'ebanking_database_query_duration_seconds',
+    'Database query execution time',
+    ['query_type', 'environment', *INSTANCE_LABELS],
+    buckets=[0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0]
+)
+
+# ============================================
+# Business Metrics (with environment label)
+# ============================================
+daily_revenue = Gauge(
+    'ebanking_daily_revenue_eur',
+    'Daily revenue in EUR',
+    ['environment', *INSTANCE_LABELS],
+    registry=_simulated_gauges_registry
+)
+
+customer_satisfaction = Gauge(
+    'ebanking_customer_satisfaction_score',
+    'Customer satisfaction score (0-100)',
+    ['environment', *INSTANCE_LABELS],
+    registry=_simulated_gauges_registry
+)
+
+
+# ============================================
+# Pre-bound Label Children
+# ============================================
+class BoundChildren:
+    """Every label child of every metric, resolved once for one environment
+
+    Tables are nested lists indexed by integer label codes (positions in the
+    profiles.py label lists), e.g. transactions_processed[type][status][channel],
+    so the hot loop does list lookups instead of labels() resolution + lock.
+    All series are created (at zero) up front. In multi-instance mode,
+    `instance_labels` are the INSTANCE_LABELS values of this instance.
+    """
+
+    def __init__(self, environment: str, instance_labels: tuple = ()):
+        env = (environment, *instance_labels)
+        self.environment = environment
+        self.instance_labels = tuple(instance_labels)
+
+        # Transactions
+        self.transactions_processed = [
+            [[transactions_processed.labels(t, s, c, *env) for c in CHANNELS] for s in STATUSES]
+            for t in TRANSACTION_TYPES
+        ]
+        self.transaction_amount = [transaction_amount.labels(t, *env) for t in TRANSACTION_TYPES]
+
+        # Sessions
+        self.active_sessions = active_sessions.labels(*env)
+        self.session_duration = session_duration.labels(*env)
+
+        # Accounts
+        self.account_balance = [
+            [account_balance.labels(cur, a, *env) for a in ACCOUNT_TYPES] for cur in CURRENCIES
+        ]
+        self.active_accounts = [active_accounts.labels(a, *env) for a in ACCOUNT_TYPES]
+
+        # API performance
+        self.request_duration = [[request_duration.labels(e, m, *env) for m in METHODS] for e in ENDPOINTS]
+        self.api_requests = [
+            [[api_requests.labels(e, m, sc, *env) for sc in STATUS_CODES] for m in METHODS]
+            for e in ENDPOINTS
+        ]
+
+        # Authentication
+        self.login_attempts = [[login_attempts.labels(s, m, *env) for m in LOGIN_METHODS] for s in LOGIN_STATUSES]
+        self.failed_login_attempts = [failed_login_attempts.labels(r, *env) for r in LOGIN_FAILURE_REASONS]
+
+        # Errors
+        self.api_errors = [[api_errors.labels(e, sev, *env) for sev in SEVERITIES] for e in ERROR_TYPES]
+        self.fraud_alerts = [[fraud_alerts.labels(f, sev, *env) for sev in SEVERITIES] for f in FRAUD_TYPES]
+
+        # Database
+        self.database_connections = [database_connections.labels(p, *env) for p in DB_POOLS]
+        self.database_query_duration = [database_query_duration.labels(q, *env) for q in QUERY_TYPES]
+
+        # Business
+        self.daily_revenue = daily_revenue.labels(*env)
+        self.customer_satisfaction = customer_satisfaction.labels(*env)
+
+
+# ============================================
+# Scrape-time Gauges
+# ============================================
+class ScrapeTimeGauges:
+    """Collector producing the slow-changing gauges when /metrics is scraped
+
+    Account balances, active accounts, database connections, daily revenue and
+    customer satisfaction are random draws around the environment profile, so
+    setting them on every simulation iteration only burns CPU between scrapes.
+    This collector draws them (same distributions as the engines) on a scrape
+    at most every `refresh_interval` seconds and serves the cached families in
+    between, so an unscraped exporter never computes them. One collector
+    serves every instance added with add().
+    """
+
+    def __init__(self, environment: str = None, refresh_interval: float = 15.0, instance_labels: tuple = ()):
+        self.refresh_interval = refresh_interval
+        self._instances = []  # (environment, instance label values, profile)
+        self._lock = threading.Lock()
+        self._refreshed = None
+        self._cached = []
+        self.refreshes = 0
+        if environment is not None:
+            self.add(environment, instance_labels)
+
+    def add(self, environment: str, instance_labels: tuple = ()):
+        with self._lock:
+            self._instances.append((environment, tuple(instance_labels), get_environment_profile(environment)))
+            self._refreshed = None
+
+    def _families(self):
+        return [
+            GaugeMetricFamily('ebanking_account_balance_total', 'Total account balance across all accounts',
+                              labels=['currency', 'account_type', 'environment', *INSTANCE_LABELS]),
+            GaugeMetricFamily('ebanking_active_accounts_total', 'Total number of active accounts',
+                              labels=['account_type', 'environment', *INSTANCE_LABELS]),
+            GaugeMetricFamily('ebanking_database_connections', 'Current number of database connections',
+                              labels=['pool', 'environment', *INSTANCE_LABELS]),
+            GaugeMetricFamily('ebanking_daily_revenue_eur', 'Daily revenue in EUR',
+                              labels=['environment', *INSTANCE_LABELS]),
+            GaugeMetricFamily('ebanking_customer_satisfaction_score', 'Customer satisfaction score (0-100)',
+                              labels=['environment', *INSTANCE_LABELS]),
+        ]
+
+    def describe(self):
+        return self._families()
+
+    def refresh(self):
+        """Draw new values for every series of every instance"""
+        uniform, randint = random.uniform, random.randint
+        families = self._families()
+        balances, accounts, connections, revenue, satisfaction = families
+        for environment, instance_labels, p in self._instances:
+            env = [environment, *instance_labels]
+            for cur in CURRENCIES:
+                for a in ACCOUNT_TYPES:
+                    balances.add_metric([cur, a, *env], uniform(1000, 500000))
+            for a in ACCOUNT_TYPES:
+                accounts.add_metric([a, *env], randint(100, 1000))
+            for pool in DB_POOLS:
+                connections.add_metric([pool, *env], randint(5, 50))
+            revenue.add_metric(env, p['base_revenue'] * uniform(0.9, 1.1))
+            satisfaction.add_metric(env, uniform(*p['satisfaction_range']))
+        self._cached = families
+        self._refreshed = time.monotonic()
+        self.refreshes += 1
+
+    def collect(self):
+        with self._lock:
+            if self._refreshed is None or time.monotonic() - self._refreshed >= self.refresh_interval:
+                self.refresh()
+            return list(self._cached)
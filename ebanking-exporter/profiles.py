@@ -0,0 +1,98 @@
+"""
+eBanking Metrics Exporter - Simulation profiles
+Label spaces and environment-specific behaviour shared by every simulation engine
+"""
+
+# ============================================
+# Label Spaces
+# ============================================
+TRANSACTION_TYPES = ['transfer', 'payment', 'withdrawal', 'deposit', 'bill_payment']
+STATUSES = ['success', 'failed', 'pending', 'cancelled']
+CHANNELS = ['web', 'mobile', 'atm', 'branch']
+CURRENCIES = ['EUR', 'USD', 'GBP', 'CHF']
+ACCOUNT_TYPES = ['checking', 'savings', 'business', 'investment']
+ENDPOINTS = [
+    '/api/v1/transfer',
+    '/api/v1/balance',
+    '/api/v1/transactions',
+    '/api/v1/login',
+    '/api/v1/accounts',
+    '/api/v1/cards',
+    '/api/v1/statements'
+]
+METHODS = ['GET', 'POST', 'PUT', 'DELETE']
+STATUS_CODES = ['200', '400', '404', '500']
+STATUS_CODE_WEIGHTS = [95, 2, 1, 2]  # 95% success (200), 3% client error, 2% server error
+LOGIN_STATUSES = ['success', 'failed']
+LOGIN_STATUS_WEIGHTS = [97, 3]
+LOGIN_METHODS = ['password', 'biometric', 'otp', 'sso']
+LOGIN_FAILURE_REASONS = ['invalid_credentials', 'account_locked', 'expired_session']
+ERROR_TYPES = ['timeout', 'validation', 'authentication', 'network', 'database']
+FRAUD_TYPES = ['suspicious_amount', 'unusual_location', 'velocity', 'pattern_anomaly']
+SEVERITIES = ['low', 'medium', 'high', 'critical']
+DB_POOLS = ['primary', 'replica', 'analytics']
+QUERY_TYPES = ['select', 'insert', 'update', 'delete']
+WITHDRAWAL_AMOUNTS = [20, 50, 100, 200, 500]
+
+# ============================================
+# Environment-Specific Configuration
+# ============================================
+ENVIRONMENT_PROFILES = {
+    # Production: High volume, low errors, strict SLAs
+    'production': {
+        'banner': "🏭 PRODUCTION mode: High volume, low errors, strict SLAs",
+        'transaction_multiplier': 5.0,
+        'error_rate': 0.01,  # 1% error rate
+        'fraud_rate': 0.005,  # 0.5% fraud rate
+        'base_revenue': 250000,
+        'base_sessions': 500,
+        'success_rate_weights': [97, 2, 0.5, 0.5],  # 97% success
+        'error_severity_weights': [50, 35, 13, 2],  # Fewer critical errors
+        'fraud_severity_weights': [20, 30, 35, 15],  # More critical fraud alerts
+        'satisfaction_range': (92, 98),  # Higher satisfaction in production
+    },
+    # Staging: Medium volume, slightly higher errors, pre-production testing
+    'staging': {
+        'banner': "🧪 STAGING mode: Medium volume, testing scenarios",
+        'transaction_multiplier': 3.0,
+        'error_rate': 0.03,  # 3% error rate
+        'fraud_rate': 0.01,  # 1% fraud rate
+        'base_revenue': 150000,
+        'base_sessions': 300,
+        'success_rate_weights': [94, 4, 1, 1],  # 94% success
+        'error_severity_weights': [40, 35, 20, 5],
+        'fraud_severity_weights': [30, 40, 25, 5],
+        'satisfaction_range': (88, 96),  # Similar to production
+    },
+    # Development: Low volume, higher errors, active development
+    'development': {
+        'banner': "💻 DEVELOPMENT mode: Low volume, higher error rates for testing",
+        'transaction_multiplier': 1.5,
+        'error_rate': 0.08,  # 8% error rate
+        'fraud_rate': 0.02,  # 2% fraud rate
+        'base_revenue': 75000,
+        'base_sessions': 150,
+        'success_rate_weights': [88, 7, 3, 2],  # 88% success
+        'error_severity_weights': [30, 35, 25, 10],
+        'fraud_severity_weights': [40, 35, 20, 5],
+        'satisfaction_range': (80, 92),  # Lower in development (testing)
+    },
+    # Training: Consistent volume, balanced for learning
+    'training': {
+        'banner': "🎓 TRAINING mode: Balanced metrics for learning",
+        'transaction_multiplier': 2.0,
+        'error_rate': 0.05,  # 5% error rate
+        'fraud_rate': 0.015,  # 1.5% fraud rate
+        'base_revenue': 100000,
+        'base_sessions': 200,
+        'success_rate_weights': [90, 7, 2, 1],  # 90% success
+        'error_severity_weights': [30, 35, 25, 10],
+        'fraud_severity_weights': [40, 35, 20, 5],
+        'satisfaction_range': (85, 95),  # Balanced for training
+    },
+}
+
+
+def get_environment_profile(environment: str) -> dict:
+    """Profile for an environment; unknown environments behave like training"""
+    return ENVIRONMENT_PROFILES.get(environment, ENVIRONMENT_PROFILES['training'])
@@ -0,0 +1,184 @@
+"""
+eBanking Metrics Exporter - record and replay the per-event simulation
+
+Recording wraps a BoundChildren: every label child is replaced by a proxy that
+forwards inc() / set() / observe() and appends (t, series, value) to an
+event_log.EventWriter (18 bytes per event). The series number is the child's
+position in series_table(), whose names are stored in the file, so a replay
+refuses a recording made with a different set of metrics. replay() applies the
+events to another BoundChildren at 1x, 10x or max speed.
+
+Recording hooks the loop engine (EVENT_RECORD=events.evlog); main.py replays
+with EVENT_REPLAY and REPLAY_SPEED while serving /metrics. Workloads can also
+be recorded offline, with a seeded RNG and simulated 0.5-2 s gaps between
+iterations, and replayed without a server to time the metric updates:
+
+    python recording.py record events.evlog --iterations 100000 --seed 42
+    python recording.py replay events.evlog --speed max
+    python recording.py info events.evlog
+"""
+
+import argparse
+import copy
+import logging
+import time
+
+import metrics
+from metrics import BoundChildren
+from observability_common.event_log import EventReader, EventWriter, parse_speed
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = [('t', 'd'), ('series', 'H'), ('value', 'd')]
+
+# Metric type -> the child method a replayed value is passed to
+_OPS = {'counter': 'inc', 'gauge': 'set', 'histogram': 'observe'}
+
+
+def _op(series: str) -> str:
+    # NativeHistogram has no _type
+    return _OPS[getattr(getattr(metrics, series.partition('[')[0]), '_type', 'histogram')]
+
+
+def _flatten(name: str, value, table: list):
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            _flatten(f'{name}[{i}]', item, table)
+    else:
+        table.append((name, value))
+
+
+def series_table(children: BoundChildren) -> list:
+    """(name, label child) for every child of `children`, e.g. ('transactions_processed[0][1][2]', child)"""
+    table = []
+    for name, value in vars(children).items():
+        if name not in ('environment', 'instance_labels'):
+            _flatten(name, value, table)
+    return table
+
+
+class _Recorded:
+    __slots__ = ('_child', '_series', '_recording')
+
+    def __init__(self, child, series: int, recording: 'Recording'):
+        self._child = child
+        self._series = series
+        self._recording = recording
+
+    def inc(self, amount: float = 1):
+        self._child.inc(amount)
+        self._recording.event(self._series, amount)
+
+    def set(self, value: float):
+        self._child.set(value)
+        self._recording.event(self._series, value)
+
+    def observe(self, amount: float):
+        self._child.observe(amount)
+        self._recording.event(self._series, amount)
+
+
+class Recording:
+    """`children` is a recording copy of the given BoundChildren; close() when done"""
+
+    def __init__(self, path: str, children: BoundChildren, clock=None):
+        self.table = series_table(children)
+        started = time.monotonic()
+        self.clock = clock or (lambda: time.monotonic() - started)
+        self.writer = EventWriter(path, COLUMNS, meta={
+            'source': 'ebanking-exporter',
+            'environment': children.environment,
+            'series': [name for name, _ in self.table],
+        })
+        self._append = self.writer.append
+        self.children = copy.copy(children)
+        series = iter(range(len(self.table)))
+        for name, value in vars(children).items():
+            if name not in ('environment', 'instance_labels'):
+                setattr(self.children, name, self._wrap(value, series))
+
+    def _wrap(self, value, series):
+        if isinstance(value, list):
+            return [self._wrap(item, series) for item in value]
+        return _Recorded(value, next(series), self)
+
+    def event(self, series: int, value: float):
+        self._append(self.clock(), series, value)
+
+    def close(self):
+        self.writer.close()
+
+
+def replay(path: str, children: BoundChildren, speed: float = None) -> int:
+    """Apply a recording to `children`, paced by its timestamps (None: max speed); number of events"""
+    table = series_table(children)
+    with EventReader(path) as reader:
+        if reader.meta.get('series') != [name for name, _ in table]:
+            raise ValueError(f"{path} was recorded with a different set of metrics")
+        ops = [getattr(child, _op(name)) for name, child in table]
+        events = 0
+        sleep = time.sleep
+        for delay, (_, series, value) in reader.replay(speed):
+            if delay:
+                sleep(delay)
+            ops[series](value)
+            events += 1
+    return events
+
+
+def record_offline(path: str, iterations: int, environment: str, seed: int = None) -> int:
+    """Record `iterations` loop engine iterations without sleeping; number of events"""
+    import random
+    import main
+
+    random.seed(seed)
+    clock = [0.0]
+    recording = Recording(path, BoundChildren(environment), clock=lambda: clock[0])
+    profile = main.get_environment_profile(environment)
+    try:
+        for iteration in range(1, iterations + 1):
+            main.simulate_iteration(iteration, profile, recording.children)
+            clock[0] += random.uniform(0.5, 2.0)  # the loop engine's sleep
+    finally:
+        recording.close()
+    return recording.writer.rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='record loop engine iterations offline')
+    record_parser.add_argument('path')
+    record_parser.add_argument('--iterations', type=int, default=10000)
+    record_parser.add_argument('--environment', default='training')
+    record_parser.add_argument('--seed', type=int, default=None)
+    replay_parser = commands.add_parser('replay', help='apply a recording to the metrics (no server)')
+    replay_parser.add_argument('path')
+    replay_parser.add_argument('--speed', default='max', help='1, 10, ... or max')
+    info_parser = commands.add_parser('info', help='describe a recording')
+    info_parser.add_argument('path')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.command == 'record':
+        started = time.perf_counter()
+        events = record_offline(args.path, args.iterations, args.environment, args.seed)
+        print(f"recorded {events:,} events in {time.perf_counter() - started:.1f}s to {args.path}")
+    elif args.command == 'replay':
+        with EventReader(args.path) as reader:
+            environment = reader.meta['environment']
+        started = time.perf_counter()
+        events = replay(args.path, BoundChildren(environment), parse_speed(args.speed))
+        elapsed = time.perf_counter() - started
+        print(f"replayed {events:,} events in {elapsed:.2f}s ({events / elapsed:,.0f} events/s)")
+    else:
+        with EventReader(args.path) as reader:
+            events, first, last = 0, None, None
+            for chunk in reader.chunks():
+                t = chunk['t']
+                events += len(t)
+                first = t[0] if first is None else first
+                last = t[-1]
+            span = last - first if events else 0.0
+            print(f"{args.path}: {reader.meta['source']}, environment {reader.meta['environment']}, "
+                  f"{len(reader.meta['series'])} series, {events:,} events over {span:,.1f}s")
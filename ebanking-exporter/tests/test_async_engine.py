@@ -0,0 +1,45 @@
+"""
+PRODUCER_RATES parsing and per-producer wake intervals
+
+    pip install -e ../shared && python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(HERE)), "shared"))
+
+from async_engine import AsyncEngine, parse_rates  # noqa: E402
+
+
+def test_parse_rates():
+    assert parse_rates("transactions=1000, api_requests=400.5,balances=30s,,accounts=0.5s") == {
+        "transactions": 1000.0, "api_requests": 400.5, "balances": 1 / 30, "accounts": 2.0}
+    assert parse_rates("logins=0") == {"logins": 0.0}
+    assert parse_rates("") == {}
+    assert parse_rates(None) == {}
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("payments=10", "Unknown producer 'payments'"),
+    ("transactions=-1", "Producer 'transactions': rate must be >= 0"),
+    ("balances=-5s", "Producer 'balances': rate must be >= 0"),
+    ("balances=0s", "Producer 'balances': interval must be > 0"),
+])
+def test_parse_rates_rejects(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_rates(spec)
+
+
+def test_rates_override_the_default_mix():
+    engine = AsyncEngine("training", 1000, parse_rates("transactions=200,balances=10s"), min_interval=0.05,
+                         max_interval=5.0)
+    assert engine.rates["transactions"] == 200
+    assert engine.rates["balances"] == 0.1
+    assert engine._interval(200) == 0.05  # bounded below by min_interval
+    assert engine._interval(0.1) == 5.0  # and above by max_interval
+    assert engine._interval(2) == 0.5
@@ -0,0 +1,43 @@
+"""
+Bulk histogram updates through prometheus_client internals, against observe()
+
+    pip install -e ../shared && python -m pytest tests
+"""
+
+import os
+import sys
+
+import numpy as np
+from prometheus_client import CollectorRegistry, Histogram
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(HERE)), "shared"))
+
+from batch_engine import observe_many  # noqa: E402
+
+
+def samples(registry, name: str) -> list:
+    return [(s.name[len(name):], s.labels, s.value) for family in registry.collect() if family.name == name
+            for s in family.samples if not s.name.endswith("_created")]
+
+
+def test_observe_many_matches_observe():
+    values = np.random.default_rng(5).exponential(0.2, 1000)
+    values[:3] = (0.005, 0.1, 1e9)  # on a bound, and in +Inf
+    registry = CollectorRegistry()
+    bulk = Histogram("bulk_seconds", "h", ["endpoint"], buckets=(0.005, 0.05, 0.1, 0.5, 1.0), registry=registry)
+    single = Histogram("single_seconds", "h", ["endpoint"], buckets=(0.005, 0.05, 0.1, 0.5, 1.0),
+                       registry=registry)
+
+    child = bulk.labels("/accounts")
+    counts = np.bincount(np.searchsorted(child._upper_bounds, values, side='left'),
+                         minlength=len(child._upper_bounds))
+    observe_many(child, counts, values.sum())
+    for value in values:
+        single.labels("/accounts").observe(float(value))
+
+    bulk_samples, single_samples = samples(registry, "bulk_seconds"), samples(registry, "single_seconds")
+    assert [s[:2] for s in bulk_samples] == [s[:2] for s in single_samples]
+    for (_, _, a), (_, _, b) in zip(bulk_samples, single_samples):
+        assert abs(a - b) <= 1e-9 * max(1.0, abs(b))
@@ -0,0 +1,43 @@
+"""
+INSTANCES_CONFIG expansion: defaults, replicas and instance names
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from instances import load_instances  # noqa: E402
+
+DEFAULTS = {"environment": "training", "service": "ebanking-api", "region": "eu-west-1", "cluster": "local",
+            "version": "1.0.0", "target_event_rate": 100}
+
+
+def load(tmp_path, config) -> list:
+    path = tmp_path / "instances.json"
+    path.write_text(json.dumps(config))
+    return load_instances(str(path), DEFAULTS)
+
+
+def test_names_and_replicas(tmp_path):
+    instances = load(tmp_path, {"instances": [
+        {"environment": "production", "replicas": 2},
+        {"environment": "staging", "instance": "staging-lab"},
+    ]})
+    assert [i["instance"] for i in instances] == [
+        "ebanking-api-production-eu-west-1-1", "ebanking-api-production-eu-west-1-2", "staging-lab"]
+    assert instances[0]["cluster"] == "local"
+    assert "replicas" not in instances[0]
+
+
+def test_instance_name_from_defaults(tmp_path):
+    instances = load(tmp_path, {"defaults": {"instance": "lab"}, "instances": [{"replicas": 2}]})
+    assert [i["instance"] for i in instances] == ["lab-1", "lab-2"]
+    with pytest.raises(ValueError, match="duplicate instance 'lab'"):
+        load(tmp_path, {"defaults": {"instance": "lab"}, "instances": [{}, {"environment": "staging"}]})
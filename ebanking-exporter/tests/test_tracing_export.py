@@ -0,0 +1,83 @@
+"""
+End to end: spans from the simulation engines through setup_tracing()'s file exporter
+
+    pip install -e ../shared && python -m pytest tests
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(HERE)), "shared"))
+
+import main  # noqa: E402
+from async_engine import EVENT_PRODUCERS, AsyncEngine  # noqa: E402
+from metrics import BoundChildren  # noqa: E402
+from observability_common.tracing import remove_span_processor  # noqa: E402
+from profiles import get_environment_profile  # noqa: E402
+
+TRACE_ID = re.compile(r"[0-9a-f]{32}")
+SPAN_ID = re.compile(r"[0-9a-f]{16}")
+
+
+def export_to_file(path, simulate):
+    """Run `simulate` with main's file exporter at 100% sampling; the exported OTLP/JSON requests"""
+    processor = main.setup_tracing(**{**main.TRACING_CONFIG, "exporter": "file", "file": str(path),
+                                      "sample_ratio": 1.0},
+                                   resource_attributes={"deployment.environment": "training"})
+    try:
+        simulate()
+        processor.shutdown()
+    finally:
+        remove_span_processor(processor)
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def exported_spans(requests) -> list:
+    return [span for request in requests for resource in request["resourceSpans"]
+            for scope in resource["scopeSpans"] for span in scope["spans"]]
+
+
+def test_loop_engine_spans_are_written(tmp_path):
+    children = BoundChildren("training")
+    profile = get_environment_profile("training")
+    requests = export_to_file(tmp_path / "traces.jsonl",
+                              lambda: [main.simulate_iteration(i, profile, children, trace=True) for i in (1, 2, 3)])
+
+    resource = {a["key"]: a["value"]["stringValue"] for a in requests[0]["resourceSpans"][0]["resource"]["attributes"]}
+    assert resource["service.name"] == main.TRACING_CONFIG["service_name"]
+    assert resource["deployment.environment"] == "training"
+
+    spans = exported_spans(requests)
+    assert len(spans) >= 9  # 3 to 8 API requests per iteration
+    for span in spans:
+        assert TRACE_ID.fullmatch(span["traceId"])
+        assert SPAN_ID.fullmatch(span["spanId"])
+        assert "parentSpanId" not in span
+        assert span["kind"] == 2  # server
+        assert int(span["startTimeUnixNano"]) < int(span["endTimeUnixNano"])
+        attributes = {a["key"]: a["value"] for a in span["attributes"]}
+        assert span["name"] == f'{attributes["http.method"]["stringValue"]} {attributes["http.route"]["stringValue"]}'
+        if attributes["http.status_code"]["intValue"].startswith("5"):
+            assert span["status"]["code"] == 2  # error
+
+
+def test_async_engine_spans_are_written(tmp_path):
+    engine = AsyncEngine("training", 1000, {**dict.fromkeys(EVENT_PRODUCERS, 0.0), "transactions": 100},
+                         min_interval=0.05)
+
+    async def simulate():
+        task = asyncio.create_task(engine.run(trace=True, log_interval=60))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    spans = exported_spans(export_to_file(tmp_path / "traces.jsonl", lambda: asyncio.run(simulate())))
+    assert spans
+    assert {span["name"] for span in spans} == {"ebanking.transactions"}
+    assert len({span["traceId"] for span in spans}) == len(spans)
@@ -0,0 +1,180 @@
+"""
+Historical backfill of the InfluxDB payments bucket
+
+Generates weeks or months of "payment" points offline, with the distributions
+the API uses (payment_model.py), as gzip'd line-protocol batches:
+
+    python backfill.py --days 90 --rate 5 --out backfill/payments --workers 8
+    for f in backfill/payments/*.lp.gz; do
+        influx write --bucket payments --format lp --compression gzip --file "$f"
+    done
+
+or straight to InfluxDB with --influx-url (INFLUXDB_TOKEN, INFLUXDB_ORG and
+INFLUXDB_BUCKET as for the API), one gzip'd POST per batch.
+
+The range is cut into --shard-hours shards generated in parallel by a process
+pool. Payments arrive as a Poisson process of --rate payments/s, modulated by a
+daily cycle peaking at noon UTC (--diurnal amplitude, 0 for a flat rate), and
+each shard is seeded with --seed + shard number, so the same arguments give
+the same files whatever the number of workers. Batches hold --batch-lines
+points (50,000 by default) in time order. The bucket's retention must cover
+the backfilled range or InfluxDB drops the points.
+"""
+
+import argparse
+import gzip
+import logging
+import math
+import os
+import random
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from line_protocol import LineProtocolEncoder
+from payment_model import (CARD_BRANDS, CURRENCIES, CURRENCY_WEIGHTS, DEFAULT_STATUS_RATES, PAYMENT_FIELDS,
+                           PAYMENT_METHODS, PAYMENT_TAGS, REGIONS, RISK_LEVELS, RISK_WEIGHTS, draw_status,
+                           generate_processing_time, generate_realistic_amount)
+
+logger = logging.getLogger(__name__)
+
+INFLUX_CONFIG = {
+    "token": os.getenv("INFLUXDB_TOKEN", "my-super-secret-auth-token"),
+    "org": os.getenv("INFLUXDB_ORG", "myorg"),
+    "bucket": os.getenv("INFLUXDB_BUCKET", "payments"),
+    "field_dimensions": os.getenv("INFLUXDB_FIELD_DIMENSIONS", "customer_id").split(",")
+}
+
+
+def diurnal(ts: float, amplitude: float) -> float:
+    """Rate multiplier at `ts`: 1 + amplitude at noon UTC, 1 - amplitude at midnight"""
+    hour = (ts % 86400) / 3600
+    return 1.0 + amplitude * math.sin(2 * math.pi * (hour - 6) / 24)
+
+
+def payments(start: float, end: float, rate: float, amplitude: float):
+    """(timestamp, tags, fields) of every payment in [start, end)
+
+    Thinning: candidates arrive at the peak rate and are kept with probability
+    rate(t) / peak, which yields a Poisson process of rate(t).
+    """
+    peak = rate * (1.0 + amplitude)
+    t = start
+    while True:
+        t += random.expovariate(peak)
+        if t >= end:
+            return
+        if random.random() * (1.0 + amplitude) > diurnal(t, amplitude):
+            continue
+        status = draw_status(*DEFAULT_STATUS_RATES)
+        amount = generate_realistic_amount()
+        processing_time = generate_processing_time(status)
+        tags = (
+            status,
+            random.choices(CURRENCIES, weights=CURRENCY_WEIGHTS)[0],
+            random.choice(PAYMENT_METHODS),
+            random.choice(REGIONS),
+            random.choice(CARD_BRANDS),
+            random.choices(RISK_LEVELS, weights=RISK_WEIGHTS)[0],
+        )
+        yield t, tags, (amount, processing_time, 1 if status == "success" else 0)
+
+
+def upload(url: str, body: bytes, retries: int = 3):
+    """POST one gzip'd batch to /api/v2/write, retrying 429 and 5xx with backoff"""
+    query = urllib.parse.urlencode({"org": INFLUX_CONFIG["org"], "bucket": INFLUX_CONFIG["bucket"],
+                                    "precision": "ns"})
+    request = urllib.request.Request(f"{url.rstrip('/')}/api/v2/write?{query}", data=body, method="POST", headers={
+        "Authorization": f"Token {INFLUX_CONFIG['token']}",
+        "Content-Type": "text/plain; charset=utf-8",
+        "Content-Encoding": "gzip",
+    })
+    for attempt in range(retries + 1):
+        try:
+            with urllib.request.urlopen(request, timeout=60):
+                return
+        except urllib.error.HTTPError as e:
+            if attempt == retries or (e.code != 429 and e.code < 500):
+                raise RuntimeError(f"InfluxDB write failed: HTTP {e.code} {e.read()[:200]!r}") from None
+            time.sleep(float(e.headers.get("Retry-After") or 2 ** attempt))
+
+
+def backfill_shard(shard: int, start: float, end: float, args) -> tuple:
+    """Write (and optionally upload) the batches of one shard; (payments, files, bytes)"""
+    random.seed(args.seed + shard)
+    encoder = LineProtocolEncoder("payment", PAYMENT_TAGS, PAYMENT_FIELDS, INFLUX_CONFIG["field_dimensions"])
+    prefix = os.path.join(args.out, f"payments-{datetime.fromtimestamp(start, timezone.utc):%Y%m%dT%H%M}")
+    count, files, size = 0, 0, 0
+    lines = []
+
+    def flush():
+        nonlocal files, size
+        body = gzip.compress(("\n".join(lines) + "\n").encode(), compresslevel=6)
+        with open(f"{prefix}-{files:04d}.lp.gz", "wb") as f:
+            f.write(body)
+        if args.influx_url:
+            upload(args.influx_url, body)
+        files += 1
+        size += len(body)
+        lines.clear()
+
+    encode = encoder.encode
+    for t, tags, fields in payments(start, end, args.rate, args.diurnal):
+        lines.append(encode(tags, fields, int(t * 1e9)))
+        count += 1
+        if len(lines) >= args.batch_lines:
+            flush()
+    if lines:
+        flush()
+    return count, files, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=30, help="length of the backfilled range")
+    parser.add_argument("--end", default=None, help="end of the range, ISO 8601 UTC (default: now, hour aligned)")
+    parser.add_argument("--rate", type=float, default=2.0, help="mean payments/s")
+    parser.add_argument("--diurnal", type=float, default=0.5, help="daily rate swing, 0 to 1")
+    parser.add_argument("--shard-hours", type=int, default=24, help="hours generated per task")
+    parser.add_argument("--batch-lines", type=int, default=50000, help="points per .lp.gz batch")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--out", default="backfill")
+    parser.add_argument("--influx-url", default=None, help="also write every batch to this InfluxDB")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if args.rate <= 0 or not 0 <= args.diurnal <= 1:
+        parser.error("--rate must be positive and --diurnal between 0 and 1")
+    if args.seed is None:
+        args.seed = random.randrange(2 ** 31)
+        logger.info(f"Seed {args.seed} (pass --seed {args.seed} to regenerate the same files)")
+
+    end = datetime.fromisoformat(args.end) if args.end else datetime.now(timezone.utc)
+    end = (end if end.tzinfo else end.replace(tzinfo=timezone.utc)).replace(minute=0, second=0, microsecond=0)
+    shard_seconds = args.shard_hours * 3600
+    shards = max(1, round(args.days * 24 / args.shard_hours))
+    first = (end - timedelta(seconds=shards * shard_seconds)).timestamp()
+    starts = [first + shard * shard_seconds for shard in range(shards)]
+    ends = [start + shard_seconds for start in starts]
+    os.makedirs(args.out, exist_ok=True)
+    logger.info(f"Backfilling payments: {shards} shards of {args.shard_hours}h from "
+                f"{datetime.fromtimestamp(first, timezone.utc):%Y-%m-%d %H:%M} to {end:%Y-%m-%d %H:%M} UTC, "
+                f"~{args.rate * shards * shard_seconds:,.0f} payments, {args.workers} workers"
+                + (f", writing to {args.influx_url}" if args.influx_url else ""))
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(backfill_shard, range(shards), starts, ends, [args] * shards))
+    elapsed = time.perf_counter() - started
+    count = sum(shard_count for shard_count, _, _ in results)
+    logger.info(f"Wrote {count:,} payments in {sum(files for _, files, _ in results)} batches "
+                f"({sum(size for _, _, size in results) / 1e6:,.1f} MB) to {args.out} in {elapsed:.1f}s "
+                f"({count / elapsed:,.0f} payments/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: payment throughput vs. concurrency
+
+Drives POST /api/payments at several concurrency levels and reports req/s.
+By default the app is loaded in-process (httpx ASGI transport, InfluxDB pointed
+at a closed local port); use --url to target a running server instead.
+
+--blocking restores the old behaviour (time.sleep inside the async handler)
+so both curves can be produced from the same tree:
+
+    python benchmarks/bench_concurrency.py --blocking
+    python benchmarks/bench_concurrency.py
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+def load_app(blocking: bool):
+    """Import main.py with InfluxDB unreachable (connection refused, no DNS wait)"""
+    os.environ.setdefault("INFLUXDB_URL", "http://127.0.0.1:9")
+    import logging
+    import main
+
+    logging.getLogger("main").setLevel(logging.CRITICAL)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if blocking:
+        class _BlockingAsyncio:
+            """Stand-in for the asyncio module as seen by main.py"""
+
+            def __getattr__(self, name):
+                return getattr(asyncio, name)
+
+            @staticmethod
+            async def sleep(delay):
+                time.sleep(delay)
+
+            @staticmethod
+            async def to_thread(func, *args, **kwargs):
+                return func(*args, **kwargs)
+
+        main.asyncio = _BlockingAsyncio()
+    return main.app
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests: int) -> float:
+    """Send `requests` payments with at most `concurrency` in flight, return req/s"""
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await client.post("/api/payments", json={"amount": 0.0, "currency": "EUR"})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main_async(args):
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60,
+                                   limits=httpx.Limits(max_connections=max(args.levels)))
+    else:
+        # Failed payments surface as 500s; count them as completed requests
+        transport = httpx.ASGITransport(app=load_app(args.blocking), raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60)
+
+    mode = "blocking (time.sleep)" if args.blocking else "non-blocking (asyncio.sleep)"
+    print(f"Mode: {mode if not args.url else args.url}")
+    print(f"{'concurrency':>12} {'requests':>9} {'req/s':>9}")
+    async with client:
+        for level in args.levels:
+            requests = max(args.requests, level * 2)
+            if args.blocking:
+                # ~0.3 s per payment, serialized: keep the run short
+                requests = min(requests, args.requests)
+            rps = await run_level(client, level, requests)
+            print(f"{level:>12} {requests:>9} {rps:>9.1f}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target a running server (e.g. http://localhost:8080)")
+    parser.add_argument("--blocking", action="store_true", help="Simulate the old blocking handler (in-process only)")
+    parser.add_argument("--requests", type=int, default=40, help="Minimum requests per concurrency level")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 100, 1000])
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async(parse_args()))
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: payment ledger memory per payment, append, lookup and range-scan cost
+
+Fills a PaymentLedger with --payments payments and reports bytes per payment
+(tracemalloc, so array over-allocation counts), appends/s, get() by ID and
+scan() of 100 payments by time. For comparison, --baseline payments are also
+held as one dict per payment and as one pydantic model per payment, each
+keyed by ID in a dict.
+
+    python benchmarks/bench_ledger.py --payments 1000000 --baseline 100000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from pydantic import BaseModel
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ledger import PaymentLedger  # noqa: E402
+from payment_model import CARD_BRANDS, CURRENCIES, PAYMENT_METHODS, PAYMENT_STATUSES, REGIONS, RISK_LEVELS  # noqa: E402
+
+LABELS = {"status": PAYMENT_STATUSES, "currency": CURRENCIES, "payment_method": PAYMENT_METHODS,
+          "region": REGIONS, "card_brand": CARD_BRANDS, "risk_level": RISK_LEVELS}
+
+
+class PaymentRecord(BaseModel):
+    payment_id: str
+    timestamp: str
+    status: str
+    amount: float
+    currency: str
+    payment_method: str
+    region: str
+    card_brand: str
+    risk_level: str
+    processing_time_ms: float
+
+
+def draw(rnd: random.Random, n: int, start: float) -> list:
+    sizes = [len(values) for values in LABELS.values()]
+    return [(start + i * 0.001, round(rnd.gauss(75, 45), 2), round(rnd.uniform(0.05, 1.5), 3),
+             *(rnd.randrange(size) for size in sizes)) for i in range(n)]
+
+
+def measured(build) -> tuple:
+    """(result, bytes allocated by build())"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+
+def fill_ledger(rows) -> PaymentLedger:
+    ledger = PaymentLedger(LABELS, capacity=len(rows))
+    for row in rows:
+        ledger.append(*row)
+    return ledger
+
+
+def as_dict(ledger: PaymentLedger, seq: int, row) -> dict:
+    t, amount, processing_time, *codes = row
+    record = {"payment_id": ledger.format_id(seq), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(t)),
+              "amount": amount, "processing_time_ms": round(processing_time * 1000, 2)}
+    record.update((name, values[code]) for (name, values), code in zip(LABELS.items(), codes))
+    return record
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=1000000)
+    parser.add_argument("--baseline", type=int, default=100000, help="payments held as dicts / pydantic models")
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    rnd = random.Random(args.seed)
+    rows = draw(rnd, args.payments, time.time())
+
+    start = time.perf_counter()
+    fill_ledger(rows)
+    append_rate = len(rows) / (time.perf_counter() - start)
+    ledger, ledger_bytes = measured(lambda: fill_ledger(rows))
+
+    ids = [ledger.format_id(rnd.randrange(ledger.oldest, ledger.next)) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for payment_id in ids:
+        ledger.get(payment_id)
+    get_us = (time.perf_counter() - start) / len(ids) * 1e6
+    times = [rnd.uniform(rows[0][0], rows[-1][0]) for _ in range(args.lookups // 10)]
+    start = time.perf_counter()
+    for since in times:
+        ledger.scan(since, limit=100)
+    scan_us = (time.perf_counter() - start) / len(times) * 1e6
+
+    sample = rows[:args.baseline]
+    dicts, dict_bytes = measured(lambda: {ledger.format_id(i): as_dict(ledger, i, row) for i, row in enumerate(sample)})
+    del dicts
+    models, model_bytes = measured(lambda: {ledger.format_id(i): PaymentRecord(**as_dict(ledger, i, row))
+                                            for i, row in enumerate(sample)})
+
+    print(f"{len(ledger):,} payments in the ledger: {ledger_bytes / 1e6:,.1f} MB, "
+          f"{ledger_bytes / len(ledger):.1f} bytes/payment ({ledger.bytes_per_payment()} bytes of columns)")
+    print(f"append {append_rate:,.0f} payments/s, get {get_us:.2f} us, scan of 100 {scan_us:.1f} us")
+    print(f"{'storage':<22} {'bytes/payment':>14} {'vs ledger':>10}")
+    for name, size in (("ledger (columns)", ledger_bytes / len(ledger)), ("dict per payment", dict_bytes / len(sample)),
+                       ("pydantic per payment", model_bytes / len(sample))):
+        print(f"{name:<22} {size:>14,.0f} {size / (ledger_bytes / len(ledger)):>9.1f}x")
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: payment points/s, influxdb_client.Point vs. LineProtocolEncoder
+
+Encodes the main-influxdb.py "payment" measurement (8 tags, 10 fields) from the
+same pre-drawn values both ways, after checking that both produce identical
+line protocol.
+
+    python benchmarks/bench_line_protocol.py --points 200000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+from influxdb_client import Point
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from line_protocol import LineProtocolEncoder  # noqa: E402
+
+TAGS = ["status", "currency", "customer_id", "merchant_id", "payment_method", "region", "card_brand", "risk_level"]
+FIELDS = {"amount": "float", "processing_time": "float", "network_latency": "float", "gateway_latency": "float",
+          "error_code": "int", "retry_count": "int", "fraud_score": "float", "response_time": "float",
+          "fee": "float", "success": "int"}
+
+
+def draw(rnd: random.Random, n: int) -> list:
+    samples = []
+    for _ in range(n):
+        ok = rnd.random() < 0.97
+        amount = round(rnd.gauss(75, 45), 2)
+        processing_time = round(rnd.uniform(0.05, 1.5), 3)
+        tags = ("success" if ok else "failed", rnd.choice(["EUR", "USD", "GBP"]), f"cust_{rnd.randint(1, 5000):05d}",
+                f"merch_{rnd.randint(1, 500):04d}", rnd.choice(["card", "bank_transfer", "wallet", "crypto"]),
+                rnd.choice(["EU", "US", "ASIA", "LATAM"]), rnd.choice(["VISA", "MASTERCARD", "AMEX", "DISCOVER"]),
+                rnd.choice(["low", "medium", "high", "critical"]))
+        fields = (amount, processing_time, round(rnd.uniform(5, 50), 1), round(rnd.uniform(10, 100), 1),
+                  0 if ok else rnd.randint(5001, 5010), 0 if ok else rnd.randint(1, 3),
+                  round(rnd.uniform(0, 0.05), 3), processing_time * 1000, round(amount * 0.029 + 0.30, 2),
+                  1 if ok else 0)
+        samples.append((tags, fields, time.time_ns()))
+    return samples
+
+
+def with_point(tags, fields, ts, field_dimensions) -> str:
+    point = Point("payment")
+    for key, value in zip(TAGS, tags):
+        if key in field_dimensions:
+            point.field(key, value)
+        else:
+            point.tag(key, value)
+    for key, value in zip(FIELDS, fields):
+        point.field(key, value)
+    point.time(ts)
+    return point.to_line_protocol()
+
+
+def bench(encode, samples) -> float:
+    start = time.perf_counter()
+    for tags, fields, ts in samples:
+        encode(tags, fields, ts)
+    return len(samples) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    samples = draw(random.Random(args.seed), args.points)
+    print(f"{'customer_id as':<16} {'Point points/s':>16} {'encoder points/s':>18} {'speedup':>8}")
+    for field_dimensions in ((), ("customer_id",)):
+        encoder = LineProtocolEncoder("payment", TAGS, FIELDS, field_dimensions=field_dimensions)
+        for tags, fields, ts in samples[:1000]:
+            expected = with_point(tags, fields, ts, field_dimensions)
+            assert encoder.encode(tags, fields, ts) == expected, (encoder.encode(tags, fields, ts), expected)
+
+        base = bench(lambda t, f, ts: with_point(t, f, ts, field_dimensions), samples)
+        fast = bench(encoder.encode, samples)
+        label = "field" if field_dimensions else "tag"
+        print(f"{label:<16} {base:>16,.0f} {fast:>18,.0f} {fast / base:>7.2f}x")
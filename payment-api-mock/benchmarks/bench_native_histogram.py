@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark: classic vs. native histogram for payment_processing_duration_seconds
+
+Feeds the same processing times (payment_model.generate_processing_time with
+the default 84/1/15 success/failed/pending mix, spread over the 192 status x
+payment_method x region x card_brand label sets) into the 9-bucket classic
+histogram and into a native histogram. Reports stored series (classic: one per
+bucket plus _count and _sum; native: one per label set), scrape size (text and
+protobuf) and the error of service-wide quantiles against the exact values.
+Quantiles are interpolated linearly inside a bucket, like histogram_quantile().
+
+    python benchmarks/bench_native_histogram.py --observations 200000 --schema 3
+"""
+
+import argparse
+import gzip
+import itertools
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from prometheus_client import CollectorRegistry, Histogram, generate_latest  # noqa: E402
+
+from observability_common.native_histogram import NativeHistogram, generate_protobuf  # noqa: E402
+
+LABELS = ['status', 'payment_method', 'region', 'card_brand']
+BUCKETS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1.0, 2.0, 5.0]
+QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+
+def processing_time(rnd: random.Random, status: str) -> float:
+    # Same distribution as payment_model.generate_processing_time
+    if status == "success":
+        return max(0.05, round(rnd.gauss(0.24, 0.10), 3))
+    return max(0.1, round(rnd.gauss(0.80, 0.35), 3))
+
+
+def draw(n: int, seed: int) -> list:
+    rnd = random.Random(seed)
+    combos = list(itertools.product(["card", "bank_transfer", "wallet", "crypto"], ["EU", "US", "ASIA", "LATAM"],
+                                    ["VISA", "MASTERCARD", "AMEX", "DISCOVER"]))
+    samples = []
+    for _ in range(n):
+        status = rnd.choices(["success", "failed", "pending"], weights=[84, 1, 15])[0]
+        samples.append(((status,) + rnd.choice(combos), processing_time(rnd, status)))
+    return samples
+
+
+def classic_quantile(q: float, bounds: list, counts: list) -> float:
+    """histogram_quantile() over cumulative classic buckets"""
+    rank = q * counts[-1]
+    for i, cumulative in enumerate(counts):
+        if cumulative >= rank:
+            lower = bounds[i - 1] if i else 0.0
+            previous = counts[i - 1] if i else 0
+            if bounds[i] == float("inf"):
+                return lower
+            return lower + (bounds[i] - lower) * (rank - previous) / max(cumulative - previous, 1)
+    return bounds[-2]
+
+
+def native_quantile(q: float, schema: int, buckets: dict) -> float:
+    total = sum(buckets.values())
+    rank, seen = q * total, 0
+    base = 2 ** (2.0 ** -schema)
+    for key in sorted(buckets):
+        if seen + buckets[key] >= rank:
+            lower, upper = base ** (key - 1), base ** key
+            return lower + (upper - lower) * (rank - seen) / buckets[key]
+        seen += buckets[key]
+    return base ** max(buckets)
+
+
+def exposition(registry) -> tuple:
+    text = generate_latest(registry)
+    proto = generate_protobuf(registry)
+    return len(text), len(gzip.compress(text)), len(proto), len(gzip.compress(proto))
+
+
+def stored_series(registry) -> int:
+    series = 0
+    for family in registry.collect():
+        native = getattr(family, "native_histograms", None)
+        if native is not None:
+            series += len(native)
+        else:
+            series += sum(1 for sample in family.samples if not sample.name.endswith("_created"))
+    return series
+
+
+def merged_classic(registry, name: str) -> list:
+    """Cumulative bucket counts summed over all label sets"""
+    counts = [0.0] * (len(BUCKETS) + 1)
+    for family in registry.collect():
+        for sample in family.samples:
+            if sample.name == name + "_bucket":
+                counts[BUCKETS.index(float(sample.labels["le"])) if sample.labels["le"] != "+Inf" else -1] += sample.value
+    return counts
+
+
+def merged_native(histogram) -> tuple:
+    snapshots = [child.snapshot() for child in histogram._children.values()]
+    schema = min(s[0] for s in snapshots)
+    buckets = {}
+    for child_schema, _, _, _, _, child_buckets in snapshots:
+        shift = child_schema - schema
+        for key, count in child_buckets.items():
+            key = -((-key) >> shift)
+            buckets[key] = buckets.get(key, 0) + count
+    return schema, buckets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--observations", type=int, default=200000)
+    parser.add_argument("--schema", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    name = "payment_processing_duration_seconds"
+    samples = draw(args.observations, args.seed)
+    classic_registry, native_registry = CollectorRegistry(), CollectorRegistry()
+    classic = Histogram(name, "Processing time per transaction", LABELS, buckets=BUCKETS, registry=classic_registry)
+    native = NativeHistogram(name, "Processing time per transaction", LABELS, schema=args.schema,
+                             registry=native_registry)
+    for labels, value in samples:
+        classic.labels(*labels).observe(value)
+        native.labels(*labels).observe(value)
+
+    print(f"{'mode':<10} {'series':>7} {'text B':>9} {'text gz B':>10} {'proto B':>9} {'proto gz B':>11}")
+    for mode, registry in (("classic", classic_registry), ("native", native_registry)):
+        sizes = (stored_series(registry),) + exposition(registry)
+        print(f"{mode:<10} " + " ".join(f"{v:>{w},}" for v, w in zip(sizes, (7, 9, 10, 9, 11))))
+
+    exact = sorted(value for _, value in samples)
+    cumulative = merged_classic(classic_registry, name)
+    schema, buckets = merged_native(native)
+    print(f"\n{'quantile':<9} {'exact s':>8} {'classic s':>10} {'error':>7} {'native s':>9} {'error':>7}")
+    for q in QUANTILES:
+        true = exact[min(len(exact) - 1, int(q * len(exact)))]
+        c = classic_quantile(q, BUCKETS + [float("inf")], cumulative)
+        n = native_quantile(q, schema, buckets)
+        print(f"p{q * 100:<8g} {true:>8.3f} {c:>10.3f} {abs(c - true) / true:>6.1%} {n:>9.3f} {abs(n - true) / true:>6.1%}")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /metrics scrape latency vs. series count
+
+For each series count, a registry exposing that many counter series with the
+payment label set is rendered through metrics_cache.MetricsCache and timed:
+
+- uncached:  fresh render in a worker thread (what every scrape used to pay)
+- gzip:      fresh render + gzip compression
+- cached:    scrape served from a fresh cache entry
+- loop busy: time the event loop is blocked by an uncached scrape (the render
+             itself runs off the loop, so this stays near zero)
+
+    python benchmarks/bench_scrape.py --series 10000 100000 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+from prometheus_client import CollectorRegistry
+from prometheus_client.core import CounterMetricFamily
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from metrics_cache import MetricsCache  # noqa: E402
+
+LABELS = ['status', 'currency', 'payment_method', 'region', 'card_brand']
+
+
+class SyntheticCollector:
+    """Exposes `series` pre-built counter samples (measures serialization only)"""
+
+    def __init__(self, series: int):
+        self.family = CounterMetricFamily('payment_count', 'Synthetic payment series', labels=LABELS)
+        for i in range(series):
+            self.family.add_metric(
+                ["success", f"C{i % 50}", f"m{(i // 50) % 40}", f"r{(i // 2000) % 25}", f"b{i // 50000}"],
+                float(i)
+            )
+
+    def collect(self):
+        yield self.family
+
+
+async def timed(coro_factory, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coro_factory()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def loop_blocked_ms(cache: MetricsCache) -> float:
+    """Longest gap seen by a 1 ms ticker while an uncached scrape is in progress"""
+    worst = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal worst
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            worst = max(worst, now - last - 0.001)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await cache.get()
+    done = True
+    await task
+    return worst * 1000
+
+
+async def run(series: int, repeat: int):
+    registry = CollectorRegistry()
+    registry.register(SyntheticCollector(series))
+    uncached = MetricsCache(registry, max_age=0)
+    cached = MetricsCache(registry, max_age=3600)
+
+    entry, _ = await cached.get(want_gzip=True)
+    text_ms = await timed(lambda: uncached.get(), repeat)
+    gzip_ms = await timed(lambda: uncached.get(want_gzip=True), repeat)
+    hit_ms = await timed(lambda: cached.get(want_gzip=True), max(repeat, 100))
+    blocked_ms = await loop_blocked_ms(uncached)
+    return text_ms, gzip_ms, hit_ms, blocked_ms, len(entry.body), len(entry.gzipped)
+
+
+async def main_async(args):
+    print(f"{'series':>9} {'uncached ms':>12} {'gzip ms':>9} {'cached ms':>10} "
+          f"{'loop busy ms':>13} {'text MB':>8} {'gzip MB':>8}")
+    for series in args.series:
+        repeat = 3 if series < 1000000 else 1
+        text_ms, gzip_ms, hit_ms, blocked_ms, size, gz_size = await run(series, repeat)
+        print(f"{series:>9} {text_ms:>12.1f} {gzip_ms:>9.1f} {hit_ms:>10.3f} "
+              f"{blocked_ms:>13.1f} {size / 1e6:>8.1f} {gz_size / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, nargs="+", default=[10000, 100000, 1000000])
+    asyncio.run(main_async(parser.parse_args()))
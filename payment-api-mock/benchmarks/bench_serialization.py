@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request CPU and latency, FastAPI/pydantic path vs. FAST_SERIALIZATION
+
+Calls the ASGI app directly (no HTTP client or server, whose own CPU would
+blur the difference) with `--concurrency` requests in flight, and reports CPU
+per request (process time / requests), throughput and p50/p99 latency for
+POST /api/payments and GET /health. The processing delay is zeroed and every
+payment succeeds, so what is left is the request path itself: middleware,
+metrics, tracing and serialization. Each mode runs in its own interpreter
+(FAST_SERIALIZATION is read at import), with InfluxDB disabled.
+
+    python benchmarks/bench_serialization.py --requests 20000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+MODES = {"pydantic": "false", "fast": "true"}
+PAYMENT = json.dumps({"amount": 120.5, "currency": "EUR", "customer_id": "cust-42",
+                      "description": "benchmark payment"}).encode()
+ALWAYS_SUCCEED = [(b"x-success-rate", b"100"), (b"x-failure-rate", b"0"), (b"x-pending-rate", b"0")]
+
+
+async def call(app, method: str, path: str, body: bytes = b"") -> int:
+    """One request straight through the ASGI app; returns the status code"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()), *ALWAYS_SUCCEED],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    received = False
+    status = None
+
+    async def receive():
+        nonlocal received
+        if received:
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app, method: str, path: str, body: bytes, requests: int, concurrency: int) -> dict:
+    latencies = []
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            status = await call(app, method, path, body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"{method} {path}: HTTP {status}")
+
+    cpu, wall = time.process_time(), time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    latencies.sort()
+    return {"cpu_us": cpu / requests * 1e6, "rps": requests / wall,
+            "p50_ms": latencies[len(latencies) // 2] * 1000, "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000}
+
+
+def run_worker(args):
+    """Child process: import main with the mode's environment and print the results as JSON"""
+    sys.path.insert(0, APP_DIR)
+    import logging
+    import main
+
+    logging.getLogger("main").setLevel(logging.CRITICAL)
+    main.generate_processing_time = lambda status: 0.0
+
+    async def run():
+        results = {}
+        for method, path, body in (("POST", "/api/payments", PAYMENT), ("GET", "/health", b"")):
+            await measure(main.app, method, path, body, min(1000, args.requests), args.concurrency)  # warm-up
+            results[f"{method} {path}"] = await measure(main.app, method, path, body, args.requests, args.concurrency)
+        return results
+
+    print(json.dumps(asyncio.run(run())))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args)
+        sys.exit()
+
+    results = {}
+    for mode, flag in MODES.items():
+        env = {**os.environ, "FAST_SERIALIZATION": flag, "INFLUXDB_ENABLED": "false"}
+        out = subprocess.run([sys.executable, __file__, "--worker", "--requests", str(args.requests),
+                              "--concurrency", str(args.concurrency)],
+                             env=env, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(out.splitlines()[-1])
+
+    print(f"{args.requests} requests per endpoint, {args.concurrency} in flight")
+    print(f"{'endpoint':<20} {'mode':<9} {'CPU us/req':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for endpoint in results["pydantic"]:
+        for mode in MODES:
+            r = results[mode][endpoint]
+            print(f"{endpoint:<20} {mode:<9} {r['cpu_us']:>10.0f} {r['rps']:>8,.0f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        before, after = results["pydantic"][endpoint]["cpu_us"], results["fast"][endpoint]["cpu_us"]
+        print(f"{'':<20} {'':<9} {(before - after) / before:>10.0%} less CPU")
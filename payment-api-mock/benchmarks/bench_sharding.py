@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request metric updates, prometheus_client vs. sharded metrics
+
+Each simulated request does the same five updates as POST /api/payments plus the
+middleware (PAYMENT_COUNT, PAYMENT_AMOUNT, PAYMENT_PROCESSING_DURATION,
+REQUEST_COUNT, REQUEST_LATENCY) with random labels. --requests requests are
+split across 1, 8 and 32 threads; throughput is requests/s for the whole run.
+
+    python benchmarks/bench_sharding.py --requests 200000 --threads 1 8 32
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from sharded_metrics import ShardedCounter, ShardedHistogram  # noqa: E402
+
+LABELS = ['status', 'currency', 'payment_method', 'region', 'card_brand']
+BUCKETS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1.0, 2.0, 5.0]
+
+
+def build(counter_cls, histogram_cls):
+    registry = CollectorRegistry()
+    return registry, (
+        counter_cls('payment_count_total', 'count', LABELS, registry=registry),
+        counter_cls('payment_amount_sum', 'amount', LABELS, registry=registry),
+        histogram_cls('payment_processing_duration_seconds', 'duration', LABELS[:1] + LABELS[2:],
+                      buckets=BUCKETS, registry=registry),
+        counter_cls('payment_requests_total', 'requests', ['method', 'endpoint', 'status'], registry=registry),
+        histogram_cls('payment_request_duration_seconds', 'latency', ['method', 'endpoint'], registry=registry),
+    )
+
+
+def workload(metrics, n: int, seed: int):
+    count, amount, duration, requests, latency = metrics
+    rnd = random.Random(seed)
+    draws = [(rnd.choice(["success", "failed", "pending"]), rnd.choice(["EUR", "USD", "GBP"]),
+              rnd.choice(["card", "bank_transfer", "wallet", "crypto"]), rnd.choice(["EU", "US", "ASIA", "LATAM"]),
+              rnd.choice(["VISA", "MASTERCARD", "AMEX", "DISCOVER"]), rnd.uniform(0.05, 1.5)) for _ in range(1000)]
+
+    def run():
+        for i in range(n):
+            status, currency, method, region, brand, seconds = draws[i % 1000]
+            count.labels(status=status, currency=currency, payment_method=method, region=region, card_brand=brand).inc()
+            amount.labels(status=status, currency=currency, payment_method=method, region=region,
+                          card_brand=brand).inc(seconds * 100)
+            duration.labels(status=status, payment_method=method, region=region, card_brand=brand).observe(seconds)
+            requests.labels("POST", "/api/payments", 200).inc()
+            latency.labels("POST", "/api/payments").observe(seconds)
+    return run
+
+
+def bench(counter_cls, histogram_cls, threads: int, total: int) -> float:
+    registry, metrics = build(counter_cls, histogram_cls)
+    per_thread = total // threads
+    workers = [threading.Thread(target=workload(metrics, per_thread, seed)) for seed in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    # Sanity check: merged totals must match what was written
+    text = generate_latest(registry).decode()
+    written = sum(float(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+                  if line.startswith("payment_requests_total{"))
+    assert written == per_thread * threads, (written, per_thread * threads)
+    return per_thread * threads / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'prometheus_client req/s':>24} {'sharded req/s':>14} {'speedup':>8}")
+    for threads in args.threads:
+        base = bench(Counter, Histogram, threads, args.requests)
+        sharded = bench(ShardedCounter, ShardedHistogram, threads, args.requests)
+        print(f"{threads:>8} {base:>24,.0f} {sharded:>14,.0f} {sharded / base:>7.2f}x")
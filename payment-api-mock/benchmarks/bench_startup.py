@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start of the payment API
+
+Each run starts a fresh interpreter and reports:
+- import: time to `import main`
+- health: process spawn to the first 200 on /health (uvicorn serving)
+- ready: process spawn to the first 200 on /ready (lifespan startup done)
+- first payment: process spawn to the response of the first POST /api/payments,
+  minus its simulated processing delay
+
+--eager imports influxdb_client before main, as main.py did at import time
+before the client was built lazily, so both can be measured from the same tree:
+
+    python benchmarks/bench_startup.py --eager
+    python benchmarks/bench_startup.py
+    INFLUXDB_ENABLED=false AUTO_INSTRUMENTATION=false python benchmarks/bench_startup.py
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+EAGER_IMPORTS = "import influxdb_client.client.write_api; "
+
+
+def app_env() -> dict:
+    """InfluxDB unreachable (connection refused, no DNS wait) and no spool files"""
+    env = dict(os.environ)
+    env.setdefault("INFLUXDB_URL", "http://127.0.0.1:9")
+    env.setdefault("INFLUXDB_SPOOL_DIR", "")
+    return env
+
+
+def import_time(eager: bool) -> float:
+    code = ("import time; start = time.perf_counter(); " + (EAGER_IMPORTS if eager else "")
+            + "import main; print(time.perf_counter() - start)")
+    out = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, env=app_env(), check=True,
+                         capture_output=True, text=True).stdout
+    return float(out.split()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, data: bytes = None) -> tuple:
+    """(status, body)"""
+    # Always succeeds, so the response reports the processing delay
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json", "X-Success-Rate": "100",
+                                                          "X-Failure-Rate": "0", "X-Pending-Rate": "0"})
+    try:
+        with urllib.request.urlopen(req, timeout=10) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def wait_for(url: str, start: float, timeout: float = 60.0) -> float:
+    """Seconds from `start` to the first 200 on `url`"""
+    while time.perf_counter() - start < timeout:
+        try:
+            if request(url)[0] == 200:
+                return time.perf_counter() - start
+        except OSError:
+            pass  # not listening yet
+        time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def serve_times(eager: bool) -> tuple:
+    """(health, ready, first payment) seconds from process spawn"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    code = ((EAGER_IMPORTS if eager else "")
+            + f"import uvicorn; uvicorn.run('main:app', host='127.0.0.1', port={port}, log_level='warning')")
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-c", code], cwd=APP_DIR, env=app_env(),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        health = wait_for(f"{base}/health", start)
+        ready = wait_for(f"{base}/ready", start)
+        _, body = request(f"{base}/api/payments", json.dumps({"amount": 10.0}).encode())
+        first_payment = time.perf_counter() - start - json.loads(body)["processing_time_ms"] / 1000
+    finally:
+        server.terminate()
+        server.wait()
+    return health, ready, first_payment
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="import influxdb_client up front (old behaviour)")
+    args = parser.parse_args()
+
+    imports = [import_time(args.eager) for _ in range(args.runs)]
+    serves = [serve_times(args.eager) for _ in range(args.runs)]
+    if os.getenv("INFLUXDB_ENABLED", "true").lower() not in ("1", "true", "yes"):
+        mode = "InfluxDB disabled"
+    else:
+        mode = "eager InfluxDB client" if args.eager else "lazy InfluxDB client"
+    print(f"{mode}, medians of {args.runs} runs")
+    print(f"{'import main':<16} {statistics.median(imports) * 1000:8.0f} ms")
+    for name, values in zip(("health", "ready", "first payment"), zip(*serves)):
+        print(f"{name:<16} {statistics.median(values) * 1000:8.0f} ms")
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-request tracing overhead at 0%, 1% and 100% head sampling
+
+Each simulated request does what the middleware and POST /api/payments do
+around tracing: a server span continuing no traceparent, attributes, a child
+span for payment processing, and the traceparent response header. Spans go
+through BatchSpanProcessor to a FileExporter writing OTLP/JSON to /dev/null, so
+the export thread's encoding cost is included. The clock stops after the
+final flush. Tail sampling is off, so only the head sampling ratio decides.
+
+Overhead is relative to the same loop without any span. A mode fails if it
+exceeds its budget: 15 us/request up to 1% sampling and 50 us/request at 100%.
+A POST /api/payments costs ~2.5 ms of CPU through the ASGI stack on the same
+machine, so this is under 1% and 2% of a request.
+
+    python benchmarks/bench_tracing.py --requests 200000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from observability_common.otlp import BatchSpanProcessor, FileExporter  # noqa: E402
+from observability_common.tracing import (  # noqa: E402
+    add_span_processor, remove_span_processor, set_sample_ratio, start_span
+)
+
+MODES = [
+    # (name, head sampling ratio, budget in us/request)
+    ("spans, no processor", None, 15.0),
+    ("0%", 0.0, 15.0),
+    ("1%", 0.01, 15.0),
+    ("100%", 1.0, 50.0),
+]
+
+
+class CountingExporter(FileExporter):
+    exported = 0
+
+    def export(self, spans) -> bool:
+        self.exported += len(spans)
+        return super().export(spans)
+
+
+def baseline(n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        attributes = {"http.method": "POST", "http.route": "/api/payments"}
+        attributes["http.status_code"] = 200
+    return time.perf_counter() - started
+
+
+def traced(n: int, processor) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        with start_span("POST /api/payments", None, kind="server",
+                        attributes={"http.method": "POST", "http.route": "/api/payments"}) as span:
+            with start_span("payment.process", attributes={"payment.status": "success"}):
+                pass
+            span.set_attribute("http.status_code", 200)
+            span.traceparent
+    if processor is not None:
+        processor.shutdown()
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200000)
+    args = parser.parse_args()
+    n = args.requests
+
+    base = min(baseline(n) for _ in range(3)) / n * 1e6
+    print(f"baseline: {base:.2f} us/request\n")
+    print(f"{'mode':<20} {'us/request':>11} {'overhead us':>12} {'budget us':>10} {'spans exported':>15}")
+    failed = False
+    for name, ratio, budget in MODES:
+        processor = None
+        if ratio is not None:
+            set_sample_ratio(ratio)
+            processor = BatchSpanProcessor(CountingExporter(os.devnull, "payment-api-mock"), schedule_delay=0.5,
+                                           max_queue_size=2 * n)
+            add_span_processor(processor)
+            processor.start()
+        elapsed = traced(n, processor) / n * 1e6
+        if processor is not None:
+            remove_span_processor(processor)
+        overhead = elapsed - base
+        ok = overhead <= budget
+        failed |= not ok
+        spans = processor.exporter.exported if processor is not None else 0
+        print(f"{name:<20} {elapsed:>11.2f} {overhead:>12.2f} {budget:>10.1f} {spans:>15,} "
+              f"{'ok' if ok else 'OVER BUDGET'}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,96 @@
+"""
+Cardinality guardrails for Prometheus labels and InfluxDB tags
+
+Every distinct label set is a series held in memory until the process exits,
+so label values must come from a bounded set:
+
+- route_template(): label HTTP metrics with the matched route template
+  ("/api/payments/{payment_id}"), never the raw URL path; anything that matches
+  no route (scanners, typos) collapses into "other".
+- bounded_value(): allow-list for label values taken from the request body
+  (e.g. currency).
+- SeriesBudget: per-metric cap on label sets. Once the budget is spent, new
+  label sets are folded into a single all-"other" overflow series and counted
+  in payment_metric_series_overflow_total.
+- InfluxTagPolicy: high-cardinality dimensions (customer_id) are written as
+  InfluxDB fields instead of tags, so they do not create one series each.
+
+Budgets are per process: with N gunicorn workers a metric holds at most
+N * budget series (plus one overflow series per worker).
+"""
+
+from prometheus_client import Counter, Gauge
+from starlette.routing import Match
+
+OVERFLOW_VALUE = "other"
+
+# ========================
+# PROMETHEUS METRICS
+# ========================
+
+# Workers track their label sets independently; report the largest
+METRIC_SERIES = Gauge(
+    'payment_metric_series',
+    'Label sets currently tracked for a guarded metric',
+    ['metric'],
+    multiprocess_mode='livemax'
+)
+
+METRIC_SERIES_OVERFLOW = Counter(
+    'payment_metric_series_overflow_total',
+    'Updates folded into the "other" series because the series budget was spent',
+    ['metric']
+)
+
+
+def route_template(request) -> str:
+    """Path template of the route serving `request`, or "other" if none matches"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        # PARTIAL = path matched but not the method (405): still a known route
+        if match != Match.NONE:
+            return route.path
+    return OVERFLOW_VALUE
+
+
+def bounded_value(value: str, allowed) -> str:
+    return value if value in allowed else OVERFLOW_VALUE
+
+
+class SeriesBudget:
+    """Caps the number of label sets a metric (or group of metrics) may create"""
+
+    def __init__(self, metric: str, labelnames, max_series: int = 1000):
+        self.metric = metric
+        self.max_series = max_series
+        self.overflow = tuple(OVERFLOW_VALUE for _ in labelnames)
+        self._seen = set()
+        self._series = METRIC_SERIES.labels(metric)
+        self._overflowed = METRIC_SERIES_OVERFLOW.labels(metric)
+        self._series.set(0)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def labels(self, *values) -> tuple:
+        """Label values to use: `values` if within budget, else the overflow set"""
+        key = tuple(str(v) for v in values)
+        if key in self._seen:
+            return key
+        if len(self._seen) < self.max_series:
+            self._seen.add(key)
+            self._series.set(len(self._seen))
+            return key
+        self._overflowed.inc()
+        return self.overflow
+
+
+class InfluxTagPolicy:
+    """
+    Which dimensions are written as tags (indexed, one series per value) and
+    which as fields; line_protocol.LineProtocolEncoder applies it through its
+    `field_dimensions`.
+    """
+
+    def __init__(self, field_keys=()):
+        self.field_keys = frozenset(field_keys)
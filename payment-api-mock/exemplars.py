@@ -0,0 +1,81 @@
+"""
+Trace-ID exemplars on histogram buckets, keeping the slowest observation
+
+prometheus_client keeps the last exemplar of each bucket, so a p99 spike
+usually points to whatever request happened to come last. SlowestExemplars
+keeps, per (histogram, label set, bucket), the slowest observation of the last
+`max_age` seconds: a new observation replaces the exemplar only if it is at
+least as slow, or if the retained one has expired. The trace of a retained
+exemplar is marked with span.keep().
+
+Exemplars are held here rather than in the metric children, and
+ExemplarRegistry attaches them to the bucket samples when /metrics is
+rendered. This works the same for prometheus_client and sharded histograms and
+in multiprocess mode, where each worker exposes the exemplars of the requests
+it served. They appear in OpenMetrics and protobuf scrapes only. Native
+histograms have no fixed buckets and get no exemplars.
+"""
+
+import time
+from bisect import bisect_left
+
+from prometheus_client.samples import Exemplar
+
+
+class SlowestExemplars:
+    def __init__(self, max_age: float = 60.0):
+        self.max_age = max_age
+        self._exemplars = {}  # (name, label values, bucket) -> (amount, timestamp, trace_id)
+        self._metrics = {}  # name -> (labelnames, upper bounds)
+
+    def observe(self, metric, labels, amount: float, span) -> bool:
+        """Offer `span`'s trace as exemplar for this observation; True if retained"""
+        bounds = getattr(metric, "_upper_bounds", None)
+        if span is None or bounds is None:
+            return False
+        name = metric._name
+        if name not in self._metrics:
+            self._metrics[name] = (tuple(metric._labelnames), list(bounds))
+        key = (name, tuple(str(v) for v in labels), bisect_left(bounds, amount))
+        now = time.time()
+        current = self._exemplars.get(key)
+        if current is not None and amount < current[0] and now - current[1] <= self.max_age:
+            return False
+        self._exemplars[key] = (amount, now, span.trace_id)
+        span.keep()
+        return True
+
+    def attach(self, family):
+        """Set the retained exemplars on `family`'s _bucket samples (in place)"""
+        labelnames, bounds = self._metrics[family.name]
+        bucket_name = family.name + "_bucket"
+        exemplars = self._exemplars
+        samples = []
+        for sample in family.samples:
+            if sample.name == bucket_name:
+                le = float(sample.labels["le"])
+                values = tuple(sample.labels.get(n, "") for n in labelnames)
+                retained = exemplars.get((family.name, values, bisect_left(bounds, le)))
+                if retained is not None:
+                    amount, timestamp, trace_id = retained
+                    sample = sample._replace(exemplar=Exemplar({"trace_id": trace_id}, amount, timestamp))
+            samples.append(sample)
+        family.samples = samples
+        return family
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._metrics
+
+
+class ExemplarRegistry:
+    """Read-only view of `registry` whose histograms carry the retained exemplars"""
+
+    def __init__(self, registry, exemplars: SlowestExemplars):
+        self.registry = registry
+        self.exemplars = exemplars
+
+    def collect(self):
+        for family in self.registry.collect():
+            if family.type == "histogram" and family.name in self.exemplars:
+                family = self.exemplars.attach(family)
+            yield family
@@ -1,74 +1,314 @@
 #!/usr/bin/env python3
 """
-Script to generate test payment data by calling the Payment API
-Generates realistic payment traffic to populate InfluxDB
+Load generator for the Payment API
+
+Asyncio client with a pooled keep-alive HTTP connection pool (httpx) that can
+sustain thousands of requests per second from one process.
+
+Load models:
+- open   (default): constant arrival rate, requests are scheduled on a timetable
+                    whether or not previous ones completed; latency is measured
+                    from the *scheduled* send time, so server stalls are not hidden
+                    (no coordinated omission)
+- closed:           --concurrency workers send back-to-back (optionally paced at
+                    --rate overall); latencies are recorded with HdrHistogram's
+                    coordinated-omission correction for the expected interval
+
+Profiles shape the rate over the run (matching simulate.sh modes):
+    normal     constant --rate
+    realistic  slow sinusoidal swing (+/-50%) with seeded jitter
+    peak       steps up to 3x --rate in the middle third of the run
+    burst      2 s bursts at 5x --rate every 10 s, 0.5x in between
+    stress     linear ramp from 10% to 300% of --rate
+    ramp       linear ramp from 0 to --rate
+    step       4 equal steps: 25%, 50%, 75%, 100% of --rate
+    failure    constant --rate, --failure percent of requests are malformed
+
+Every random choice (payloads, Poisson arrivals, jitter) comes from --seed, so two
+runs with the same arguments send the same request sequence.
+
+Usage:
+    pip install httpx
+    python generate_test_payments.py --rate 500 --duration 60
+    python generate_test_payments.py --mode closed --concurrency 64 --duration 30
+    python generate_test_payments.py --profile step --rate 2000 --duration 120 --seed 7
 """
 
-import requests
+import argparse
+import asyncio
+import json
+import math
 import random
 import time
-from datetime import datetime
 
-API_URL = "http://localhost:8080/api/payments"
+import httpx
+
+from hdr_histogram import HdrHistogram
+from payment_model import CURRENCIES, CURRENCY_WEIGHTS
+
+API_URL = "http://localhost:8080"
 
 # Sample customer IDs for realistic distribution
 CUSTOMER_IDS = [f"cust_{i:05d}" for i in range(1, 5001)]
 
-def generate_payment():
-    """Generate a single payment request"""
-    customer_id = random.choice(CUSTOMER_IDS)
-    currency = random.choice(["EUR", "USD", "GBP", "CHF", "JPY"])
-    
-    # Let the API generate realistic amounts by passing 0
-    payload = {
-        "amount": 0.0,  # API will generate realistic amount
-        "currency": currency,
+# ========================
+# RATE PROFILES
+# ========================
+
+
+def rate_multiplier(profile: str, elapsed: float, duration: float, rnd: random.Random) -> float:
+    """Fraction of --rate to send at `elapsed` seconds into the run"""
+    progress = min(elapsed / duration, 1.0) if duration > 0 else 0.0
+    if profile == "realistic":
+        return max(0.05, 1.0 + 0.5 * math.sin(2 * math.pi * progress) + rnd.uniform(-0.1, 0.1))
+    if profile == "peak":
+        return 3.0 if 1 / 3 <= progress < 2 / 3 else 1.0
+    if profile == "burst":
+        return 5.0 if elapsed % 10 < 2 else 0.5
+    if profile == "stress":
+        return 0.1 + 2.9 * progress
+    if profile == "ramp":
+        return max(progress, 0.01)
+    if profile == "step":
+        return (min(int(progress * 4), 3) + 1) / 4
+    return 1.0  # normal, failure
+
+
+PROFILES = ["normal", "realistic", "peak", "burst", "stress", "ramp", "step", "failure"]
+
+# ========================
+# PAYLOADS
+# ========================
+
+
+def generate_payment(rnd: random.Random) -> dict:
+    """Generate a single payment request (the API picks a realistic amount for 0.0)"""
+    # 20% returning customers (lower IDs), 80% various customers
+    if rnd.random() < 0.20:
+        customer_id = CUSTOMER_IDS[rnd.randrange(100)]
+    else:
+        customer_id = rnd.choice(CUSTOMER_IDS)
+    return {
+        "amount": 0.0,
+        "currency": rnd.choices(CURRENCIES, weights=CURRENCY_WEIGHTS)[0],
         "customer_id": customer_id,
         "description": f"Test payment from {customer_id}"
     }
-    
-    return payload
 
-def main():
-    print("🚀 Starting payment generation...")
-    print(f"📡 API URL: {API_URL}\n")
-    
-    total_payments = 0
-    successful_payments = 0
-    failed_payments = 0
-    
-    try:
+
+def generate_malformed(rnd: random.Random):
+    """Problematic request body for the failure profile, returns (content, content_type)"""
+    kind = rnd.randrange(4)
+    if kind == 0:
+        return json.dumps({"amount": -10.50, "currency": "XXX", "customer_id": ""}), "application/json"
+    if kind == 1:
+        return '{amount:0.0,currency:EUR', "application/json"  # Invalid JSON
+    if kind == 2:
+        return "amount=0.0&currency=EUR", "text/plain"  # Wrong content type
+    return json.dumps({"amount": "not-a-number", "currency": "EUR"}), "application/json"
+
+
+# ========================
+# LOAD GENERATOR
+# ========================
+
+
+class LoadGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.headers = {
+            "Content-Type": "application/json",
+            "X-Success-Rate": str(args.success),
+            "X-Failure-Rate": str(args.failure),
+            "X-Pending-Rate": str(args.pending),
+        }
+        # Latencies in microseconds
+        self.latency = HdrHistogram()
+        self.service_time = HdrHistogram()
+        self.status_counts = {}
+        self.errors = 0
+        self.sent = 0
+        self.in_flight = 0
+        self.started = None
+
+    def next_request(self):
+        """Body, content type of the next request (drawn from the seeded RNG, in send order)"""
+        if self.args.profile == "failure" and self.rnd.random() * 100 < self.args.failure:
+            return generate_malformed(self.rnd)
+        return json.dumps(generate_payment(self.rnd)), "application/json"
+
+    async def send(self, client: httpx.AsyncClient, body: str, content_type: str, intended: float,
+                   expected_interval_us: int = 0):
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/payments", content=body,
+                                         headers={**self.headers, "Content-Type": content_type})
+            code = response.status_code
+            self.status_counts[code] = self.status_counts.get(code, 0) + 1
+        except httpx.HTTPError:
+            self.errors += 1
+        finally:
+            self.in_flight -= 1
+        done = time.perf_counter()
+        service_us = int((done - started) * 1e6)
+        self.service_time.record_value(service_us)
+        if expected_interval_us:
+            self.latency.record_corrected_value(service_us, expected_interval_us)
+        else:
+            self.latency.record_value(int((done - intended) * 1e6))
+
+    async def run_open(self, client: httpx.AsyncClient, start: float):
+        """Constant arrival rate: send on a timetable regardless of completions"""
+        args = self.args
+        limit = asyncio.Semaphore(args.concurrency)
+        tasks = set()
+
+        async def scheduled(body, content_type, intended):
+            async with limit:
+                await self.send(client, body, content_type, intended)
+
+        intended = start
+        while self._keep_going(intended - start):
+            rate = args.rate * rate_multiplier(args.profile, intended - start, args.duration, self.rnd)
+            interval = self.rnd.expovariate(rate) if args.poisson else 1.0 / rate
+            intended += interval
+            # sleep(0) when behind schedule still yields to in-flight requests
+            await asyncio.sleep(max(intended - time.perf_counter(), 0))
+            body, content_type = self.next_request()
+            self.sent += 1
+            task = asyncio.create_task(scheduled(body, content_type, intended))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def run_closed(self, client: httpx.AsyncClient, start: float):
+        """Fixed number of workers, each waits for its response before sending again"""
+        args = self.args
+
+        async def worker():
+            while True:
+                now = time.perf_counter()
+                if not self._keep_going(now - start):
+                    return
+                expected_us = 0
+                if args.rate:
+                    rate = args.rate * rate_multiplier(args.profile, now - start, args.duration, self.rnd)
+                    expected_us = int(args.concurrency / rate * 1e6)
+                body, content_type = self.next_request()
+                self.sent += 1
+                await self.send(client, body, content_type, now, expected_us)
+                if expected_us:
+                    pause = expected_us / 1e6 - (time.perf_counter() - now)
+                    if pause > 0:
+                        await asyncio.sleep(pause)
+
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+
+    def _keep_going(self, elapsed: float) -> bool:
+        if self.args.requests:
+            return self.sent < self.args.requests
+        return elapsed < self.args.duration
+
+    async def report_progress(self, start: float):
+        last_sent = 0
         while True:
+            await asyncio.sleep(self.args.report_interval)
+            rate = (self.sent - last_sent) / self.args.report_interval
+            last_sent = self.sent
+            print(f"[{time.perf_counter() - start:6.1f}s] sent={self.sent} rate={rate:.0f}/s "
+                  f"in_flight={self.in_flight} p99={self.latency.value_at_percentile(99) / 1000:.1f}ms")
+
+    async def run(self):
+        args = self.args
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+            start = self.started = time.perf_counter()
+            progress = asyncio.create_task(self.report_progress(start))
             try:
-                payload = generate_payment()
-                response = requests.post(API_URL, json=payload, timeout=5)
-                
-                if response.status_code == 200:
-                    successful_payments += 1
-                    data = response.json()
-                    print(f"✅ Payment {data['payment_id']}: {data['amount']} {data['currency']} - {data['status']}")
+                if args.mode == "closed":
+                    await self.run_closed(client, start)
                 else:
-                    failed_payments += 1
-                    print(f"❌ Payment failed: HTTP {response.status_code}")
-                
-                total_payments += 1
-                
-                if total_payments % 10 == 0:
-                    print(f"\n📊 Stats: Total={total_payments}, Success={successful_payments}, Failed={failed_payments}\n")
-                
-                # Random delay between 1-5 seconds to simulate realistic traffic
-                time.sleep(random.uniform(1, 5))
-                
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Request error: {e}")
-                time.sleep(5)
-                
+                    await self.run_open(client, start)
+            finally:
+                progress.cancel()
+            return time.perf_counter() - start
+
+    def summary(self, elapsed: float) -> dict:
+        def percentiles(h):
+            return {f"p{p}": round(h.value_at_percentile(p) / 1000, 3) for p in (50, 90, 99, 99.9)} | {
+                "max": round(h.max_value / 1000, 3), "mean": round(h.mean() / 1000, 3)}
+
+        return {
+            "mode": self.args.mode,
+            "profile": self.args.profile,
+            "seed": self.args.seed,
+            "duration_s": round(elapsed, 2),
+            "requests": self.sent,
+            "throughput_rps": round(self.sent / elapsed, 1) if elapsed else 0.0,
+            "status_codes": {str(k): v for k, v in sorted(self.status_counts.items())},
+            "transport_errors": self.errors,
+            "latency_ms": percentiles(self.latency),
+            "service_time_ms": percentiles(self.service_time),
+        }
+
+
+def print_summary(summary: dict):
+    print("\n📊 Final Stats:")
+    print(f"   Mode / profile:   {summary['mode']} / {summary['profile']} (seed {summary['seed']})")
+    print(f"   Requests:         {summary['requests']} in {summary['duration_s']}s "
+          f"({summary['throughput_rps']} req/s)")
+    print(f"   Status codes:     {summary['status_codes']}  transport errors: {summary['transport_errors']}")
+    for name, key in (("Latency (CO-corrected)", "latency_ms"), ("Service time", "service_time_ms")):
+        p = summary[key]
+        print(f"   {name:<22} p50={p['p50']}ms p90={p['p90']}ms p99={p['p99']}ms "
+              f"p99.9={p['p99.9']}ms max={p['max']}ms")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=API_URL, help="API base URL")
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--profile", choices=PROFILES, default="normal")
+    parser.add_argument("--rate", type=float, default=100.0,
+                        help="Target requests/s (open: arrival rate; closed: optional pacing, 0 = flat out)")
+    parser.add_argument("--concurrency", type=int, default=256,
+                        help="Connection pool size / max in-flight (open), number of workers (closed)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Run length in seconds")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after N requests instead of --duration")
+    parser.add_argument("--poisson", action="store_true", help="Poisson arrivals instead of a fixed interval (open)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    parser.add_argument("--json", help="Also write the summary as JSON to this file")
+    parser.add_argument("--success", type=float, default=84, help="X-Success-Rate header (percent)")
+    parser.add_argument("--failure", type=float, default=1, help="X-Failure-Rate header (percent)")
+    parser.add_argument("--pending", type=float, default=15, help="X-Pending-Rate header (percent)")
+    args = parser.parse_args()
+    if args.mode == "open" and args.rate <= 0:
+        parser.error("--rate must be > 0 in open mode")
+    return args
+
+
+def main():
+    args = parse_args()
+    print("🚀 Starting payment generation...")
+    print(f"📡 API URL: {args.url} | mode={args.mode} profile={args.profile} rate={args.rate}/s "
+          f"concurrency={args.concurrency} seed={args.seed}\n")
+    generator = LoadGenerator(args)
+    try:
+        elapsed = asyncio.run(generator.run())
     except KeyboardInterrupt:
-        print(f"\n\n🛑 Stopped by user")
-        print(f"📊 Final Stats:")
-        print(f"   Total Payments: {total_payments}")
-        print(f"   Successful: {successful_payments}")
-        print(f"   Failed: {failed_payments}")
+        print("\n\n🛑 Stopped by user")
+        elapsed = time.perf_counter() - generator.started if generator.started else 0.0
+    summary = generator.summary(elapsed)
+    print_summary(summary)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(summary, f, indent=2)
+
 
 if __name__ == "__main__":
     main()
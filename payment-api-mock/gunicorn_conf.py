@@ -0,0 +1,55 @@
+"""
+Gunicorn configuration - production launch mode for the Payment API
+
+    gunicorn main:app -c gunicorn_conf.py
+
+Runs WEB_CONCURRENCY uvicorn workers (default: 1). Each worker writes its
+Prometheus values to mmap'd files in PROMETHEUS_MULTIPROC_DIR and /metrics
+aggregates all of them (see metrics_cache.exposition_registry), so any worker
+answers a scrape with the same consistent view.
+
+Several workers are opt-in: the Idempotency-Key cache and /api/payments/stats
+keep their state in the worker process, ledger lookups are refused, and
+EVENT_REPLAY runs in the one worker that takes its lock file (see
+main.claim_replay).
+"""
+
+import os
+import shutil
+
+# Must be set before prometheus_client is imported (here and in the workers)
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    "/dev/shm/payment-api-metrics" if os.path.isdir("/dev/shm") else "/tmp/payment-api-metrics"
+)
+MULTIPROC_DIR = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+
+from prometheus_client import multiprocess  # noqa: E402
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+graceful_timeout = 30
+timeout = 60
+accesslog = None
+
+
+def on_starting(server):
+    """Start from an empty metrics directory: files from a previous run would be summed in"""
+    shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    server.log.info(f"Prometheus multiprocess dir: {MULTIPROC_DIR} ({workers} workers)")
+    # Workers inherit it: with several, the ledger refuses lookups (see main.check_ledger_lookups)
+    os.environ["WEB_CONCURRENCY"] = str(server.cfg.workers)
+    if workers > 1 and float(os.getenv("IDEMPOTENCY_TTL", "86400")) > 0:
+        server.log.warning(
+            f"Idempotency-Key deduplication is per worker: with {workers} workers, a retry handled by "
+            f"another worker runs the payment again. Set WEB_CONCURRENCY=1 for exactly-once keyed "
+            f"payments, or IDEMPOTENCY_TTL=0 to turn the cache off"
+        )
+
+
+def child_exit(server, worker):
+    """Drop the live* gauge files of a dead worker; its counters and histograms are kept"""
+    multiprocess.mark_process_dead(worker.pid, MULTIPROC_DIR)
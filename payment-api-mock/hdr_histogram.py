@@ -0,0 +1,108 @@
+"""
+Minimal HDR histogram for latency recording
+
+Same bucket layout as HdrHistogram (log2 buckets split into linear sub-buckets),
+so any recorded value is reported within the configured number of significant
+digits whatever its magnitude. Values are integers (we record microseconds).
+
+record_corrected_value() applies HdrHistogram's coordinated-omission correction:
+when a response took longer than the expected interval between requests, the
+requests that a closed-loop client *would* have sent meanwhile are back-filled
+with their linearly decreasing latencies.
+"""
+
+import math
+
+
+class HdrHistogram:
+    def __init__(self, lowest: int = 1, highest: int = 3_600_000_000, significant_digits: int = 3):
+        largest_single_unit = 2 * 10 ** significant_digits
+        sub_bucket_count_magnitude = int(math.ceil(math.log2(largest_single_unit)))
+        self.sub_bucket_half_count_magnitude = max(sub_bucket_count_magnitude, 1) - 1
+        self.sub_bucket_count = 1 << (self.sub_bucket_half_count_magnitude + 1)
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.unit_magnitude = int(math.floor(math.log2(lowest)))
+        self.sub_bucket_mask = (self.sub_bucket_count - 1) << self.unit_magnitude
+        self.highest = highest
+
+        smallest_untrackable = self.sub_bucket_count << self.unit_magnitude
+        bucket_count = 1
+        while smallest_untrackable <= highest:
+            smallest_untrackable <<= 1
+            bucket_count += 1
+        self.counts = [0] * ((bucket_count + 1) * self.sub_bucket_half_count)
+        self.total_count = 0
+        self.min_value = None
+        self.max_value = 0
+
+    # ------------------------
+    # Recording
+    # ------------------------
+
+    def _index(self, value: int) -> int:
+        bucket_index = ((value | self.sub_bucket_mask).bit_length()
+                        - self.unit_magnitude - (self.sub_bucket_half_count_magnitude + 1))
+        sub_bucket_index = value >> (bucket_index + self.unit_magnitude)
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + (sub_bucket_index - self.sub_bucket_half_count)
+
+    def record_value(self, value: int, count: int = 1):
+        value = min(max(int(value), 0), self.highest)
+        self.counts[self._index(value)] += count
+        self.total_count += count
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if value > self.max_value:
+            self.max_value = value
+
+    def record_corrected_value(self, value: int, expected_interval: int):
+        """Record `value`, back-filling samples hidden by coordinated omission"""
+        self.record_value(value)
+        if expected_interval <= 0:
+            return
+        missing = value - expected_interval
+        while missing >= expected_interval:
+            self.record_value(missing)
+            missing -= expected_interval
+
+    def add(self, other: "HdrHistogram"):
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.total_count += other.total_count
+        if other.min_value is not None and (self.min_value is None or other.min_value < self.min_value):
+            self.min_value = other.min_value
+        self.max_value = max(self.max_value, other.max_value)
+
+    # ------------------------
+    # Queries
+    # ------------------------
+
+    def _value_at_index(self, index: int) -> int:
+        """Highest value equivalent to the bucket at `index`"""
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        shift = bucket_index + self.unit_magnitude
+        return (sub_bucket_index << shift) + (1 << shift) - 1
+
+    def value_at_percentile(self, percentile: float) -> int:
+        if self.total_count == 0:
+            return 0
+        target = max(1, int(math.ceil(percentile / 100.0 * self.total_count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(self._value_at_index(index), self.max_value)
+        return self.max_value
+
+    def mean(self) -> float:
+        if self.total_count == 0:
+            return 0.0
+        total = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                total += count * self._value_at_index(index)
+        return total / self.total_count
@@ -0,0 +1,157 @@
+"""
+Idempotency-Key deduplication for POST /api/payments
+
+Clients retry on timeout. Without a key every retry is a new payment: another
+processing delay, another PAYMENT_COUNT / PAYMENT_AMOUNT increment, another
+InfluxDB point. IdempotencyCache remembers the outcome of each keyed request
+for `ttl` seconds, in an LRU of at most `max_keys` entries:
+
+- miss: the first request with a key runs the payment and stores its outcome
+  (status code and body, failures included);
+- coalesced: a duplicate arriving while the first is still in flight waits
+  for it instead of running a second payment;
+- hit: a later duplicate gets the stored outcome (a dict lookup);
+- conflict: the same key with a different request body is rejected.
+
+If the first request raises (or is cancelled), nothing is stored and one of
+the waiting duplicates runs the payment instead. In-flight entries are never
+evicted (a duplicate would run the payment again): at capacity the cache grows
+past `max_keys` by at most the number of keyed requests in progress.
+
+The cache is per worker: with several gunicorn workers a retry landing on
+another worker is not deduplicated (gunicorn_conf.py warns at startup).
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+
+from prometheus_client import Counter, Gauge
+
+# ========================
+# PROMETHEUS METRICS
+# ========================
+
+IDEMPOTENCY_REQUESTS = Counter(
+    'payment_idempotency_requests_total',
+    'Requests carrying an Idempotency-Key, by cache result (hit, miss, coalesced, conflict)',
+    ['result']
+)
+
+IDEMPOTENCY_EVICTIONS = Counter(
+    'payment_idempotency_evictions_total',
+    'Idempotency keys dropped from the cache (expired, capacity)',
+    ['reason']
+)
+
+IDEMPOTENCY_KEYS = Gauge(
+    'payment_idempotency_keys',
+    'Idempotency keys currently cached (including in-flight requests)',
+    multiprocess_mode='livesum'
+)
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used with a different request"""
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "expires")
+
+    def __init__(self, fingerprint, future):
+        self.fingerprint = fingerprint
+        self.future = future  # result: the outcome, or None if the first request failed
+        self.expires = None  # set once the outcome is known
+
+
+class IdempotencyCache:
+    """TTL + LRU cache of request outcomes keyed by Idempotency-Key, with in-flight coalescing"""
+
+    def __init__(self, max_keys: int = 10000, ttl: float = 86400.0):
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._results = {result: IDEMPOTENCY_REQUESTS.labels(result)
+                         for result in ("hit", "miss", "coalesced", "conflict")}
+        self._expired = IDEMPOTENCY_EVICTIONS.labels("expired")
+        self._evicted = IDEMPOTENCY_EVICTIONS.labels("capacity")
+        IDEMPOTENCY_KEYS.set(0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires is not None and entry.expires <= now:
+            del self._entries[key]
+            self._expired.inc()
+            IDEMPOTENCY_KEYS.set(len(self._entries))
+            return None
+        return entry
+
+    def _insert(self, key: str, entry: _Entry, now: float):
+        entries = self._entries
+        # Entries are in LRU order, not expiry order: this only reclaims the expired head
+        while entries:
+            head = next(iter(entries.values()))
+            if head.expires is None or head.expires > now:
+                break
+            entries.popitem(last=False)
+            self._expired.inc()
+        excess = len(entries) + 1 - self.max_keys
+        if excess > 0:
+            # Least recently used completed entries; in-flight ones are skipped
+            victims = []
+            for old_key, old in entries.items():
+                if old.expires is not None:
+                    victims.append(old_key)
+                    if len(victims) == excess:
+                        break
+            for old_key in victims:
+                del entries[old_key]
+            self._evicted.inc(len(victims))
+        entries[key] = entry
+        IDEMPOTENCY_KEYS.set(len(entries))
+
+    def _discard(self, key: str, entry: _Entry):
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+            IDEMPOTENCY_KEYS.set(len(self._entries))
+
+    async def run(self, key: str, fingerprint, compute) -> tuple:
+        """(outcome, replayed): the stored outcome of `key`, or the result of `await compute()`
+
+        `fingerprint` identifies the request body; reusing a key with another
+        fingerprint raises IdempotencyKeyReused.
+        """
+        while True:
+            now = time.monotonic()
+            entry = self._lookup(key, now)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                self._results["conflict"].inc()
+                raise IdempotencyKeyReused(key)
+            self._entries.move_to_end(key)
+            if entry.future.done():
+                self._results["hit"].inc()
+                return entry.future.result(), True
+            self._results["coalesced"].inc()
+            # shield: a cancelled duplicate must not cancel the shared future
+            outcome = await asyncio.shield(entry.future)
+            if outcome is not None:
+                return outcome, True
+            # The first request failed: run it ourselves (or wait on whoever got there first)
+
+        self._results["miss"].inc()
+        entry = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        self._insert(key, entry, now)
+        try:
+            outcome = await compute()
+        except BaseException:
+            self._discard(key, entry)
+            entry.future.set_result(None)
+            raise
+        entry.expires = time.monotonic() + self.ttl
+        entry.future.set_result(outcome)
+        return outcome, False
@@ -0,0 +1,319 @@
+"""
+Batched asynchronous InfluxDB writer
+
+Payments enqueue line-protocol records into a bounded in-memory queue; one
+background task drains it and writes batches (by size or by interval) with a
+single HTTP request, off the request path. Failed batches are retried with
+exponential backoff and jitter.
+
+Queue-full policies:
+- drop_newest: reject the incoming point (default, never slows a request)
+- drop_oldest: evict the oldest queued point to make room
+- block:       wait for room (backpressure on the request path)
+
+With a spool (spool.SegmentSpool), batches that still fail after the retries
+are appended to disk instead of dropped. Until a replay succeeds, later batches
+go straight to the spool without waiting for InfluxDB timeouts; a background
+replayer probes InfluxDB every `replay_interval` seconds and drains the spool
+in large batches once it answers again.
+
+close() does not retry: with a spool, whatever is left goes straight to disk
+(replayed by the next process), otherwise each batch gets a single attempt, so
+shutdown fits in gunicorn's graceful_timeout.
+
+Instead of a write_api, the writer can be given `connect`, a function returning
+one. start() calls it in a thread, so building the client (importing
+influxdb_client pulls in numpy and its generated API: ~0.4 s) stays off the
+import and startup path; points queue up until it returns.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+QUEUE_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+# ========================
+# PROMETHEUS METRICS
+# ========================
+
+# Set explicitly (not set_function) so it also works in multiprocess mode,
+# where it is summed across live workers
+INFLUX_QUEUE_DEPTH = Gauge(
+    'payment_influx_queue_depth',
+    'Points waiting in the InfluxDB write queue',
+    multiprocess_mode='livesum'
+)
+
+INFLUX_BATCH_SIZE = Histogram(
+    'payment_influx_batch_size',
+    'Points per InfluxDB write batch',
+    buckets=[1, 10, 50, 100, 250, 500, 1000, 2500, 5000]
+)
+
+INFLUX_FLUSH_DURATION = Histogram(
+    'payment_influx_flush_duration_seconds',
+    'Time to write one batch to InfluxDB (including retries)',
+    ['result'],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+)
+
+INFLUX_POINTS_WRITTEN = Counter(
+    'payment_influx_points_written_total',
+    'Points successfully written to InfluxDB'
+)
+
+INFLUX_POINTS_DROPPED = Counter(
+    'payment_influx_dropped_points_total',
+    'Points dropped before reaching InfluxDB',
+    ['reason']
+)
+
+
+class BatchingInfluxWriter:
+    """Bounded queue + background flusher in front of a synchronous write_api"""
+
+    def __init__(self, write_api, bucket: str, org: str, batch_size: int = 500,
+                 flush_interval: float = 1.0, queue_size: int = 10000,
+                 policy: str = "drop_newest", max_retries: int = 3,
+                 retry_backoff: float = 0.5, spool=None, replay_interval: float = 5.0,
+                 connect=None):
+        if policy not in QUEUE_POLICIES:
+            raise ValueError(f"Unknown queue policy '{policy}', expected one of {QUEUE_POLICIES}")
+        if write_api is None and connect is None:
+            raise ValueError("Either write_api or connect is required")
+        self.write_api = write_api
+        self.connect = connect
+        self.bucket = bucket
+        self.org = org
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.policy = policy
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spool = spool
+        self.replay_interval = replay_interval
+        self._queue = None
+        self._task = None
+        self._replay_task = None
+        self._batch = None  # points the flusher has taken off the queue, while it fills the batch
+        self._flushing = None  # the flusher's _flush() in progress, shielded from close()
+        self._connecting = None
+        self._closing = asyncio.Event()
+        self._influx_up = True  # False after a batch went to the spool, until a replay succeeds
+
+    # ------------------------
+    # Lifecycle
+    # ------------------------
+
+    @property
+    def connected(self) -> bool:
+        """True once the write_api exists (it may still fail to reach InfluxDB)"""
+        return self.write_api is not None
+
+    def start(self):
+        """Start the flusher task, and the connect() thread if needed (idempotent, inside the event loop)"""
+        if self.write_api is None:
+            self._connect()
+        if self._task is None or self._task.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info(f"InfluxDB batch writer started (batch={self.batch_size}, "
+                        f"interval={self.flush_interval}s, queue={self.queue_size}, policy={self.policy})")
+        if self.spool is not None and (self._replay_task is None or self._replay_task.done()):
+            self._replay_task = asyncio.get_running_loop().create_task(self._replay())
+
+    async def close(self):
+        """Stop the flusher and spool (or write once) whatever it held or is still queued"""
+        self._closing.set()
+        for task in (self._task, self._replay_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._replay_task = None
+        # Let a write in progress finish, then write the batch being filled
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        if self._batch:
+            batch, self._batch = self._batch, None
+            await self._flush(batch)
+        while self._queue is not None and not self._queue.empty():
+            await self._flush(self._drain(self.batch_size))
+        if self.spool is not None:
+            self.spool.close()
+
+    def _connect(self):
+        """The connect() thread in progress, started if needed"""
+        if self._connecting is None:
+            self._connecting = asyncio.ensure_future(asyncio.to_thread(self.connect))
+            self._connecting.add_done_callback(self._connected)
+        return self._connecting
+
+    def _connected(self, future):
+        if future.cancelled():
+            self._connecting = None
+        elif future.exception() is not None:
+            # Retried by the next start() or write
+            logger.error(f"InfluxDB client setup failed: {future.exception()}")
+            self._connecting = None
+        else:
+            self.write_api = future.result()
+
+    async def _write(self, body: str):
+        if self.write_api is None:
+            # Only the connection: start() would bring back the tasks close() cancelled
+            await asyncio.shield(self._connect())
+        await asyncio.to_thread(self.write_api.write, bucket=self.bucket, org=self.org, record=body)
+
+    # ------------------------
+    # Producer side
+    # ------------------------
+
+    async def write(self, record) -> bool:
+        """Enqueue a Point or line-protocol string; False if it was dropped"""
+        self.start()
+        line = record if isinstance(record, str) else record.to_line_protocol()
+        if self.policy == "block":
+            await self._queue.put(line)
+            INFLUX_QUEUE_DEPTH.set(self._queue.qsize())
+            return True
+        try:
+            self._queue.put_nowait(line)
+            INFLUX_QUEUE_DEPTH.set(self._queue.qsize())
+            return True
+        except asyncio.QueueFull:
+            if self.policy == "drop_oldest":
+                self._queue.get_nowait()
+                self._queue.put_nowait(line)
+                INFLUX_POINTS_DROPPED.labels("queue_full_oldest").inc()
+                return True
+            INFLUX_POINTS_DROPPED.labels("queue_full").inc()
+            return False
+
+    async def write_batch(self, records: list):
+        """Write many records as one request now, bypassing the queue (same retries and spooling)"""
+        self.start()
+        await self._flush([record if isinstance(record, str) else record.to_line_protocol() for record in records])
+
+    # ------------------------
+    # Consumer side
+    # ------------------------
+
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for the first point, then fill the batch until size or interval is hit
+            batch = self._batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                batch.extend(self._drain(self.batch_size - len(batch)))
+                remaining = deadline - loop.time()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            self._batch = None
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: list):
+        INFLUX_QUEUE_DEPTH.set(self._queue.qsize())
+        if not batch:
+            return
+        if self.spool is not None and (not self._influx_up or self._closing.is_set()):
+            await self._spool(batch)
+            return
+        body = "\n".join(batch)
+        start = time.perf_counter()
+        attempts = 0
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # No retries once close() has begun (it also cuts the backoff short)
+                if self._closing.is_set():
+                    break
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, self.retry_backoff * (2 ** (attempt - 1)))
+                logger.warning(f"InfluxDB batch write failed ({error}), retrying in {delay:.2f}s")
+                try:
+                    await asyncio.wait_for(self._closing.wait(), delay)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            attempts += 1
+            try:
+                await self._write(body)
+                INFLUX_BATCH_SIZE.observe(len(batch))
+                INFLUX_POINTS_WRITTEN.inc(len(batch))
+                INFLUX_FLUSH_DURATION.labels("success").observe(time.perf_counter() - start)
+                return
+            except Exception as e:
+                error = e
+        logger.error(f"InfluxDB batch write failed after {attempts} attempts, "
+                     f"{'spooling' if self.spool is not None else 'dropping'} {len(batch)} points: {error}")
+        INFLUX_FLUSH_DURATION.labels("error").observe(time.perf_counter() - start)
+        if self.spool is not None:
+            self._influx_up = False
+            await self._spool(batch)
+        else:
+            INFLUX_POINTS_DROPPED.labels("write_error").inc(len(batch))
+
+    # ------------------------
+    # Spool
+    # ------------------------
+
+    async def _spool(self, batch: list):
+        try:
+            discarded = await asyncio.to_thread(self.spool.append, batch)
+        except OSError as e:
+            logger.error(f"Spool append failed, dropping {len(batch)} points: {e}")
+            INFLUX_POINTS_DROPPED.labels("spool_error").inc(len(batch))
+            return
+        if discarded:
+            INFLUX_POINTS_DROPPED.labels("spool_full").inc(discarded)
+
+    async def _replay(self):
+        """Drain the spool into InfluxDB; probes every replay_interval while it is down"""
+        while True:
+            chunk = await asyncio.to_thread(self.spool.peek)
+            if chunk is None:
+                self.spool.update_metrics()
+                await asyncio.sleep(self.replay_interval)
+                continue
+            segment, body, points = chunk
+            try:
+                await self._write(body)
+            except Exception as e:
+                if self._influx_up:
+                    logger.warning(f"Spool replay failed, retrying in {self.replay_interval}s: {e}")
+                self._influx_up = False
+                self.spool.update_metrics()
+                await asyncio.sleep(self.replay_interval)
+                continue
+            if not self._influx_up:
+                logger.info("InfluxDB reachable again, replaying spool")
+                self._influx_up = True
+            self.spool.commit(segment, len(body), points)
+            INFLUX_POINTS_WRITTEN.inc(points)
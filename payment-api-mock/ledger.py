@@ -0,0 +1,144 @@
+"""
+In-memory payment ledger: monotonic payment IDs, columnar storage, lookups
+
+Payment IDs are pay_<run>_<seq>: `run` (24 hex digits) packs the process
+start time in ms, the PID and 32 random bits. Two live processes on a host
+never share it; processes on different hosts or containers (where PIDs repeat)
+only collide if they start in the same millisecond and draw the same random
+bits, about 1 in 4 billion. `seq` (12 hex digits) counts the process's
+payments from 0, so within a process IDs sort in creation order, as strings
+too.
+
+The ledger keeps the last `capacity` payments in a ring of array.array columns:
+timestamp, amount, processing time and one byte per label (an index into
+`labels`, like observability_common.event_log). That is 26 bytes per payment,
+against about 570 for a dict and 1,400 for a pydantic model per payment
+(benchmarks/bench_ledger.py).
+Because `seq` is dense, a payment lives at slot seq % capacity: get() is O(1)
+with no index, and payments older than the last `capacity` are gone.
+
+scan() binary-searches the ring for a time range, which needs the timestamps in
+order. time.time() can step back (NTP), so append() clamps each timestamp to
+the previous one: after a step back, payments keep the last timestamp until
+the clock catches up.
+"""
+
+import array
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+
+_SEQ_DIGITS = 12
+
+
+def _utc(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class PaymentLedger:
+    """Last `capacity` payments of this process (capacity 0: IDs only, nothing stored)"""
+
+    def __init__(self, labels: dict, capacity: int = 1_000_000, run: int = None):
+        self.labels = {name: list(values) for name, values in labels.items()}
+        self.capacity = capacity
+        if run is None:
+            # 42 bits of ms (until 2109), 22 of PID, 32 random
+            run = (time.time_ns() // 1_000_000) << 54 | (os.getpid() & 0x3FFFFF) << 32 | secrets.randbits(32)
+        self.run = run
+        self.prefix = f"pay_{self.run:024x}_"
+        self.next = 0  # seq of the next payment
+        self._last_t = 0.0  # latest timestamp appended: the ring stays sorted for scan()
+        self._t = array.array("d")
+        self._amount = array.array("d")
+        self._processing_time = array.array("f")
+        self._codes = [array.array("B") for _ in self.labels]
+        self._columns = [self._t, self._amount, self._processing_time, *self._codes]
+
+    def __len__(self) -> int:
+        return min(self.next, self.capacity)
+
+    @property
+    def oldest(self) -> int:
+        """seq of the oldest payment still held"""
+        return max(0, self.next - self.capacity)
+
+    def bytes_per_payment(self) -> int:
+        return sum(column.itemsize for column in self._columns)
+
+    def memory(self) -> int:
+        """Bytes held by the columns"""
+        return sum(column.buffer_info()[1] * column.itemsize for column in self._columns)
+
+    def format_id(self, seq: int) -> str:
+        return f"{self.prefix}{seq:0{_SEQ_DIGITS}x}"
+
+    def parse_id(self, payment_id: str):
+        """seq of one of this process's IDs, else None"""
+        if len(payment_id) != len(self.prefix) + _SEQ_DIGITS or not payment_id.startswith(self.prefix):
+            return None
+        try:
+            return int(payment_id[len(self.prefix):], 16)
+        except ValueError:
+            return None
+
+    def append(self, t: float, amount: float, processing_time: float, *codes) -> str:
+        """Store one payment (label codes in `labels` order) and return its new ID
+
+        `t` is clamped to be no earlier than the previous payment's.
+        """
+        if t < self._last_t:
+            t = self._last_t
+        else:
+            self._last_t = t
+        seq = self.next
+        self.next += 1
+        if self.capacity:
+            row = (t, amount, processing_time, *codes)
+            if seq < self.capacity:
+                for column, value in zip(self._columns, row):
+                    column.append(value)
+            else:
+                slot = seq % self.capacity
+                for column, value in zip(self._columns, row):
+                    column[slot] = value
+        return self.format_id(seq)
+
+    def _record(self, seq: int) -> dict:
+        slot = seq % self.capacity
+        record = {
+            "payment_id": self.format_id(seq),
+            "timestamp": _utc(self._t[slot]),
+            "amount": self._amount[slot],
+            "processing_time_ms": round(self._processing_time[slot] * 1000, 2),
+        }
+        for (name, values), codes in zip(self.labels.items(), self._codes):
+            record[name] = values[codes[slot]]
+        return record
+
+    def get(self, payment_id: str):
+        """The payment as a dict, or None if unknown, evicted or not from this process"""
+        seq = self.parse_id(payment_id)
+        if seq is None or not self.oldest <= seq < self.next or not self.capacity:
+            return None
+        return self._record(seq)
+
+    def _bisect(self, ts: float) -> int:
+        """First seq whose timestamp is >= ts"""
+        t, capacity = self._t, self.capacity
+        lo, hi = self.oldest, self.next
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if t[mid % capacity] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def scan(self, since: float = None, until: float = None, limit: int = 100) -> list:
+        """Payments with since <= timestamp < until, oldest first, at most `limit`"""
+        if not self.capacity:
+            return []
+        start = self._bisect(since) if since is not None else self.oldest
+        end = self._bisect(until) if until is not None else self.next
+        return [self._record(seq) for seq in range(start, min(end, start + limit))]
@@ -3,12 +3,22 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from datetime import datetime
+import asyncio
 import random
 import time
 import os
+import tempfile
 from dotenv import load_dotenv
-from influxdb_client import InfluxDBClient, Point
+from influxdb_client import InfluxDBClient
 from influxdb_client.client.write_api import SYNCHRONOUS
+from influx_writer import BatchingInfluxWriter
+from spool import SegmentSpool
+from cardinality import InfluxTagPolicy, SeriesBudget, bounded_value, route_template
+from line_protocol import LineProtocolEncoder
+from payment_stats import WINDOWS, PaymentStats
+from observability_common.tracing import start_span
+from observability_common.otlp import setup_tracing
+from exemplars import ExemplarRegistry, SlowestExemplars
 from prometheus_fastapi_instrumentator import Instrumentator
 import logging
 
@@ -24,9 +34,45 @@ INFLUX_CONFIG = {
     "url": os.getenv("INFLUXDB_URL", "http://influxdb:8086"),
     "token": os.getenv("INFLUXDB_TOKEN", "my-super-secret-auth-token"),
     "org": os.getenv("INFLUXDB_ORG", "myorg"),
-    "bucket": os.getenv("INFLUXDB_BUCKET", "payments")
+    "bucket": os.getenv("INFLUXDB_BUCKET", "payments"),
+    # Background batch writer
+    "batch_size": int(os.getenv("INFLUXDB_BATCH_SIZE", "500")),
+    "flush_interval": float(os.getenv("INFLUXDB_FLUSH_INTERVAL", "1.0")),
+    "queue_size": int(os.getenv("INFLUXDB_QUEUE_SIZE", "10000")),
+    "queue_policy": os.getenv("INFLUXDB_QUEUE_POLICY", "drop_newest"),
+    "max_retries": int(os.getenv("INFLUXDB_MAX_RETRIES", "3")),
+    # On-disk spool for batches InfluxDB could not take ("" disables it)
+    "spool_dir": os.getenv("INFLUXDB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "payment-api-spool")),
+    "spool_max_bytes": int(os.getenv("INFLUXDB_SPOOL_MAX_BYTES", str(256 * 1024 * 1024))),
+    "spool_segment_bytes": int(os.getenv("INFLUXDB_SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024))),
+    "replay_interval": float(os.getenv("INFLUXDB_REPLAY_INTERVAL", "5.0")),
+    # High-cardinality dimensions written as fields instead of tags
+    "field_dimensions": os.getenv("INFLUXDB_FIELD_DIMENSIONS", "customer_id").split(",")
 }
 
+# Cardinality guardrails: max label sets per metric, allowed client-supplied currencies
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "2000"))
+ALLOWED_CURRENCIES = frozenset(os.getenv("ALLOWED_CURRENCIES", "EUR,USD,GBP,CHF,JPY,CAD,AUD").split(","))
+
+# Tracing: OTLP/HTTP to Tempo or the Collector, head sampling + tail sampling (errors, slow requests)
+TRACING_CONFIG = {
+    "exporter": os.getenv("OTEL_TRACES_EXPORTER", "none"),  # otlp, file, memory, none
+    "service_name": os.getenv("OTEL_SERVICE_NAME", "payment-api-mock"),
+    "endpoint": os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://tempo:4318"),
+    "file": os.getenv("TRACES_FILE", "traces.jsonl"),
+    "sample_ratio": float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "0.01")),
+    # Traces at least this slow (seconds) are always exported; 0 disables
+    "tail_latency": float(os.getenv("TRACES_TAIL_LATENCY", "1.0")) or None,
+    "max_queue_size": int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "2048")),
+    "max_export_batch_size": int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "512")),
+    "schedule_delay": float(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "5000")) / 1000
+}
+
+# Trace-ID exemplars on request latency: slowest request per bucket over EXEMPLAR_MAX_AGE seconds.
+# On by default only when traces are exported, otherwise the trace IDs lead nowhere.
+EXEMPLARS = os.getenv("EXEMPLARS", str(TRACING_CONFIG["exporter"] != "none")).lower() in ("1", "true", "yes")
+EXEMPLAR_MAX_AGE = float(os.getenv("EXEMPLAR_MAX_AGE", "60"))
+
 # Initialize FastAPI app
 app = FastAPI(title="Payment API", version="1.0.0")
 
@@ -49,6 +95,53 @@ influx_client = InfluxDBClient(
 )
 write_api = influx_client.write_api(write_options=SYNCHRONOUS)
 
+# Points are queued and written in batches by a background task
+influx_writer = BatchingInfluxWriter(
+    write_api,
+    bucket=INFLUX_CONFIG["bucket"],
+    org=INFLUX_CONFIG["org"],
+    batch_size=INFLUX_CONFIG["batch_size"],
+    flush_interval=INFLUX_CONFIG["flush_interval"],
+    queue_size=INFLUX_CONFIG["queue_size"],
+    policy=INFLUX_CONFIG["queue_policy"],
+    max_retries=INFLUX_CONFIG["max_retries"],
+    spool=SegmentSpool(
+        INFLUX_CONFIG["spool_dir"],
+        segment_bytes=INFLUX_CONFIG["spool_segment_bytes"],
+        max_bytes=INFLUX_CONFIG["spool_max_bytes"]
+    ) if INFLUX_CONFIG["spool_dir"] else None,
+    replay_interval=INFLUX_CONFIG["replay_interval"]
+)
+influx_tags = InfluxTagPolicy(INFLUX_CONFIG["field_dimensions"])
+
+# Sliding-window aggregates served by /api/payments/stats
+payment_stats = PaymentStats()
+
+# Fixed schema of the "payment" measurement, encoded straight to line protocol
+PAYMENT_LINE = LineProtocolEncoder(
+    "payment",
+    tags=["status", "currency", "customer_id", "merchant_id", "payment_method", "region", "card_brand",
+          "risk_level"],
+    fields={"amount": "float", "processing_time": "float", "network_latency": "float",
+            "gateway_latency": "float", "error_code": "int", "retry_count": "int", "fraud_score": "float",
+            "response_time": "float", "fee": "float", "success": "int"},
+    field_dimensions=influx_tags.field_keys
+)
+
+span_processor = setup_tracing(**TRACING_CONFIG, metric_prefix="payment")
+
+@app.on_event("startup")
+async def start_influx_writer():
+    influx_writer.start()
+    if span_processor:
+        span_processor.start()
+
+@app.on_event("shutdown")
+async def stop_influx_writer():
+    await influx_writer.close()
+    if span_processor:
+        await asyncio.to_thread(span_processor.shutdown)
+
 # Helper functions for realistic data generation
 def generate_realistic_amount() -> float:
     """Distribution réaliste: 80% < 200€, 15% 200-1000€, 5% > 1000€"""
@@ -83,9 +176,16 @@ class PaymentResponse(BaseModel):
     processing_time_ms: float
 
 # Metrics and monitoring
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Histogram
 from starlette.requests import Request
-from starlette.responses import Response
+from metrics_cache import MetricsCache, exposition_registry
+
+# Rendered /metrics payload is reused for this many seconds (0 = render every scrape)
+exemplars = SlowestExemplars(max_age=EXEMPLAR_MAX_AGE) if EXEMPLARS else None
+metrics_cache = MetricsCache(
+    registry=ExemplarRegistry(exposition_registry(), exemplars) if exemplars else None,
+    max_age=float(os.getenv("METRICS_CACHE_MAX_AGE", "1.0"))
+)
 
 # Prometheus metrics
 REQUEST_COUNT = Counter(
@@ -100,25 +200,40 @@ REQUEST_LATENCY = Histogram(
     ['method', 'endpoint']
 )
 
+REQUEST_SERIES = SeriesBudget('payment_requests_total', REQUEST_COUNT._labelnames, METRICS_MAX_SERIES)
+LATENCY_SERIES = SeriesBudget('payment_request_duration_seconds', REQUEST_LATENCY._labelnames, METRICS_MAX_SERIES)
+
 # Middleware for metrics
 @app.middleware("http")
 async def monitor_requests(request: Request, call_next):
     start_time = time.time()
     method = request.method
-    endpoint = request.url.path
+    # Route template, not the raw path: unknown URLs must not create series
+    endpoint = route_template(request)
     
-    try:
-        response = await call_next(request)
-        status_code = response.status_code
-        
-        REQUEST_COUNT.labels(method, endpoint, status_code).inc()
-        REQUEST_LATENCY.labels(method, endpoint).observe(time.time() - start_time)
-        
-        return response
-    except Exception as e:
-        status_code = 500
-        REQUEST_COUNT.labels(method, endpoint, status_code).inc()
-        raise e
+    # Continues the caller's trace if it sent a traceparent header
+    with start_span(f"{method} {endpoint}", request.headers.get("traceparent"), kind="server",
+                    attributes={"http.method": method, "http.route": endpoint}) as span:
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            
+            REQUEST_COUNT.labels(*REQUEST_SERIES.labels(method, endpoint, status_code)).inc()
+            latency_labels = LATENCY_SERIES.labels(method, endpoint)
+            elapsed = time.time() - start_time
+            REQUEST_LATENCY.labels(*latency_labels).observe(elapsed)
+            if exemplars:
+                exemplars.observe(REQUEST_LATENCY, latency_labels, elapsed, span)
+            
+            span.set_attribute("http.status_code", status_code)
+            if status_code >= 500:
+                span.set_attribute("error", f"HTTP {status_code}")
+            response.headers["traceparent"] = span.traceparent
+            return response
+        except Exception as e:
+            status_code = 500
+            REQUEST_COUNT.labels(*REQUEST_SERIES.labels(method, endpoint, status_code)).inc()
+            raise e
 
 # Health check endpoint
 @app.get("/health")
@@ -127,11 +242,8 @@ async def health_check():
 
 # Metrics endpoint for Prometheus
 @app.get("/metrics")
-async def metrics():
-    return Response(
-        content=generate_latest(),
-        media_type=CONTENT_TYPE_LATEST
-    )
+async def metrics(request: Request):
+    return await metrics_cache.response(request)
 
 # Process payment
 @app.post("/api/payments", response_model=PaymentResponse)
@@ -154,54 +266,51 @@ async def process_payment(payment: PaymentRequest):
     
     # Generate realistic processing time
     processing_time = generate_processing_time(status)
-    time.sleep(processing_time)
+    # Non-blocking: keep the event loop free for other in-flight payments
+    await asyncio.sleep(processing_time)
     
     # Generate additional metrics
     network_latency = round(random.uniform(5, 50), 1)
     gateway_latency = round(random.uniform(10, 100), 1)
     
+    currency = bounded_value(payment.currency, ALLOWED_CURRENCIES)
+    region = random.choice(["EU", "US", "ASIA", "LATAM"])
+    payment_stats.record(status, currency, region, amount, processing_time)
+    
     # Create payment record
     payment_id = f"pay_{int(time.time() * 1000)}_{random.randint(1000, 9999)}"
     timestamp = datetime.utcnow().isoformat()
     
     # Write comprehensive data to InfluxDB
     try:
-        point = Point("payment")
-        
-        # Tags
-        point.tag("status", status)
-        point.tag("currency", payment.currency)
-        point.tag("customer_id", payment.customer_id)
-        point.tag("merchant_id", f"merch_{random.randint(1, 500):04d}")
-        point.tag("payment_method", random.choice(["card", "bank_transfer", "wallet", "crypto"]))
-        point.tag("region", random.choice(["EU", "US", "ASIA", "LATAM"]))
-        point.tag("card_brand", random.choice(["VISA", "MASTERCARD", "AMEX", "DISCOVER"]))
-        point.tag("risk_level", random.choices(
-            ["low", "medium", "high", "critical"],
-            weights=[0.80, 0.15, 0.04, 0.01]
-        )[0])
+        # Tags (customer_id is a field by default, see INFLUXDB_FIELD_DIMENSIONS)
+        tags = (
+            status,
+            currency,
+            payment.customer_id,
+            f"merch_{random.randint(1, 500):04d}",
+            random.choice(["card", "bank_transfer", "wallet", "crypto"]),
+            region,
+            random.choice(["VISA", "MASTERCARD", "AMEX", "DISCOVER"]),
+            random.choices(["low", "medium", "high", "critical"], weights=[0.80, 0.15, 0.04, 0.01])[0]
+        )
         
         # Fields
-        point.field("amount", float(amount))
-        point.field("processing_time", processing_time)
-        point.field("network_latency", network_latency)
-        point.field("gateway_latency", gateway_latency)
-        point.field("error_code", 0 if is_success else random.randint(5001, 5010))
-        point.field("retry_count", 0 if is_success else random.randint(1, 3))
-        point.field("fraud_score", round(random.uniform(0, 0.05), 3) if is_success 
-                    else round(random.uniform(0.70, 1.0), 3))
-        point.field("response_time", processing_time * 1000)
-        point.field("fee", round(amount * 0.029 + 0.30, 2))  # 2.9% + 0.30€
-        point.field("success", 1 if is_success else 0)
-        
-        point.time(datetime.utcnow())
-            
-        write_api.write(
-            bucket=INFLUX_CONFIG["bucket"],
-            org=INFLUX_CONFIG["org"],
-            record=point
+        fields = (
+            float(amount),
+            processing_time,
+            network_latency,
+            gateway_latency,
+            0 if is_success else random.randint(5001, 5010),  # error_code
+            0 if is_success else random.randint(1, 3),  # retry_count
+            round(random.uniform(0, 0.05), 3) if is_success else round(random.uniform(0.70, 1.0), 3),  # fraud_score
+            processing_time * 1000,  # response_time
+            round(amount * 0.029 + 0.30, 2),  # fee: 2.9% + 0.30€
+            1 if is_success else 0  # success
         )
-        logger.info(f"Payment {payment_id} written to InfluxDB: {status}")
+        
+        if await influx_writer.write(PAYMENT_LINE.encode(tags, fields, time.time_ns())):
+            logger.info(f"Payment {payment_id} queued for InfluxDB: {status}")
     except Exception as e:
         logger.error(f"Failed to write to InfluxDB: {str(e)}")
     
@@ -223,23 +332,24 @@ async def process_payment(payment: PaymentRequest):
 
 # Get payment statistics
 @app.get("/api/payments/stats")
-async def get_payment_stats():
+async def get_payment_stats(window: str = "5m"):
+    if window not in WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"window must be one of {list(WINDOWS)}"
+        )
     try:
-        # This is a simplified example - you'd typically query InfluxDB here
-        return {
-            "total_payments": 0,  # Replace with actual query
-            "success_rate": 1.0,   # Replace with actual calculation
-            "avg_processing_time": 0.0  # Replace with actual calculation
-        }
+        # Served from the in-process aggregator (this worker's payments)
+        return payment_stats.snapshot(window)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
-# Initialize Prometheus instrumentation
+# Initialize Prometheus instrumentation (exposed through the cached /metrics above)
 instrumentator = Instrumentator()
-instrumentator.instrument(app).expose(app, include_in_schema=False)
+instrumentator.instrument(app)
 
 if __name__ == "__main__":
     import uvicorn
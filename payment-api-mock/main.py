@@ -1,15 +1,37 @@
 from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from datetime import datetime
+from starlette.requests import ClientDisconnect
+from pydantic import BaseModel, ValidationError
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import NamedTuple
+import asyncio
+import json
 import random
 import time
 import os
+import tempfile
 from dotenv import load_dotenv
-from influxdb_client import InfluxDBClient, Point
-from influxdb_client.client.write_api import SYNCHRONOUS
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from influx_writer import BatchingInfluxWriter
+from spool import SegmentSpool
+from prometheus_client import Counter, Histogram
+from metrics_cache import MetricsCache, exposition_registry
+from observability_common.native_histogram import NativeHistogram
+from cardinality import OVERFLOW_VALUE, InfluxTagPolicy, SeriesBudget, bounded_value, route_template
+from line_protocol import LineProtocolEncoder
+from payment_stats import WINDOWS, PaymentStats
+from observability_common.tracing import Span, current_span, start_span
+from observability_common.otlp import setup_tracing
+from exemplars import ExemplarRegistry, SlowestExemplars
+from observability_common.event_log import EventReader, EventWriter, parse_speed
+from idempotency import IdempotencyCache, IdempotencyKeyReused
+from ledger import PaymentLedger
+from payment_batch import BatchFormatError, NDJSONStreamingResponse, iter_items, observe_many
+from serialization import PydanticJSONResponse, parse_body, request_body_schema
+from payment_model import (PAYMENT_STATUSES, PAYMENT_METHODS, REGIONS, CARD_BRANDS, RISK_LEVELS, RISK_WEIGHTS,
+                           PAYMENT_TAGS, PAYMENT_FIELDS, draw_status, generate_processing_time, generate_realistic_amount)
 import logging
 
 # Load environment variables
@@ -19,16 +41,119 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# InfluxDB configuration
+# InfluxDB configuration (INFLUXDB_ENABLED=false: no client, no points; influxdb_client is never imported)
+INFLUXDB_ENABLED = os.getenv("INFLUXDB_ENABLED", "true").lower() in ("1", "true", "yes")
 INFLUX_CONFIG = {
     "url": os.getenv("INFLUXDB_URL", "http://influxdb:8086"),
     "token": os.getenv("INFLUXDB_TOKEN", "my-super-secret-auth-token"),
     "org": os.getenv("INFLUXDB_ORG", "myorg"),
-    "bucket": os.getenv("INFLUXDB_BUCKET", "payments")
+    "bucket": os.getenv("INFLUXDB_BUCKET", "payments"),
+    # Background batch writer
+    "batch_size": int(os.getenv("INFLUXDB_BATCH_SIZE", "500")),
+    "flush_interval": float(os.getenv("INFLUXDB_FLUSH_INTERVAL", "1.0")),
+    "queue_size": int(os.getenv("INFLUXDB_QUEUE_SIZE", "10000")),
+    "queue_policy": os.getenv("INFLUXDB_QUEUE_POLICY", "drop_newest"),
+    "max_retries": int(os.getenv("INFLUXDB_MAX_RETRIES", "3")),
+    # On-disk spool for batches InfluxDB could not take ("" disables it)
+    "spool_dir": os.getenv("INFLUXDB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "payment-api-spool")),
+    "spool_max_bytes": int(os.getenv("INFLUXDB_SPOOL_MAX_BYTES", str(256 * 1024 * 1024))),
+    "spool_segment_bytes": int(os.getenv("INFLUXDB_SPOOL_SEGMENT_BYTES", str(8 * 1024 * 1024))),
+    "replay_interval": float(os.getenv("INFLUXDB_REPLAY_INTERVAL", "5.0")),
+    # High-cardinality dimensions written as fields instead of tags
+    "field_dimensions": os.getenv("INFLUXDB_FIELD_DIMENSIONS", "customer_id").split(",")
 }
 
+# prometheus_fastapi_instrumentator's http_* metrics and /metrics-auto (imported only if enabled)
+AUTO_INSTRUMENTATION = os.getenv("AUTO_INSTRUMENTATION", "true").lower() in ("1", "true", "yes")
+
+# /api/payments and /health parse and render JSON in one pydantic-core call, without FastAPI's
+# request and response_model round trips (see serialization.py; false: the plain FastAPI path)
+FAST_SERIALIZATION = os.getenv("FAST_SERIALIZATION", "true").lower() in ("1", "true", "yes")
+
+# Rendered /metrics payload is reused for this many seconds (0 = render every scrape)
+METRICS_CACHE_MAX_AGE = float(os.getenv("METRICS_CACHE_MAX_AGE", "1.0"))
+
+# Lock-free per-thread shards for the payment/request metrics (single process only)
+METRICS_SHARDING = os.getenv("METRICS_SHARDING", "false").lower() in ("1", "true", "yes")
+
+# Sparse exponential-bucket histogram for processing time (single process only)
+NATIVE_HISTOGRAMS = os.getenv("NATIVE_HISTOGRAMS", "false").lower() in ("1", "true", "yes")
+NATIVE_HISTOGRAM_SCHEMA = int(os.getenv("NATIVE_HISTOGRAM_SCHEMA", "3"))
+
+# Tracing: OTLP/HTTP to Tempo or the Collector, head sampling + tail sampling (errors, slow requests)
+TRACING_CONFIG = {
+    "exporter": os.getenv("OTEL_TRACES_EXPORTER", "none"),  # otlp, file, memory, none
+    "service_name": os.getenv("OTEL_SERVICE_NAME", "payment-api-mock"),
+    "endpoint": os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://tempo:4318"),
+    "file": os.getenv("TRACES_FILE", "traces.jsonl"),
+    "sample_ratio": float(os.getenv("OTEL_TRACES_SAMPLER_ARG", "0.01")),
+    # Traces at least this slow (seconds) are always exported; 0 disables
+    "tail_latency": float(os.getenv("TRACES_TAIL_LATENCY", "1.0")) or None,
+    "max_queue_size": int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "2048")),
+    "max_export_batch_size": int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "512")),
+    "schedule_delay": float(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "5000")) / 1000
+}
+
+# Trace-ID exemplars on latency histograms: slowest request per bucket over EXEMPLAR_MAX_AGE seconds.
+# On by default only when traces are exported, otherwise the trace IDs lead nowhere.
+EXEMPLARS = os.getenv("EXEMPLARS", str(TRACING_CONFIG["exporter"] != "none")).lower() in ("1", "true", "yes")
+EXEMPLAR_MAX_AGE = float(os.getenv("EXEMPLAR_MAX_AGE", "60"))
+
+# Cardinality guardrails: max label sets per metric, allowed client-supplied currencies
+METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "2000"))
+ALLOWED_CURRENCIES = frozenset(os.getenv("ALLOWED_CURRENCIES", "EUR,USD,GBP,CHF,JPY,CAD,AUD").split(","))
+
+# Event log (see observability_common.event_log): record every processed payment, and/or replay a recording
+# into the metrics, stats and InfluxDB at REPLAY_SPEED (1, 10, ... or max)
+EVENT_RECORD = os.getenv("EVENT_RECORD", "")  # "{pid}" is replaced by the worker's PID
+EVENT_REPLAY = os.getenv("EVENT_REPLAY", "")
+REPLAY_SPEED = parse_speed(os.getenv("REPLAY_SPEED", "1"))
+
+# Idempotency-Key deduplication (see idempotency.py): outcomes kept for IDEMPOTENCY_TTL seconds (0 disables)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# Ledger (see ledger.py): payments kept in memory for lookups, ~26 bytes each (0: IDs only).
+# Each worker only holds its own payments, so lookups need a single worker (gunicorn_conf.py
+# exports its worker count as WEB_CONCURRENCY); with more, only IDs are issued.
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+LEDGER_CAPACITY = int(os.getenv("LEDGER_CAPACITY", "1000000")) if WORKERS == 1 else 0
+LEDGER_SCAN_MAX_LIMIT = 10000
+
+# POST /api/payments/batch (see payment_batch.py): payments in flight per request, and how many
+# payments (or seconds) are aggregated into one metrics update and one InfluxDB write
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "256"))
+BATCH_FLUSH_SIZE = int(os.getenv("BATCH_FLUSH_SIZE", "5000"))
+BATCH_FLUSH_INTERVAL = float(os.getenv("BATCH_FLUSH_INTERVAL", "1.0"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing slow here: the InfluxDB client is built in a thread after startup
+    if influx_writer:
+        influx_writer.start()
+    if span_processor:
+        span_processor.start()
+    app.state.replay = None
+    if EVENT_REPLAY:
+        if claim_replay():
+            app.state.replay = asyncio.create_task(replay_payments(EVENT_REPLAY, REPLAY_SPEED))
+        else:
+            logger.info(f"{EVENT_REPLAY} is replayed by another worker")
+    app.state.serving = True
+    yield
+    app.state.serving = False
+    if app.state.replay:
+        app.state.replay.cancel()
+    if event_writer:
+        event_writer.close()
+    if influx_writer:
+        await influx_writer.close()
+    if span_processor:
+        await asyncio.to_thread(span_processor.shutdown)
+
 # Initialize FastAPI app
-app = FastAPI(title="Payment API", version="1.0.0")
+app = FastAPI(title="Payment API", version="1.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -39,73 +164,148 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize InfluxDB client (optional)
-influx_client = InfluxDBClient(
-    url=INFLUX_CONFIG["url"],
-    token=INFLUX_CONFIG["token"],
+def connect_influx():
+    """Synchronous InfluxDB write API; called in a thread by the batch writer"""
+    from influxdb_client import InfluxDBClient
+    from influxdb_client.client.write_api import SYNCHRONOUS
+
+    influx_client = InfluxDBClient(
+        url=INFLUX_CONFIG["url"],
+        token=INFLUX_CONFIG["token"],
+        org=INFLUX_CONFIG["org"],
+        verify_ssl=False,
+        ssl=False
+    )
+    return influx_client.write_api(write_options=SYNCHRONOUS)
+
+# Points are queued and written in batches by a background task
+influx_writer = BatchingInfluxWriter(
+    None,
+    bucket=INFLUX_CONFIG["bucket"],
     org=INFLUX_CONFIG["org"],
-    verify_ssl=False,
-    ssl=False
+    batch_size=INFLUX_CONFIG["batch_size"],
+    flush_interval=INFLUX_CONFIG["flush_interval"],
+    queue_size=INFLUX_CONFIG["queue_size"],
+    policy=INFLUX_CONFIG["queue_policy"],
+    max_retries=INFLUX_CONFIG["max_retries"],
+    spool=SegmentSpool(
+        INFLUX_CONFIG["spool_dir"],
+        segment_bytes=INFLUX_CONFIG["spool_segment_bytes"],
+        max_bytes=INFLUX_CONFIG["spool_max_bytes"]
+    ) if INFLUX_CONFIG["spool_dir"] else None,
+    replay_interval=INFLUX_CONFIG["replay_interval"],
+    connect=connect_influx
+) if INFLUXDB_ENABLED else None
+influx_tags = InfluxTagPolicy(INFLUX_CONFIG["field_dimensions"])
+
+# Fixed schema of the "payment" measurement, encoded straight to line protocol
+PAYMENT_LINE = LineProtocolEncoder(
+    "payment",
+    tags=PAYMENT_TAGS,
+    fields=PAYMENT_FIELDS,
+    field_dimensions=influx_tags.field_keys
 )
-write_api = influx_client.write_api(write_options=SYNCHRONOUS)
+
+span_processor = setup_tracing(**TRACING_CONFIG, metric_prefix="payment")
 
 # ========================
 # PROMETHEUS METRICS
 # ========================
 
+if METRICS_SHARDING and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    logger.warning("METRICS_SHARDING is ignored in multiprocess mode")
+    METRICS_SHARDING = False
+if METRICS_SHARDING:
+    from sharded_metrics import ShardedCounter as MetricCounter, ShardedHistogram as MetricHistogram
+else:
+    MetricCounter, MetricHistogram = Counter, Histogram
+if NATIVE_HISTOGRAMS and os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+    logger.warning("NATIVE_HISTOGRAMS is ignored in multiprocess mode")
+    NATIVE_HISTOGRAMS = False
+
 # Counter: total amount by status + dimensions (includes currency)
-PAYMENT_AMOUNT = Counter(
+PAYMENT_AMOUNT = MetricCounter(
     'payment_amount_sum',
     'Total successful/failed payment amount',
     ['status', 'currency', 'payment_method', 'region', 'card_brand']
 )
 
 # Counter: transaction count by status + dimensions (includes currency)
-PAYMENT_COUNT = Counter(
+PAYMENT_COUNT = MetricCounter(
     'payment_count_total',
     'Total number of payment transactions',
     ['status', 'currency', 'payment_method', 'region', 'card_brand']
 )
 
 # Histogram: processing time (NO currency — matches dashboard logic)
-PAYMENT_PROCESSING_DURATION = Histogram(
-    'payment_processing_duration_seconds',
-    'Processing time per transaction',
-    ['status', 'payment_method', 'region', 'card_brand'],
-    buckets=[0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1.0, 2.0, 5.0]
-)
+if NATIVE_HISTOGRAMS:
+    PAYMENT_PROCESSING_DURATION = NativeHistogram(
+        'payment_processing_duration_seconds',
+        'Processing time per transaction',
+        ['status', 'payment_method', 'region', 'card_brand'],
+        schema=NATIVE_HISTOGRAM_SCHEMA
+    )
+else:
+    PAYMENT_PROCESSING_DURATION = MetricHistogram(
+        'payment_processing_duration_seconds',
+        'Processing time per transaction',
+        ['status', 'payment_method', 'region', 'card_brand'],
+        buckets=[0.05, 0.1, 0.2, 0.3, 0.5, 0.8, 1.0, 2.0, 5.0]
+    )
 
 # Optional: generic HTTP metrics
-from prometheus_client import Counter as GenCounter, Histogram as GenHistogram
-REQUEST_COUNT = GenCounter(
+REQUEST_COUNT = MetricCounter(
     'payment_requests_total',
     'HTTP requests to payment endpoints',
     ['method', 'endpoint', 'status']
 )
-REQUEST_LATENCY = GenHistogram(
+REQUEST_LATENCY = MetricHistogram(
     'payment_request_duration_seconds',
     'HTTP request duration',
     ['method', 'endpoint']
 )
 
-# ========================
-# HELPERS
-# ========================
+# Series budgets (PAYMENT_AMOUNT shares PAYMENT_COUNT's label sets)
+PAYMENT_SERIES = SeriesBudget('payment_count_total', PAYMENT_COUNT._labelnames, METRICS_MAX_SERIES)
+DURATION_SERIES = SeriesBudget('payment_processing_duration_seconds',
+                               PAYMENT_PROCESSING_DURATION._labelnames, METRICS_MAX_SERIES)
+REQUEST_SERIES = SeriesBudget('payment_requests_total', REQUEST_COUNT._labelnames, METRICS_MAX_SERIES)
+LATENCY_SERIES = SeriesBudget('payment_request_duration_seconds', REQUEST_LATENCY._labelnames, METRICS_MAX_SERIES)
+
+exemplars = SlowestExemplars(max_age=EXEMPLAR_MAX_AGE) if EXEMPLARS else None
+metrics_cache = MetricsCache(
+    registry=ExemplarRegistry(exposition_registry(), exemplars) if exemplars else None,
+    max_age=METRICS_CACHE_MAX_AGE
+)
 
-def generate_realistic_amount() -> float:
-    rand = random.random()
-    if rand < 0.80:
-        return max(0.01, round(random.gauss(75, 45), 2))
-    elif rand < 0.95:
-        return max(0.01, round(random.gauss(500, 250), 2))
-    else:
-        return max(0.01, round(random.gauss(2000, 1000), 2))
+# Sliding-window aggregates served by /api/payments/stats
+payment_stats = PaymentStats()
 
-def generate_processing_time(status: str) -> float:
-    if status == "success":
-        return max(0.05, round(random.gauss(0.24, 0.10), 3))
-    else:
-        return max(0.1, round(random.gauss(0.80, 0.35), 3))
+# Outcomes of recent keyed payments, so client retries are not processed twice
+idempotency = IdempotencyCache(IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL) if IDEMPOTENCY_TTL > 0 else None
+
+# Generated payment dimensions; recorded as indexes into these lists
+RECORDED_LABELS = {
+    "status": PAYMENT_STATUSES,
+    "currency": sorted(ALLOWED_CURRENCIES) + [OVERFLOW_VALUE],
+    "payment_method": PAYMENT_METHODS,
+    "region": REGIONS,
+    "card_brand": CARD_BRANDS,
+    "risk_level": RISK_LEVELS,
+}
+RECORDED_CODES = {name: {value: i for i, value in enumerate(values)} for name, values in RECORDED_LABELS.items()}
+
+event_writer = EventWriter(
+    EVENT_RECORD.format(pid=os.getpid()),
+    [("t", "d"), *((name, "B") for name in RECORDED_LABELS), ("amount", "d"), ("processing_time", "d")],
+    labels=RECORDED_LABELS,
+    meta={"source": "payment-api-mock"}
+) if EVENT_RECORD else None
+
+# Payment IDs, and the last LEDGER_CAPACITY payments for GET /api/payments
+ledger = PaymentLedger(RECORDED_LABELS, LEDGER_CAPACITY)
+# Lookups answer with the status POST /api/payments returned
+LEDGER_STATUSES = {"success": "completed"}
 
 # ========================
 # MODELS
@@ -125,23 +325,90 @@ class PaymentResponse(BaseModel):
     timestamp: str
     processing_time_ms: float
 
+class PaymentRecord(BaseModel):
+    payment_id: str
+    timestamp: str
+    status: str
+    amount: float
+    currency: str
+    payment_method: str
+    region: str
+    card_brand: str
+    risk_level: str
+    processing_time_ms: float
+
+class PaymentList(BaseModel):
+    count: int
+    payments: list[PaymentRecord]
+
+class ProcessedPayment(NamedTuple):
+    # Everything after payment_id is publish_payment()'s arguments, in order
+    payment_id: str
+    status: str
+    currency: str
+    payment_method: str
+    region: str
+    card_brand: str
+    risk_level: str
+    amount: float
+    processing_time: float
+    span: object
+
 # ========================
 # MIDDLEWARE
 # ========================
 
-@app.middleware("http")
-async def monitor_requests(request: Request, call_next):
-    start = time.time()
-    method = request.method
-    endpoint = request.url.path
-    try:
-        response = await call_next(request)
-        REQUEST_COUNT.labels(method, endpoint, response.status_code).inc()
-        REQUEST_LATENCY.labels(method, endpoint).observe(time.time() - start)
-        return response
-    except Exception as e:
-        REQUEST_COUNT.labels(method, endpoint, 500).inc()
-        raise e
+class RequestMonitor:
+    """Count, latency and server span of every HTTP request
+
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware reads
+    receive() for a disconnect while the response streams, which would take
+    request body chunks away from POST /api/payments/batch.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.time()
+        request = Request(scope)
+        method = request.method
+        # Route template, not the raw path: unknown URLs must not create series
+        endpoint = route_template(request)
+        # Continues the caller's trace if it sent a traceparent header
+        with start_span(f"{method} {endpoint}", request.headers.get("traceparent"), kind="server",
+                        attributes={"http.method": method, "http.route": endpoint}) as span:
+            responded = False
+
+            async def send_monitored(message):
+                nonlocal responded
+                if message["type"] == "http.response.start":
+                    responded = True
+                    status_code = message["status"]
+                    REQUEST_COUNT.labels(*REQUEST_SERIES.labels(method, endpoint, status_code)).inc()
+                    latency_labels = LATENCY_SERIES.labels(method, endpoint)
+                    elapsed = time.time() - start
+                    REQUEST_LATENCY.labels(*latency_labels).observe(elapsed)
+                    if exemplars:
+                        exemplars.observe(REQUEST_LATENCY, latency_labels, elapsed, span)
+                    span.set_attribute("http.status_code", status_code)
+                    if status_code >= 500:
+                        span.set_attribute("error", f"HTTP {status_code}")
+                    message = {**message, "headers": [*message.get("headers", ()),
+                                                      (b"traceparent", span.traceparent.encode("latin-1"))]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_monitored)
+            except Exception:
+                if not responded:
+                    REQUEST_COUNT.labels(*REQUEST_SERIES.labels(method, endpoint, 500)).inc()
+                raise
+
+app.add_middleware(RequestMonitor)
 
 # ========================
 # ENDPOINTS
@@ -149,53 +416,131 @@ async def monitor_requests(request: Request, call_next):
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    health = {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
+    return PydanticJSONResponse(health) if FAST_SERIALIZATION else health
+
+@app.get("/ready")
+async def readiness_check():
+    """503 until startup is done and once shutdown begins (/health only says the process is up)
+
+    The InfluxDB client is not waited for: points queue up until it exists.
+    """
+    influxdb = "disabled" if not influx_writer else "connected" if influx_writer.connected else "connecting"
+    if not getattr(app.state, "serving", False):
+        return JSONResponse({"status": "not ready", "influxdb": influxdb},
+                            status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready", "influxdb": influxdb, "timestamp": datetime.utcnow().isoformat()}
 
 @app.get("/metrics")
-async def metrics():
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
-
-@app.post("/api/payments", response_model=PaymentResponse)
-async def process_payment(payment: PaymentRequest, request: Request):
-    start_time = time.time()
-
-    # Get custom rates from headers (if provided)
-    success_rate = float(request.headers.get("X-Success-Rate", "84")) / 100
-    failure_rate = float(request.headers.get("X-Failure-Rate", "1")) / 100
-    pending_rate = float(request.headers.get("X-Pending-Rate", "15")) / 100
-    
-    # Normalize rates to ensure they sum to 1.0
-    total = success_rate + failure_rate + pending_rate
-    if total > 0:
-        success_rate /= total
-        failure_rate /= total
-        pending_rate /= total
-    
-    # Determine status based on custom or default rates
-    r = random.random()
-    if r < success_rate:
-        status = "success"
-    elif r < success_rate + failure_rate:
-        status = "failed"
-    else:
-        status = "pending"
+async def metrics(request: Request):
+    return await metrics_cache.response(request)
+
+if FAST_SERIALIZATION:
+    @app.post("/api/payments", response_model=PaymentResponse, openapi_extra=request_body_schema(PaymentRequest))
+    async def process_payment(request: Request):
+        return await handle_payment(await parse_body(request, PaymentRequest), request)
+else:
+    @app.post("/api/payments", response_model=PaymentResponse)
+    async def process_payment(payment: PaymentRequest, request: Request):
+        return await handle_payment(payment, request)
+
+async def handle_payment(payment: PaymentRequest, request: Request):
+    key = request.headers.get("Idempotency-Key")
+    if key is None or idempotency is None:
+        payment_response = await execute_payment(payment, request)
+        return PydanticJSONResponse(payment_response) if FAST_SERIALIZATION else payment_response
+    if not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters"
+        )
+
+    async def settle():
+        # Failed payments are outcomes too: a retry must get the same 402
+        try:
+            return status.HTTP_200_OK, jsonable_encoder(await execute_payment(payment, request))
+        except HTTPException as e:
+            return e.status_code, {"detail": e.detail}
+
+    fingerprint = (payment.amount, payment.currency, payment.customer_id, payment.description)
+    try:
+        (status_code, content), replayed = await idempotency.run(key, fingerprint, settle)
+    except IdempotencyKeyReused:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request body"
+        )
+    response_class = PydanticJSONResponse if FAST_SERIALIZATION else JSONResponse
+    return response_class(content, status_code=status_code,
+                          headers={"Idempotent-Replayed": "true"} if replayed else None)
+
+def status_rates(request: Request) -> tuple:
+    """Success, failure and pending rates from the X-*-Rate headers (percent), else the defaults"""
+    return (float(request.headers.get("X-Success-Rate", "84")) / 100,
+            float(request.headers.get("X-Failure-Rate", "1")) / 100,
+            float(request.headers.get("X-Pending-Rate", "15")) / 100)
+
+async def process(payment: PaymentRequest, rates: tuple, link: Span = None) -> ProcessedPayment:
+    """Simulate one payment and store it in the event log and ledger (not yet published)
+
+    With `link` (a batch's span), the payment's span starts its own trace linked to it.
+    """
+    # Determine status based on custom or default rates (normalized to sum to 1.0)
+    payment_status = draw_status(*rates)
 
-    is_success = (status == "success")
     amount = payment.amount if payment.amount > 0 else generate_realistic_amount()
-    processing_time = generate_processing_time(status)
-    time.sleep(processing_time)
+    processing_time = generate_processing_time(payment_status)
+    with start_span("payment.process", attributes={"payment.status": payment_status}, link=link) as span:
+        # Non-blocking: keep the event loop free for other in-flight payments
+        await asyncio.sleep(processing_time)
 
     # Generate dimensions
-    payment_method = random.choice(["card", "bank_transfer", "wallet", "crypto"])
-    region = random.choice(["EU", "US", "ASIA", "LATAM"])
-    card_brand = random.choice(["VISA", "MASTERCARD", "AMEX", "DISCOVER"])
+    payment_method = random.choice(PAYMENT_METHODS)
+    region = random.choice(REGIONS)
+    card_brand = random.choice(CARD_BRANDS)
+    risk_level = random.choices(RISK_LEVELS, weights=RISK_WEIGHTS)[0]
+    currency = bounded_value(payment.currency, ALLOWED_CURRENCIES)
+    codes = RECORDED_CODES
+    labels = (codes["status"][payment_status], codes["currency"][currency], codes["payment_method"][payment_method],
+              codes["region"][region], codes["card_brand"][card_brand], codes["risk_level"][risk_level])
+    now = time.time()
+    if event_writer:
+        event_writer.append(now, *labels, amount, processing_time)
+    payment_id = ledger.append(now, amount, processing_time, *labels)
+    return ProcessedPayment(payment_id, payment_status, currency, payment_method, region, card_brand, risk_level,
+                            amount, processing_time, span)
+
+async def execute_payment(payment: PaymentRequest, request: Request) -> PaymentResponse:
+    processed = await process(payment, status_rates(request))
+    await publish_payment(*processed[1:])
 
+    # ------------------------
+    # 📤 Response
+    # ------------------------
+    if processed.status == "success":
+        return PaymentResponse(
+            payment_id=processed.payment_id,
+            status="completed",
+            amount=processed.amount,
+            currency=payment.currency,
+            timestamp=datetime.utcnow().isoformat(),
+            processing_time_ms=round(processed.processing_time * 1000, 2)
+        )
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_402_PAYMENT_REQUIRED,
+            detail="Payment processing failed"
+        )
+
+async def publish_payment(status: str, currency: str, payment_method: str, region: str, card_brand: str,
+                          risk_level: str, amount: float, processing_time: float, span=None):
+    """Metrics, stats and InfluxDB point of one processed payment (served or replayed)"""
     # ------------------------
     # ✅ PROMETHEUS METRICS
     # ------------------------
     counter_labels = {
         "status": status,
-        "currency": payment.currency,
+        "currency": currency,
         "payment_method": payment_method,
         "region": region,
         "card_brand": card_brand
@@ -208,54 +553,280 @@ async def process_payment(payment: PaymentRequest, request: Request):
         "card_brand": card_brand
     }
 
-    PAYMENT_COUNT.labels(**counter_labels).inc()
+    payment_series = PAYMENT_SERIES.labels(*counter_labels.values())
+    PAYMENT_COUNT.labels(*payment_series).inc()
     if status in ("success", "failed"):
-        PAYMENT_AMOUNT.labels(**counter_labels).inc(amount)
-    PAYMENT_PROCESSING_DURATION.labels(**histogram_labels).observe(processing_time)
+        PAYMENT_AMOUNT.labels(*payment_series).inc(amount)
+    duration_labels = DURATION_SERIES.labels(*histogram_labels.values())
+    PAYMENT_PROCESSING_DURATION.labels(*duration_labels).observe(processing_time)
+    if exemplars:
+        exemplars.observe(PAYMENT_PROCESSING_DURATION, duration_labels, processing_time, span)
+    payment_stats.record(status, counter_labels["currency"], region, amount, processing_time)
 
     # ------------------------
     # 📦 InfluxDB (optional)
     # ------------------------
+    if not influx_writer:
+        return
     try:
-        point = Point("payment")
-        for k, v in counter_labels.items():
-            point.tag(k, v)
-        point.tag("risk_level", random.choices(["low","medium","high","critical"], weights=[0.80,0.15,0.04,0.01])[0])
-        point.field("amount", float(amount))
-        point.field("processing_time", processing_time)
-        point.field("success", 1 if is_success else 0)
-        point.time(datetime.utcnow())
-        write_api.write(bucket=INFLUX_CONFIG["bucket"], org=INFLUX_CONFIG["org"], record=point)
+        tags = (*counter_labels.values(), risk_level)
+        fields = (float(amount), processing_time, 1 if status == "success" else 0)
+        await influx_writer.write(PAYMENT_LINE.encode(tags, fields, time.time_ns()))
     except Exception as e:
         logger.error(f"InfluxDB write failed: {e}")
 
-    # ------------------------
-    # 📤 Response
-    # ------------------------
-    payment_id = f"pay_{int(time.time() * 1000)}_{random.randint(1000, 9999)}"
-    if is_success:
-        return PaymentResponse(
-            payment_id=payment_id,
-            status="completed",
-            amount=amount,
-            currency=payment.currency,
-            timestamp=datetime.utcnow().isoformat(),
-            processing_time_ms=round(processing_time * 1000, 2)
+class PaymentAggregate:
+    """Metrics, stats and InfluxDB points of many payments, published with one update per label set"""
+
+    def __init__(self):
+        self.counts = {}  # PAYMENT_COUNT labels -> [count, amount]
+        self.durations = {}  # PAYMENT_PROCESSING_DURATION labels -> processing times
+        self.slowest = {}  # PAYMENT_PROCESSING_DURATION labels -> (processing time, span), for exemplars
+        self.lines = []
+
+    def __len__(self) -> int:
+        return len(self.lines)
+
+    def add(self, payment: ProcessedPayment):
+        status_, currency, payment_method, region, card_brand, risk_level, amount, processing_time, span = payment[1:]
+        counter_labels = (status_, currency, payment_method, region, card_brand)
+        totals = self.counts.get(counter_labels)
+        if totals is None:
+            totals = self.counts[counter_labels] = [0, 0.0]
+        totals[0] += 1
+        totals[1] += amount
+        histogram_labels = (status_, payment_method, region, card_brand)
+        durations = self.durations.get(histogram_labels)
+        if durations is None:
+            durations = self.durations[histogram_labels] = []
+        durations.append(processing_time)
+        if exemplars and processing_time > self.slowest.get(histogram_labels, (-1.0,))[0]:
+            self.slowest[histogram_labels] = (processing_time, span)
+        payment_stats.record(status_, currency, region, amount, processing_time)
+        if not influx_writer:
+            return
+        try:
+            fields = (float(amount), processing_time, 1 if status_ == "success" else 0)
+            self.lines.append(PAYMENT_LINE.encode((*counter_labels, risk_level), fields, time.time_ns()))
+        except Exception as e:
+            logger.error(f"InfluxDB point encoding failed: {e}")
+
+    async def flush(self):
+        counts, durations, slowest, lines = self.counts, self.durations, self.slowest, self.lines
+        self.counts, self.durations, self.slowest, self.lines = {}, {}, {}, []
+        for counter_labels, (count, amount) in counts.items():
+            payment_series = PAYMENT_SERIES.labels(*counter_labels)
+            PAYMENT_COUNT.labels(*payment_series).inc(count)
+            if counter_labels[0] in ("success", "failed"):
+                PAYMENT_AMOUNT.labels(*payment_series).inc(amount)
+        for histogram_labels, values in durations.items():
+            duration_labels = DURATION_SERIES.labels(*histogram_labels)
+            observe_many(PAYMENT_PROCESSING_DURATION.labels(*duration_labels), values)
+            if histogram_labels in slowest:
+                exemplars.observe(PAYMENT_PROCESSING_DURATION, duration_labels, *slowest[histogram_labels])
+        if lines:
+            try:
+                await influx_writer.write_batch(lines)
+            except Exception as e:
+                logger.error(f"InfluxDB write failed: {e}")
+
+@app.post("/api/payments/batch")
+async def process_payment_batch(request: Request, concurrency: int = BATCH_CONCURRENCY):
+    """Payments as a JSON array or NDJSON, one NDJSON result per payment back as each completes"""
+    if not 0 < concurrency <= BATCH_CONCURRENCY:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"concurrency must be between 1 and {BATCH_CONCURRENCY}"
         )
-    else:
+    rates = status_rates(request)
+    return NDJSONStreamingResponse(request, lambda chunks: stream_batch(chunks, rates, concurrency))
+
+async def stream_batch(chunks, rates: tuple, concurrency: int):
+    """NDJSON result lines of the payments in `chunks`, then a summary line
+
+    A reader feeds `concurrency` workers through a bounded queue, and results
+    go out through another: a slow client slows the reader down rather than
+    piling up results, so memory stays flat however long the batch.
+    """
+    jobs = asyncio.Queue(concurrency)
+    results = asyncio.Queue(concurrency)
+    aggregate = PaymentAggregate()
+    summary = {"payments": 0, "invalid": 0, **dict.fromkeys(PAYMENT_STATUSES, 0)}
+
+    async def read():
+        try:
+            async for job in iter_items(chunks):
+                await jobs.put(job)
+        except BatchFormatError as e:
+            # Stops the batch: the items after a syntax error cannot be told apart
+            summary["invalid"] += 1
+            await results.put({"index": e.index, "error": str(e)})
+        except ClientDisconnect:
+            pass  # the response stops at its next chunk (see NDJSONStreamingResponse)
+        for _ in range(concurrency):
+            await jobs.put(None)
+
+    async def work():
+        # Each payment is its own trace: as children they would all be held until the batch ends
+        batch_span = current_span()
+        while (job := await jobs.get()) is not None:
+            index, item = job
+            try:
+                payment = PaymentRequest.model_validate(item)
+            except ValidationError as e:
+                summary["invalid"] += 1
+                await results.put({"index": index, "error": e.errors(include_url=False, include_context=False)})
+                continue
+            processed = await process(payment, rates, batch_span)
+            aggregate.add(processed)
+            summary["payments"] += 1
+            summary[processed.status] += 1
+            await results.put({
+                "index": index,
+                "payment_id": processed.payment_id,
+                "status": processed.status,
+                "amount": processed.amount,
+                "currency": payment.currency,
+                "processing_time_ms": round(processed.processing_time * 1000, 2)
+            })
+
+    async def run():
+        tasks = [asyncio.ensure_future(read()), *(asyncio.ensure_future(work()) for _ in range(concurrency))]
+        try:
+            await asyncio.gather(*tasks)
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            await results.put(None)
+            raise
+        await results.put(None)
+
+    with start_span("payment.batch", attributes={"batch.concurrency": concurrency}) as span:
+        runner = asyncio.create_task(run())
+        flushed = time.monotonic()
+        try:
+            done = False
+            while not done:
+                # Everything already waiting goes out as one chunk
+                lines = []
+                result = await results.get()
+                while True:
+                    if result is None:
+                        done = True
+                        break
+                    lines.append(json.dumps(result))
+                    if results.empty():
+                        break
+                    result = results.get_nowait()
+                if lines:
+                    yield "\n".join(lines) + "\n"
+                if len(aggregate) >= BATCH_FLUSH_SIZE or time.monotonic() - flushed >= BATCH_FLUSH_INTERVAL:
+                    await aggregate.flush()
+                    flushed = time.monotonic()
+            try:
+                await runner
+            except Exception as e:
+                logger.exception("Payment batch failed")
+                span.set_attribute("error", str(e))
+                summary["error"] = "internal error"
+            yield json.dumps({"summary": summary}) + "\n"
+        finally:
+            runner.cancel()
+            # Published even if the client went away: those payments happened (the
+            # ones still in flight are cancelled)
+            await aggregate.flush()
+            span.set_attribute("batch.payments", summary["payments"])
+
+def claim_replay() -> bool:
+    """
+    True in the one process that replays EVENT_REPLAY: under gunicorn, the first worker
+    to create the lock file in PROMETHEUS_MULTIPROC_DIR (emptied at each start). A worker
+    started after that one died does not replay the recording again.
+    """
+    directory = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return True
+    try:
+        os.close(os.open(os.path.join(directory, "event-replay.lock"), os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+async def replay_payments(path: str, speed: float = None):
+    """Publish every payment of an EVENT_RECORD file, paced by its timestamps"""
+    with EventReader(path) as reader:
+        labels = [reader.labels[name] for name in RECORDED_LABELS]
+        logger.info(f"Replaying {path} at {f'{speed:g}x' if speed else 'max'} speed")
+        started, replayed = time.monotonic(), 0
+        for delay, (_, *codes, amount, processing_time) in reader.replay(speed):
+            if delay:
+                await asyncio.sleep(delay)
+            elif replayed % 1000 == 0:
+                await asyncio.sleep(0)  # max speed: let requests and scrapes in
+            await publish_payment(*(values[code] for values, code in zip(labels, codes)), amount,
+                                  processing_time)
+            replayed += 1
+    elapsed = time.monotonic() - started
+    logger.info(f"Replayed {replayed} payments in {elapsed:.1f}s ({replayed / max(elapsed, 1e-9):.0f}/s)")
+
+def check_ledger_lookups():
+    """Several workers each hold their own payments: a lookup would miss most of them"""
+    if WORKERS > 1:
         raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail="Payment processing failed"
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail=f"Ledger lookups need a single worker, this service runs {WORKERS} (WEB_CONCURRENCY)"
         )
 
+def ledger_payment(payment: dict) -> dict:
+    payment["status"] = LEDGER_STATUSES.get(payment["status"], payment["status"])
+    return payment
+
 @app.get("/api/payments/stats")
-async def get_payment_stats():
-    return {"info": "Use /metrics for Prometheus data"}
+async def get_payment_stats(window: str = "5m"):
+    """Counts, success rates and quantiles over the last 1m, 5m or 1h (this worker's payments)"""
+    if window not in WINDOWS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"window must be one of {list(WINDOWS)}"
+        )
+    return payment_stats.snapshot(window)
+
+@app.get("/api/payments", response_model=PaymentList)
+async def list_payments(since: datetime = None, until: datetime = None, limit: int = 100):
+    """Ledger payments with since <= timestamp < until, oldest first"""
+    check_ledger_lookups()
+    if not 0 < limit <= LEDGER_SCAN_MAX_LIMIT:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"limit must be between 1 and {LEDGER_SCAN_MAX_LIMIT}"
+        )
+    # Naive datetimes are UTC, like the payment timestamps
+    bounds = [None if value is None else (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+              for value in (since, until)]
+    payments = [ledger_payment(payment) for payment in ledger.scan(*bounds, limit=limit)]
+    return {"count": len(payments), "payments": payments}
+
+# After /api/payments/stats, which it would otherwise shadow
+@app.get("/api/payments/{payment_id}", response_model=PaymentRecord)
+async def get_payment(payment_id: str):
+    check_ledger_lookups()
+    payment = ledger.get(payment_id)
+    if payment is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Payment not found (unknown, or evicted from the ledger)"
+        )
+    return ledger_payment(payment)
 
-# Optional: auto-instrumentation
-from prometheus_fastapi_instrumentator import Instrumentator
-Instrumentator().instrument(app).expose(app, include_in_schema=False, endpoint="/metrics-auto")
+# Optional: auto-instrumentation (its metrics live in the default registry,
+# so /metrics-auto is an alias served from the same cache)
+if AUTO_INSTRUMENTATION:
+    from prometheus_fastapi_instrumentator import Instrumentator
+    Instrumentator().instrument(app)
+    app.add_api_route("/metrics-auto", metrics, methods=["GET"], include_in_schema=False)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8080, reload=True)
\ No newline at end of file
+    # Reloading spawns a file watcher and a second interpreter: development only
+    uvicorn.run("main:app", host="0.0.0.0", port=8080,
+                reload=os.getenv("UVICORN_RELOAD", "false").lower() in ("1", "true", "yes"))
\ No newline at end of file
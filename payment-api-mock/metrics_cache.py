@@ -0,0 +1,90 @@
+"""
+Cached Prometheus exposition for /metrics
+
+Rendering the registry is CPU-bound and grows with series count, so it runs in
+a worker thread and the result is reused for up to `max_age` seconds. Concurrent
+scrapes of an expired entry share a single render. The exposition format
+(Prometheus text, OpenMetrics, or protobuf for native histograms) follows the
+Accept header and the body is gzip-compressed once per render when the scraper
+sends Accept-Encoding: gzip.
+
+When PROMETHEUS_MULTIPROC_DIR is set (gunicorn workers, see gunicorn_conf.py)
+the render aggregates every worker's value files instead of the local registry.
+"""
+
+import asyncio
+import gzip
+import os
+import time
+
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+from prometheus_client.exposition import choose_encoder
+from starlette.requests import Request
+from starlette.responses import Response
+
+from observability_common.native_histogram import CONTENT_TYPE_PROTOBUF, accepts_protobuf, generate_protobuf
+
+
+class _Entry:
+    __slots__ = ("body", "rendered_at", "gzipped")
+
+    def __init__(self, body: bytes, rendered_at: float):
+        self.body = body
+        self.rendered_at = rendered_at
+        self.gzipped = None
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    return any(part.split(";")[0].strip() == "gzip" for part in accept_encoding.split(","))
+
+
+def exposition_registry():
+    """Registry to render: all workers' files in multiprocess mode, else the default one"""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+class MetricsCache:
+    """Per-format cache of the rendered registry; max_age=0 disables caching"""
+
+    def __init__(self, registry=None, max_age: float = 1.0, gzip_level: int = 1):
+        self.registry = registry if registry is not None else exposition_registry()
+        self.max_age = max_age
+        self.gzip_level = gzip_level
+        self._entries = {}
+        self._locks = {}
+
+    def _fresh(self, entry) -> bool:
+        return entry is not None and time.monotonic() - entry.rendered_at < self.max_age
+
+    async def get(self, accept: str = None, want_gzip: bool = False):
+        """Return (entry, content_type), rendering off the event loop when stale"""
+        if accepts_protobuf(accept):
+            encoder, content_type = generate_protobuf, CONTENT_TYPE_PROTOBUF
+        else:
+            encoder, content_type = choose_encoder(accept)
+        entry = self._entries.get(content_type)
+        if not self._fresh(entry):
+            lock = self._locks.setdefault(content_type, asyncio.Lock())
+            async with lock:
+                # Another scrape may have rendered while we waited
+                entry = self._entries.get(content_type)
+                if not self._fresh(entry):
+                    body = await asyncio.to_thread(encoder, self.registry)
+                    entry = _Entry(body, time.monotonic())
+                    self._entries[content_type] = entry
+        if want_gzip and entry.gzipped is None:
+            entry.gzipped = await asyncio.to_thread(gzip.compress, entry.body, self.gzip_level)
+        return entry, content_type
+
+    async def response(self, request: Request) -> Response:
+        want_gzip = accepts_gzip(request.headers.get("accept-encoding", ""))
+        entry, content_type = await self.get(request.headers.get("accept"), want_gzip)
+        headers = {"Vary": "Accept, Accept-Encoding"}
+        if want_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(entry.gzipped, media_type=content_type, headers=headers)
+        return Response(entry.body, media_type=content_type, headers=headers)
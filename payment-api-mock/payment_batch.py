@@ -0,0 +1,232 @@
+"""
+Building blocks of POST /api/payments/batch
+
+- iter_items(): parses a request body streamed in chunks, either a JSON array
+  or NDJSON (one object per line), and yields its items one at a time. A
+  million-row upload is never held in memory.
+- observe_many(): one bulk histogram update for many observations of a label
+  set (prometheus_client, sharded or native histogram child). A
+  prometheus_client child is updated through its internals (`_buckets`,
+  `_sum`), as of the version pinned in requirements.txt; without them it falls
+  back to one observe() per value.
+- NDJSONStreamingResponse: streams the per-payment results while the request
+  body is still being read, and stops when the client disconnects.
+"""
+
+import codecs
+import json
+from bisect import bisect_left
+
+import anyio
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+
+from observability_common.native_histogram import bucket_index
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class BatchFormatError(ValueError):
+    """The body is neither a JSON array nor NDJSON; `index` is the item it failed at"""
+
+    def __init__(self, message: str, index: int):
+        super().__init__(message)
+        self.index = index
+
+
+class _Body:
+    """Decoded text of a chunked body, read on demand"""
+
+    def __init__(self, chunks):
+        self._chunks = chunks.__aiter__()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.ended = False
+
+    async def more(self) -> bool:
+        """Append the next chunk to `text`; False once the body has ended"""
+        if self.ended:
+            return False
+        try:
+            self.text += self._decoder.decode(await self._chunks.__anext__())
+        except StopAsyncIteration:
+            self.text += self._decoder.decode(b"", final=True)
+            self.ended = True
+        return True
+
+
+async def iter_items(chunks):
+    """(index, item) for every item of a JSON array or NDJSON body given as byte chunks"""
+    body = _Body(chunks)
+    # The first non-blank character tells the formats apart
+    while not body.text.strip() and await body.more():
+        pass
+    body.text = body.text.lstrip()
+    if not body.text:
+        return
+    items = _array_items(body) if body.text[0] == "[" else _ndjson_items(body)
+    async for item in items:
+        yield item
+
+
+async def _ndjson_items(body: _Body):
+    index = 0
+    while True:
+        lines = body.text.split("\n")
+        body.text = "" if body.ended else lines.pop()
+        for line in lines:
+            if line.strip():
+                try:
+                    yield index, json.loads(line)
+                except ValueError as e:
+                    raise BatchFormatError(f"line {index + 1}: {e}", index) from None
+                index += 1
+        if not await body.more():
+            return
+
+
+async def _array_items(body: _Body):
+    # raw_decode() on a growing buffer: an item that fails to parse, or that
+    # ends with the buffer (a number may go on), waits for the next chunk
+    raw_decode = json.JSONDecoder().raw_decode
+    pos, index = 1, 0  # after "["
+    after_item = False  # expecting "," or "]" rather than an item
+
+    async def more() -> bool:
+        nonlocal pos
+        body.text, pos = body.text[pos:], 0
+        return await body.more()
+
+    while True:
+        text = body.text
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos == len(text):
+            if not await more():
+                raise BatchFormatError("unterminated JSON array", index)
+            continue
+        char = text[pos]
+        if after_item:
+            if char == "]":
+                return
+            if char != ",":
+                raise BatchFormatError(f"expected ',' or ']' after item {index - 1}", index)
+            pos += 1
+            after_item = False
+            continue
+        if char == "]" and not index:
+            return
+        try:
+            item, end = raw_decode(text, pos)
+        except ValueError as e:
+            if not await more():
+                raise BatchFormatError(f"item {index}: {e}", index) from None
+            continue
+        if end == len(text) and not body.ended:
+            await more()
+            continue
+        yield index, item
+        index += 1
+        pos = end
+        after_item = True
+
+
+def observe_many(child, values: list):
+    """Observe every value of `values` on a histogram child in one update"""
+    if not values:
+        return
+    if hasattr(child, "observe_buckets"):  # NativeHistogram
+        counts, zero = {}, 0
+        for value in values:
+            if value <= child.zero_threshold:
+                zero += 1
+            else:
+                key = bucket_index(value, child.schema)
+                counts[key] = counts.get(key, 0) + 1
+        child.observe_buckets(counts.keys(), counts.values(), sum(values), child.schema, zero)
+    elif hasattr(child, "observe_many"):  # ShardedHistogram
+        child.observe_many(values)
+    elif not all(hasattr(child, name) for name in ("_upper_bounds", "_buckets", "_sum")):
+        for value in values:
+            child.observe(value)
+    else:  # prometheus_client Histogram: one inc() per bucket hit
+        bounds = child._upper_bounds
+        counts = [0] * len(bounds)
+        for value in values:
+            counts[bisect_left(bounds, value)] += 1
+        for bucket, count in zip(child._buckets, counts):
+            if count:
+                bucket.inc(count)
+        child._sum.inc(sum(values))
+
+
+class NDJSONStreamingResponse(StreamingResponse):
+    """StreamingResponse of `stream(chunks)`, where `chunks` is the request body
+
+    Starlette's StreamingResponse watches receive() for a disconnect while it
+    streams, which would swallow the chunks of a request body `stream` is still
+    reading. And after a disconnect the server drops what is sent without an
+    error, so the stream would run to its end for nobody. Instead, between two
+    response chunks, this response polls receive() itself unless the body
+    reader is waiting on it, and keeps a body message it gets for the reader. On
+    a disconnect (there, or as ClientDisconnect in the reader) it stops and
+    closes `stream`. While a kept message is not the body's last, the next one
+    is the reader's to take: the poll waits for it, so the body keeps its
+    backpressure.
+    """
+
+    media_type = NDJSON_MEDIA_TYPE
+
+    def __init__(self, request, stream, **kwargs):
+        self.receive = request.receive
+        self.disconnected = False
+        self._reading = False  # the body reader is waiting on receive()
+        self._pending = None  # body message taken by a poll, for the reader
+        super().__init__(self._until_disconnect(stream(self._body())), **kwargs)
+
+    async def _body(self):
+        while True:
+            if self._pending is not None:
+                message, self._pending = self._pending, None
+            else:
+                self._reading = True
+                try:
+                    message = await self.receive()
+                finally:
+                    self._reading = False
+            if message["type"] == "http.disconnect":
+                self.disconnected = True
+                raise ClientDisconnect()
+            if message.get("body"):
+                yield message["body"]
+            if not message.get("more_body", False):
+                return
+
+    async def _poll_disconnect(self) -> bool:
+        if self.disconnected:
+            return True
+        if self._reading or (self._pending is not None and self._pending.get("more_body", False)):
+            return False  # receive() would take the next body chunk
+        message = {}
+        with anyio.CancelScope() as scope:
+            scope.cancel()  # only a message that is already waiting
+            message = await self.receive()
+        if message.get("type") == "http.request":
+            self._pending = message
+        elif message.get("type") == "http.disconnect":
+            self.disconnected = True
+        return self.disconnected
+
+    async def _until_disconnect(self, chunks):
+        try:
+            async for chunk in chunks:
+                yield chunk
+                if await self._poll_disconnect():
+                    return
+        finally:
+            await chunks.aclose()
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
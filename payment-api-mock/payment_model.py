@@ -0,0 +1,54 @@
+"""
+Synthetic payment model shared by the API, the load generator and the backfill
+
+Distributions of the generated payment attributes: amount, processing time,
+status, and the dimensions (method, region, card brand, risk level) that the API
+draws per payment and the currencies the load generator sends.
+"""
+
+import random
+
+PAYMENT_STATUSES = ["success", "failed", "pending"]
+DEFAULT_STATUS_RATES = (84, 1, 15)  # success, failed, pending (percent, X-*-Rate headers)
+PAYMENT_METHODS = ["card", "bank_transfer", "wallet", "crypto"]
+REGIONS = ["EU", "US", "ASIA", "LATAM"]
+CARD_BRANDS = ["VISA", "MASTERCARD", "AMEX", "DISCOVER"]
+RISK_LEVELS = ["low", "medium", "high", "critical"]
+RISK_WEIGHTS = [0.80, 0.15, 0.04, 0.01]
+CURRENCIES = ["EUR", "USD", "GBP", "CHF", "JPY"]
+CURRENCY_WEIGHTS = [50, 25, 15, 7, 3]
+
+# Schema of the InfluxDB "payment" measurement (line_protocol.LineProtocolEncoder)
+PAYMENT_TAGS = ["status", "currency", "payment_method", "region", "card_brand", "risk_level"]
+PAYMENT_FIELDS = {"amount": "float", "processing_time": "float", "success": "int"}
+
+
+def generate_realistic_amount() -> float:
+    rand = random.random()
+    if rand < 0.80:
+        return max(0.01, round(random.gauss(75, 45), 2))
+    elif rand < 0.95:
+        return max(0.01, round(random.gauss(500, 250), 2))
+    else:
+        return max(0.01, round(random.gauss(2000, 1000), 2))
+
+
+def generate_processing_time(status: str) -> float:
+    if status == "success":
+        return max(0.05, round(random.gauss(0.24, 0.10), 3))
+    else:
+        return max(0.1, round(random.gauss(0.80, 0.35), 3))
+
+
+def draw_status(success_rate: float, failure_rate: float, pending_rate: float) -> str:
+    """Status for the given (not necessarily normalized) rates"""
+    total = success_rate + failure_rate + pending_rate
+    if total > 0:
+        success_rate /= total
+        failure_rate /= total
+    r = random.random()
+    if r < success_rate:
+        return "success"
+    elif r < success_rate + failure_rate:
+        return "failed"
+    return "pending"
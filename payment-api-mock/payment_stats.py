@@ -0,0 +1,200 @@
+"""
+In-process streaming aggregator behind /api/payments/stats
+
+Every payment updates two rings of time slots: 5s x 60 slots (serves the 1m and
+5m windows) and 60s x 60 slots (serves 1h). A slot holds payment counts per
+(status, currency, region) and DDSketches of amount and processing time, so an
+update is a few dict increments and a window query merges at most 60 slots.
+
+DDSketch keeps one counter per logarithmic bucket: any quantile is reported
+within `relative_accuracy` of the true value, sketches merge exactly, and the
+bucket count is capped (lowest buckets are collapsed first). Memory is bounded
+by slots x (label combinations + 2 capped sketches); label values must already
+be bounded (see cardinality.bounded_value).
+
+Stats are per process: with several gunicorn workers each one reports the
+payments it served.
+"""
+
+import math
+import time
+
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+# window name -> (ring, number of slots)
+WINDOWS = {
+    "1m": ("fine", 12),
+    "5m": ("fine", 60),
+    "1h": ("coarse", 60),
+}
+
+
+class DDSketch:
+    """Relative-error quantile sketch for positive values"""
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+        self.max_bins = max_bins
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if value <= 1e-9:
+            self.zero_count += 1
+            return
+        key = math.ceil(math.log(value) * self._multiplier)
+        bins = self.bins
+        bins[key] = bins.get(key, 0) + 1
+        if len(bins) > self.max_bins:
+            self._collapse()
+
+    def _collapse(self):
+        # Fold the lowest buckets into one: only low quantiles lose accuracy
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_bins + 1
+        target = keys[excess]
+        self.bins[target] += sum(self.bins.pop(k) for k in keys[:excess])
+
+    def merge(self, other: "DDSketch"):
+        bins = self.bins
+        for key, count in other.bins.items():
+            bins[key] = bins.get(key, 0) + count
+        if len(bins) > self.max_bins:
+            self._collapse()
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                value = 2 * self.gamma ** key / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def summary(self, digits: int = 2) -> dict:
+        result = {
+            "count": self.count,
+            "sum": round(self.sum, digits),
+            "avg": round(self.sum / self.count, digits) if self.count else 0.0,
+            "min": round(self.min, digits) if self.count else 0.0,
+            "max": round(self.max, digits) if self.count else 0.0,
+        }
+        for q in QUANTILES:
+            result[f"p{q * 100:g}"] = round(self.quantile(q), digits)
+        return result
+
+
+class _Slot:
+    __slots__ = ("epoch", "counts", "amount", "processing_time")
+
+    def __init__(self):
+        self.epoch = -1
+        self.counts = {}
+
+    def reset(self, epoch: int, relative_accuracy: float, max_bins: int):
+        self.epoch = epoch
+        self.counts = {}
+        self.amount = DDSketch(relative_accuracy, max_bins)
+        self.processing_time = DDSketch(relative_accuracy, max_bins)
+
+
+class _Ring:
+    """Fixed number of time slots, reused round-robin"""
+
+    def __init__(self, slot_seconds: int, slots: int):
+        self.slot_seconds = slot_seconds
+        self.slots = [_Slot() for _ in range(slots)]
+
+    def slot(self, now: float, relative_accuracy: float, max_bins: int) -> _Slot:
+        epoch = int(now // self.slot_seconds)
+        slot = self.slots[epoch % len(self.slots)]
+        if slot.epoch != epoch:
+            slot.reset(epoch, relative_accuracy, max_bins)
+        return slot
+
+    def recent(self, now: float, n: int) -> list:
+        current = int(now // self.slot_seconds)
+        return [s for s in self.slots if s.epoch >= 0 and current - n < s.epoch <= current]
+
+
+class PaymentStats:
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._rings = {"fine": _Ring(5, 60), "coarse": _Ring(60, 60)}
+
+    def record(self, status: str, currency: str, region: str, amount: float, processing_time: float,
+               now: float = None):
+        now = time.time() if now is None else now
+        key = (status, currency, region)
+        for ring in self._rings.values():
+            slot = ring.slot(now, self.relative_accuracy, self.max_bins)
+            slot.counts[key] = slot.counts.get(key, 0) + 1
+            slot.amount.add(amount)
+            slot.processing_time.add(processing_time)
+
+    def snapshot(self, window: str = "5m", now: float = None) -> dict:
+        """Aggregates over `window` (one of WINDOWS)"""
+        if window not in WINDOWS:
+            raise ValueError(f"Unknown window '{window}', expected one of {list(WINDOWS)}")
+        now = time.time() if now is None else now
+        ring_name, n = WINDOWS[window]
+        ring = self._rings[ring_name]
+
+        counts = {}
+        amount = DDSketch(self.relative_accuracy, self.max_bins)
+        processing_time = DDSketch(self.relative_accuracy, self.max_bins)
+        for slot in ring.recent(now, n):
+            for key, count in slot.counts.items():
+                counts[key] = counts.get(key, 0) + count
+            amount.merge(slot.amount)
+            processing_time.merge(slot.processing_time)
+
+        total = sum(counts.values())
+        successes = sum(c for (status, _, _), c in counts.items() if status == "success")
+        by_status, by_currency, by_region = {}, {}, {}
+        for (status, currency, region), count in counts.items():
+            by_status[status] = by_status.get(status, 0) + count
+            for group, name in ((by_currency, currency), (by_region, region)):
+                entry = group.setdefault(name, {"count": 0, "success": 0})
+                entry["count"] += count
+                if status == "success":
+                    entry["success"] += count
+        for group in (by_currency, by_region):
+            for entry in group.values():
+                entry["success_rate"] = round(entry.pop("success") / entry["count"], 4)
+
+        return {
+            "window": window,
+            "window_seconds": n * ring.slot_seconds,
+            "total_payments": total,
+            "success_rate": round(successes / total, 4) if total else 0.0,
+            "avg_processing_time": round(processing_time.sum / total, 4) if total else 0.0,
+            "by_status": by_status,
+            "by_currency": by_currency,
+            "by_region": by_region,
+            "amount": amount.summary(2),
+            "processing_time": processing_time.summary(4),
+        }
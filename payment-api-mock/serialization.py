@@ -0,0 +1,50 @@
+"""
+Single-pass JSON for the hot endpoints (FAST_SERIALIZATION)
+
+FastAPI's default path for POST /api/payments walks each payment through
+Python dicts several times: json.loads() of the body, validation of that dict
+into PaymentRequest; on the way out, the returned PaymentResponse is dumped to
+a dict, validated again against response_model, serialized to another dict and
+encoded by json.dumps(). pydantic-core, the Rust engine of pydantic 2 (already
+a dependency), does each direction in one native call:
+
+- parse_body(): model_validate_json() on the raw body bytes. Errors become the
+  same 422 as FastAPI's, with "body" prepended to each error location.
+- PydanticJSONResponse: renders with pydantic_core.to_json(), which takes
+  models, dicts and datetimes as they are. Returned from an endpoint, it is
+  sent as is: FastAPI skips response_model validation for Response objects.
+
+The body is parsed whatever its Content-Type, and a JSON syntax error is
+reported the way pydantic words it.
+"""
+
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from pydantic_core import to_json
+from starlette.responses import JSONResponse
+
+
+class PydanticJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return to_json(content)
+
+
+async def parse_body(request, model):
+    """Validate the raw request body as `model`, or raise FastAPI's 422"""
+    body = await request.body()
+    if not body:
+        raise RequestValidationError(
+            [{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}], body=body
+        )
+    try:
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()], body=body
+        ) from None
+
+
+def request_body_schema(model) -> dict:
+    """openapi_extra documenting `model` as the JSON body of an endpoint that parses it itself"""
+    return {"requestBody": {"content": {"application/json": {"schema": model.model_json_schema()}},
+                            "required": True}}
@@ -0,0 +1,159 @@
+"""
+Per-thread sharded Prometheus counters and histograms
+
+prometheus_client takes a lock on every inc()/observe(). These drop-in
+replacements (same labels(...).inc() / .observe() call sites) accumulate into a
+thread-local shard instead: a plain dict owned by the writing thread, so the hot
+path takes no lock and never contends. Shards are merged when the registry is
+collected (at scrape time).
+
+Shards are never discarded, so totals survive the exit of the thread that wrote
+them. Sharding is per process: in multiprocess mode (PROMETHEUS_MULTIPROC_DIR)
+use the regular prometheus_client metrics instead, whose values live in the
+shared mmap'd files.
+"""
+
+import threading
+from bisect import bisect_left
+
+from prometheus_client import REGISTRY
+from prometheus_client.core import CounterMetricFamily, HistogramMetricFamily
+from prometheus_client.metrics import Histogram
+from prometheus_client.utils import INF, floatToGoString
+
+
+class _ShardedMetric:
+    """Shared plumbing: label handling, thread-local shards, registration"""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), registry=REGISTRY):
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()  # only taken when a thread creates its shard
+        if registry is not None:
+            registry.register(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _key(self, values, kwargs) -> tuple:
+        if kwargs:
+            return tuple(str(kwargs[name]) for name in self._labelnames)
+        if len(values) != len(self._labelnames):
+            raise ValueError(f"{self._name}: expected {len(self._labelnames)} label values, got {len(values)}")
+        return tuple(str(v) for v in values)
+
+    def _snapshots(self):
+        """Copy of every shard (dict copy is atomic under the GIL)"""
+        with self._shards_lock:
+            shards = list(self._shards)
+        return [shard.copy() for shard in shards]
+
+
+class _CounterChild:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def inc(self, amount: float = 1):
+        if amount < 0:
+            raise ValueError("Counters can only be incremented by non-negative amounts.")
+        shard = self._metric._shard()
+        shard[self._key] = shard.get(self._key, 0.0) + amount
+
+
+class ShardedCounter(_ShardedMetric):
+    def labels(self, *values, **kwargs) -> _CounterChild:
+        return _CounterChild(self, self._key(values, kwargs))
+
+    def describe(self):
+        yield CounterMetricFamily(self._family_name(), self._documentation, labels=self._labelnames)
+
+    def _family_name(self) -> str:
+        return self._name[:-6] if self._name.endswith("_total") else self._name
+
+    def collect(self):
+        totals = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0.0) + value
+        family = CounterMetricFamily(self._family_name(), self._documentation, labels=self._labelnames)
+        for key, value in totals.items():
+            family.add_metric(key, value)
+        yield family
+
+
+class _HistogramChild:
+    __slots__ = ("_metric", "_key")
+
+    def __init__(self, metric, key):
+        self._metric = metric
+        self._key = key
+
+    def observe(self, amount: float):
+        metric = self._metric
+        shard = metric._shard()
+        state = shard.get(self._key)
+        if state is None:
+            # Non-cumulative bucket counts followed by the sum
+            state = shard[self._key] = [0] * len(metric._upper_bounds) + [0.0]
+        state[bisect_left(metric._upper_bounds, amount)] += 1
+        state[-1] += amount
+
+    def observe_many(self, amounts):
+        metric = self._metric
+        shard = metric._shard()
+        state = shard.get(self._key)
+        if state is None:
+            state = shard[self._key] = [0] * len(metric._upper_bounds) + [0.0]
+        bounds = metric._upper_bounds
+        for amount in amounts:
+            state[bisect_left(bounds, amount)] += 1
+        state[-1] += sum(amounts)
+
+
+class ShardedHistogram(_ShardedMetric):
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=Histogram.DEFAULT_BUCKETS,
+                 registry=REGISTRY):
+        bounds = [float(b) for b in buckets]
+        if bounds[-1] != INF:
+            bounds.append(INF)
+        self._upper_bounds = bounds
+        self._le = [floatToGoString(b) for b in bounds]
+        super().__init__(name, documentation, labelnames, registry)
+
+    def labels(self, *values, **kwargs) -> _HistogramChild:
+        return _HistogramChild(self, self._key(values, kwargs))
+
+    def describe(self):
+        yield HistogramMetricFamily(self._name, self._documentation, labels=self._labelnames)
+
+    def collect(self):
+        merged = {}
+        for shard in self._snapshots():
+            for key, state in shard.items():
+                state = list(state)
+                total = merged.get(key)
+                if total is None:
+                    merged[key] = state
+                else:
+                    for i, value in enumerate(state):
+                        total[i] += value
+        family = HistogramMetricFamily(self._name, self._documentation, labels=self._labelnames)
+        for key, state in merged.items():
+            cumulative, buckets = 0, []
+            for le, count in zip(self._le, state):
+                cumulative += count
+                buckets.append((le, cumulative))
+            family.add_metric(key, buckets, state[-1])
+        yield family
@@ -0,0 +1,238 @@
+"""
+Durable write-ahead spool for InfluxDB line protocol
+
+When InfluxDB is unreachable, the batch writer appends its batches here instead
+of dropping them. The spool is a directory of append-only segment files
+("<pid>-<seq>.lp", newline-terminated line protocol, fsync'd per batch). A new
+segment is started every `segment_bytes`; when the spool exceeds `max_bytes` the
+oldest segment is discarded.
+
+The replayer reads the oldest segment with mmap in chunks of about
+`chunk_bytes` (cut on line boundaries) and advances only once a chunk has been
+written, so a crash can at worst replay a chunk twice. InfluxDB treats a point
+with the same series and timestamp as an overwrite, so replays are idempotent.
+
+Each worker process owns the segments named with its pid. Segments left behind
+by processes that no longer exist are adopted on startup.
+"""
+
+import logging
+import mmap
+import os
+import threading
+import time
+from collections import deque
+
+from prometheus_client import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+# ========================
+# PROMETHEUS METRICS
+# ========================
+
+SPOOL_BYTES = Gauge(
+    'payment_influx_spool_bytes',
+    'Bytes of line protocol waiting in the spool',
+    multiprocess_mode='livesum'
+)
+
+SPOOL_OLDEST_AGE = Gauge(
+    'payment_influx_spool_oldest_age_seconds',
+    'Age of the oldest point waiting in the spool',
+    multiprocess_mode='livemax'
+)
+
+SPOOLED_POINTS = Counter(
+    'payment_influx_spooled_points_total',
+    'Points written to the spool because InfluxDB was unreachable'
+)
+
+REPLAYED_POINTS = Counter(
+    'payment_influx_replayed_points_total',
+    'Points replayed from the spool into InfluxDB'
+)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _Segment:
+    __slots__ = ("path", "size", "points", "first_ts", "offset")
+
+    def __init__(self, path: str, size: int = 0, points: int = 0, first_ts: int = None):
+        self.path = path
+        self.size = size
+        self.points = points
+        self.first_ts = first_ts  # ns timestamp of the first point not yet replayed
+        self.offset = 0  # bytes already replayed
+
+
+def _first_timestamp(data: bytes, path: str) -> int:
+    try:
+        return int(data[:data.index(b"\n")].rsplit(b" ", 1)[1])
+    except (ValueError, IndexError):
+        return int(os.path.getmtime(path) * 1e9)
+
+
+class SegmentSpool:
+    """Append-only segmented spool; one writer and one replayer per process"""
+
+    def __init__(self, directory: str, segment_bytes: int = 8 * 1024 * 1024,
+                 max_bytes: int = 256 * 1024 * 1024, chunk_bytes: int = 1024 * 1024, fsync: bool = True):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.fsync = fsync
+        self._pid = os.getpid()
+        self._seq = 0
+        self._segments = deque()  # oldest first; the last one is active while _file is open
+        self._file = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._adopt()
+        self._update_metrics()
+
+    # ------------------------
+    # Segment files
+    # ------------------------
+
+    def _next_path(self) -> str:
+        self._seq += 1
+        return os.path.join(self.directory, f"{self._pid}-{self._seq:08d}.lp")
+
+    def _adopt(self):
+        """Take over segments left by processes that are gone"""
+        orphans = []
+        for name in os.listdir(self.directory):
+            pid, _, rest = name.partition("-")
+            if not name.endswith(".lp") or not pid.isdigit() or _pid_alive(int(pid)):
+                continue
+            orphans.append((rest, name))
+        for _, name in sorted(orphans):
+            path = self._next_path()
+            try:
+                # Atomic: if another worker adopts it first, we get FileNotFoundError
+                os.rename(os.path.join(self.directory, name), path)
+            except FileNotFoundError:
+                continue
+            size = os.path.getsize(path)
+            if size == 0:
+                os.unlink(path)
+                continue
+            with open(path, "rb") as f:
+                data = f.read()
+            self._segments.append(_Segment(path, size, data.count(b"\n"), _first_timestamp(data, path)))
+        if self._segments:
+            logger.info(f"Adopted {len(self._segments)} spool segments ({self.bytes} bytes) from {self.directory}")
+
+    def _open_segment(self):
+        segment = _Segment(self._next_path())
+        self._file = open(segment.path, "ab")
+        self._segments.append(segment)
+
+    def _close_segment(self):
+        self._file.close()
+        self._file = None
+
+    def _discard_oldest(self) -> int:
+        segment = self._segments.popleft()
+        os.unlink(segment.path)
+        replayed = segment.offset and segment.points * segment.offset // segment.size
+        return segment.points - replayed
+
+    # ------------------------
+    # Writer side
+    # ------------------------
+
+    @property
+    def bytes(self) -> int:
+        return sum(s.size - s.offset for s in self._segments)
+
+    def append(self, lines: list) -> int:
+        """Append a batch of line-protocol lines; returns points discarded to stay under max_bytes"""
+        data = ("\n".join(lines) + "\n").encode()
+        discarded = 0
+        with self._lock:
+            active = self._segments[-1] if self._file is not None else None
+            if active is None or (active.size and active.size + len(data) > self.segment_bytes):
+                if active is not None:
+                    self._close_segment()
+                self._open_segment()
+                active = self._segments[-1]
+            self._file.write(data)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            if active.first_ts is None:
+                active.first_ts = _first_timestamp(data, active.path)
+            active.size += len(data)
+            active.points += len(lines)
+            while self.bytes > self.max_bytes and len(self._segments) > 1:
+                discarded += self._discard_oldest()
+            self._update_metrics()
+        SPOOLED_POINTS.inc(len(lines))
+        return discarded
+
+    # ------------------------
+    # Replayer side
+    # ------------------------
+
+    def peek(self):
+        """Next chunk to replay as (segment, bytes, points), or None if the spool is empty"""
+        with self._lock:
+            if not self._segments:
+                return None
+            segment = self._segments[0]
+            start, size = segment.offset, segment.size
+        if start >= size:
+            return None
+        try:
+            with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+                end = data.find(b"\n", min(start + self.chunk_bytes, size) - 1)
+                end = size if end == -1 else end + 1
+                chunk = data[start:end]
+        except FileNotFoundError:
+            return None  # discarded by append() to stay under max_bytes
+        return segment, chunk, chunk.count(b"\n")
+
+    def commit(self, segment, nbytes: int, points: int):
+        """Mark the chunk returned by peek() as written"""
+        with self._lock:
+            if self._segments and self._segments[0] is segment:
+                segment.offset += nbytes
+                if segment.offset < segment.size:
+                    # Keeps the oldest-age gauge on what is still waiting
+                    with open(segment.path, "rb") as f:
+                        f.seek(segment.offset)
+                        segment.first_ts = _first_timestamp(f.readline(), segment.path)
+                else:
+                    # Fully replayed: delete it (the active segment too; the next append opens a new one)
+                    if self._file is not None and len(self._segments) == 1:
+                        self._close_segment()
+                    self._segments.popleft()
+                    os.unlink(segment.path)
+            self._update_metrics()
+        REPLAYED_POINTS.inc(points)
+
+    def _update_metrics(self):
+        SPOOL_BYTES.set(self.bytes)
+        oldest = self._segments[0].first_ts if self._segments else None
+        SPOOL_OLDEST_AGE.set(max(0.0, (time.time_ns() - oldest) / 1e9) if oldest else 0)
+
+    def update_metrics(self):
+        with self._lock:
+            self._update_metrics()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._close_segment()
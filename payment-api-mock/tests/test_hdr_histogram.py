@@ -0,0 +1,67 @@
+"""
+HdrHistogram: percentiles within the configured precision, coordinated-omission correction
+
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from hdr_histogram import HdrHistogram  # noqa: E402
+
+
+def test_percentiles_within_significant_digits():
+    rng = random.Random(7)
+    values = sorted(rng.randint(1, 10_000_000) for _ in range(10_000))
+    histogram = HdrHistogram(significant_digits=3)
+    for value in values:
+        histogram.record_value(value)
+
+    assert histogram.total_count == len(values)
+    assert histogram.min_value == values[0]
+    assert histogram.max_value == values[-1]
+    for percentile in (50, 90, 99, 99.9):
+        exact = values[int(percentile / 100 * len(values)) - 1]
+        assert abs(histogram.value_at_percentile(percentile) - exact) <= exact / 1000
+    assert histogram.value_at_percentile(100) == values[-1]
+    assert abs(histogram.mean() - sum(values) / len(values)) <= histogram.mean() / 1000
+
+
+def test_small_values_are_exact():
+    histogram = HdrHistogram(significant_digits=3)
+    for value in range(1, 1001):
+        histogram.record_value(value)
+    assert histogram.value_at_percentile(50) == 500
+    assert histogram.value_at_percentile(99) == 990
+
+
+def test_coordinated_omission_correction():
+    histogram = HdrHistogram()
+    # One 1 s stall with a request expected every 100 ms: the 9 requests a
+    # closed-loop client held back would have waited 900, 800, ... 100 ms
+    histogram.record_corrected_value(1_000_000, expected_interval=100_000)
+    assert histogram.total_count == 10
+    assert histogram.min_value == 100_000
+    assert histogram.max_value == 1_000_000
+    assert abs(histogram.value_at_percentile(50) - 500_000) <= 500
+
+    # Responses within the interval (or no interval) are recorded once
+    histogram = HdrHistogram()
+    histogram.record_corrected_value(50_000, expected_interval=100_000)
+    histogram.record_corrected_value(1_000_000, expected_interval=0)
+    assert histogram.total_count == 2
+
+
+def test_add_merges_counts_and_extremes():
+    a, b = HdrHistogram(), HdrHistogram()
+    a.record_value(10, count=3)
+    b.record_value(5_000)
+    a.add(b)
+    assert a.total_count == 4
+    assert (a.min_value, a.max_value) == (10, 5_000)
+    assert a.value_at_percentile(75) == 10
+    assert a.value_at_percentile(100) == 5_000
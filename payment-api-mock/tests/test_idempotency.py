@@ -0,0 +1,130 @@
+"""
+IdempotencyCache: replays, in-flight coalescing, key reuse, failures, TTL and LRU
+
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from idempotency import IdempotencyCache, IdempotencyKeyReused  # noqa: E402
+
+
+class Payment:
+    """compute() stand-in that counts its runs and can be held open"""
+
+    def __init__(self, outcome="paid"):
+        self.outcome = outcome
+        self.runs = 0
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        return f"{self.outcome}-{self.runs}"
+
+
+def test_replays_the_stored_outcome():
+    async def scenario():
+        cache, payment = IdempotencyCache(), Payment()
+        assert await cache.run("k1", "body", payment) == ("paid-1", False)
+        assert await cache.run("k1", "body", payment) == ("paid-1", True)
+        assert await cache.run("k2", "body", payment) == ("paid-2", False)
+        assert payment.runs == 2
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_duplicates_are_coalesced():
+    async def scenario():
+        cache, payment = IdempotencyCache(), Payment()
+        payment.release.clear()
+        tasks = [asyncio.create_task(cache.run("k", "body", payment)) for _ in range(5)]
+        await asyncio.sleep(0)
+        payment.release.set()
+        results = await asyncio.gather(*tasks)
+        assert payment.runs == 1
+        assert results == [("paid-1", False)] + [("paid-1", True)] * 4
+
+    asyncio.run(scenario())
+
+
+def test_key_reused_with_another_body():
+    async def scenario():
+        cache, payment = IdempotencyCache(), Payment()
+        await cache.run("k", "body", payment)
+        with pytest.raises(IdempotencyKeyReused):
+            await cache.run("k", "other body", payment)
+        assert payment.runs == 1
+
+    asyncio.run(scenario())
+
+
+def test_failed_request_is_not_stored():
+    async def scenario():
+        cache = IdempotencyCache()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("gateway down")
+
+        first = asyncio.create_task(cache.run("k", "body", failing))
+        await asyncio.sleep(0)
+        payment = Payment()
+        duplicate = asyncio.create_task(cache.run("k", "body", payment))
+        await asyncio.sleep(0)
+        release.set()
+        with pytest.raises(RuntimeError):
+            await first
+        # The waiting duplicate runs the payment itself
+        assert await duplicate == ("paid-1", False)
+        assert await cache.run("k", "body", payment) == ("paid-1", True)
+
+    asyncio.run(scenario())
+
+
+def test_ttl_and_lru_capacity():
+    async def scenario():
+        cache, payment = IdempotencyCache(max_keys=2, ttl=0.05), Payment()
+        await cache.run("a", "body", payment)
+        await cache.run("b", "body", payment)
+        await cache.run("a", "body", payment)  # a is now the most recent
+        await cache.run("c", "body", payment)  # evicts b
+        assert len(cache) == 2
+        assert await cache.run("a", "body", payment) == ("paid-1", True)
+        assert await cache.run("b", "body", payment) == ("paid-4", False)
+
+        await asyncio.sleep(0.06)
+        assert await cache.run("a", "body", payment) == ("paid-5", False)
+
+    asyncio.run(scenario())
+
+
+def test_in_flight_keys_are_not_evicted():
+    async def scenario():
+        cache, slow, fast = IdempotencyCache(max_keys=2), Payment("slow"), Payment("fast")
+        slow.release.clear()
+        pending = [asyncio.create_task(cache.run(key, "body", slow)) for key in ("a", "b")]
+        await asyncio.sleep(0)
+        # At capacity with both keys in flight: the cache grows instead of dropping one
+        assert await cache.run("c", "body", fast) == ("fast-1", False)
+        assert len(cache) == 3
+        duplicate = asyncio.create_task(cache.run("a", "body", slow))
+        await asyncio.sleep(0)
+        slow.release.set()
+        await asyncio.gather(*pending)
+        assert (await duplicate)[1] is True
+        assert slow.runs == 2
+        # Once completed they are evictable again
+        await cache.run("d", "body", fast)
+        assert len(cache) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,45 @@
+"""
+BatchingInfluxWriter: close() writes what is held and leaves no task behind
+
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from influx_writer import BatchingInfluxWriter  # noqa: E402
+
+
+class FakeWriteApi:
+    def __init__(self):
+        self.lines = []
+
+    def write(self, bucket, org, record):
+        self.lines.extend(record.splitlines())
+
+
+def test_close_before_connected_writes_once_without_restarting():
+    write_api = FakeWriteApi()
+
+    def connect():
+        time.sleep(0.05)  # still connecting when close() runs
+        return write_api
+
+    async def scenario():
+        writer = BatchingInfluxWriter(None, "bucket", "org", batch_size=100, flush_interval=10, connect=connect)
+        for i in range(3):
+            assert await writer.write(f"payment amount={i} {i}")
+        await asyncio.sleep(0)
+        await writer.close()
+        assert writer._task is None and writer._replay_task is None
+        await asyncio.sleep(0.01)
+        assert writer._task is None
+        return [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    assert asyncio.run(scenario()) == []
+    assert write_api.lines == [f"payment amount={i} {i}" for i in range(3)]
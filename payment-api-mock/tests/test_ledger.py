@@ -0,0 +1,91 @@
+"""
+PaymentLedger: payment IDs, lookups by ID and time range over the ring
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from ledger import PaymentLedger  # noqa: E402
+
+LABELS = {"status": ["success", "failed"], "currency": ["USD", "EUR"]}
+T0 = 1_700_000_000.0
+
+
+def fill(ledger, n: int, start: int = 0) -> list:
+    return [ledger.append(T0 + i, 10.0 + i, 0.25, i % 2, 1) for i in range(start, start + n)]
+
+
+def test_ids_sort_in_creation_order_and_round_trip():
+    ledger = PaymentLedger(LABELS, capacity=100)
+    ids = fill(ledger, 20)
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 20
+    assert [ledger.parse_id(payment_id) for payment_id in ids] == list(range(20))
+
+
+def test_runs_differ_within_a_process():
+    # Same ms and PID: the random bits still tell the runs apart
+    assert len({PaymentLedger(LABELS, capacity=0).prefix for _ in range(100)}) == 100
+
+
+def test_get():
+    ledger = PaymentLedger(LABELS, capacity=100)
+    ids = fill(ledger, 3)
+    assert ledger.get(ids[1]) == {
+        "payment_id": ids[1],
+        "timestamp": "2023-11-14T22:13:21",
+        "amount": 11.0,
+        "processing_time_ms": 250.0,
+        "status": "failed",
+        "currency": "EUR",
+    }
+    other = PaymentLedger(LABELS, capacity=100, run=ledger.run + 1)
+    assert other.get(ids[1]) is None  # another process's ID
+    assert ledger.get(ledger.format_id(3)) is None  # not issued yet
+    assert ledger.get(ids[0][:-1] + "z") is None
+    assert ledger.get("pay_123") is None
+
+
+def test_ring_keeps_the_last_capacity_payments():
+    ledger = PaymentLedger(LABELS, capacity=10)
+    ids = fill(ledger, 25)
+    assert len(ledger) == 10
+    assert ledger.oldest == 15
+    assert ledger.get(ids[14]) is None
+    assert ledger.get(ids[15])["amount"] == 25.0
+    assert ledger.get(ids[24])["amount"] == 34.0
+    assert ledger.memory() == 10 * ledger.bytes_per_payment()
+
+
+def test_scan_time_range():
+    ledger = PaymentLedger(LABELS, capacity=10)
+    ids = fill(ledger, 25)  # holds T0+15 .. T0+24
+    assert [p["payment_id"] for p in ledger.scan(T0 + 17, T0 + 20)] == ids[17:20]
+    assert [p["payment_id"] for p in ledger.scan(since=T0 + 22)] == ids[22:]
+    assert [p["payment_id"] for p in ledger.scan(until=T0 + 17)] == ids[15:17]
+    assert [p["payment_id"] for p in ledger.scan(since=T0, limit=3)] == ids[15:18]
+    assert ledger.scan(T0 + 30) == []
+
+
+def test_clock_step_back_keeps_timestamps_sorted():
+    ledger = PaymentLedger(LABELS, capacity=10)
+    first = ledger.append(T0 + 10, 1.0, 0.1, 0, 0)
+    stepped = ledger.append(T0 + 5, 2.0, 0.1, 0, 0)  # clock stepped back 5 s
+    later = ledger.append(T0 + 11, 3.0, 0.1, 0, 0)
+    assert ledger.get(stepped)["timestamp"] == ledger.get(first)["timestamp"]
+    assert [p["payment_id"] for p in ledger.scan(T0 + 10, T0 + 11)] == [first, stepped]
+    assert [p["payment_id"] for p in ledger.scan(since=T0 + 11)] == [later]
+
+
+def test_capacity_zero_issues_ids_only():
+    ledger = PaymentLedger(LABELS, capacity=0)
+    ids = fill(ledger, 3)
+    assert len(set(ids)) == 3
+    assert ledger.get(ids[0]) is None
+    assert ledger.scan() == []
+    assert ledger.memory() == 0
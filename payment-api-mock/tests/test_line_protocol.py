@@ -0,0 +1,68 @@
+"""
+LineProtocolEncoder: same bytes as influxdb_client.Point, escaping included
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+from influxdb_client import Point, WritePrecision
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from line_protocol import LineProtocolEncoder  # noqa: E402
+
+TAGS = ("status", "currency", "region")
+FIELDS = {"amount": "float", "retries": "int", "note": "str"}
+TS = 1_700_000_000_123_456_789
+
+
+def point_line(measurement, tags: dict, fields: dict, field_dimensions=()) -> str:
+    point = Point(measurement)
+    for key, value in tags.items():
+        if value is None:
+            continue
+        if key in field_dimensions:
+            point.field(key, str(value))
+        else:
+            point.tag(key, value)
+    for key, value in fields.items():
+        if value is not None:
+            point.field(key, value)
+    return point.time(TS, WritePrecision.NS).to_line_protocol()
+
+
+def test_matches_point_with_special_characters():
+    encoder = LineProtocolEncoder("pay ment,s", TAGS, FIELDS)
+    cases = [
+        (("success", "USD", "eu-west"), (12.5, 3, "ok")),
+        (("a b,c=d", "tab\there", "new\nline"), (1.0, 0, 'quote " and \\ backslash')),
+        (("ends\\", "x", "y"), (1e-7, -2, "")),
+        (("s", "", "r"), (123456789.25, 1, "empty tag value is dropped")),
+        (("s", None, "r"), (2.0, None, None)),
+    ]
+    for tags, fields in cases:
+        expected = point_line("pay ment,s", dict(zip(TAGS, tags)), dict(zip(FIELDS, fields)))
+        assert encoder.encode(tags, fields, TS) == expected
+        # Second call goes through the tag segment cache
+        assert encoder.encode(tags, fields, TS) == expected
+
+
+def test_field_dimensions_are_string_fields():
+    encoder = LineProtocolEncoder("payment", TAGS, FIELDS, field_dimensions=("region",))
+    tags, fields = ("success", "EUR", "us=east 1"), (9.99, 1, "n")
+    line = encoder.encode(tags, fields, TS)
+    assert line == point_line("payment", dict(zip(TAGS, tags)), dict(zip(FIELDS, fields)),
+                              field_dimensions=("region",))
+    series, field_set = line.split(" ", 1)
+    assert series == "payment,currency=EUR,status=success"
+    assert 'region="us=east 1"' in field_set
+
+
+def test_non_finite_floats_are_dropped():
+    encoder = LineProtocolEncoder("payment", TAGS, {"amount": "float"})
+    assert encoder.encode(("s", "c", "r"), (float("nan"),), TS) == ""
+    assert encoder.encode(("s", "c", "r"), (float("inf"),), TS) == ""
+    assert encoder.encode(("s", "c", "r"), (2.0,), TS) == f"payment,currency=c,region=r,status=s amount=2 {TS}"
@@ -0,0 +1,163 @@
+"""
+Batch body parsing (JSON array and NDJSON, in arbitrary chunks), bulk histogram updates
+and the streamed response stopping on a disconnect
+
+    pip install -e ../shared && python -m pytest tests
+"""
+
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from prometheus_client import CollectorRegistry, Histogram
+from starlette.requests import ClientDisconnect, Request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(HERE)), "shared"))
+
+from observability_common.native_histogram import NativeHistogram  # noqa: E402
+from payment_batch import BatchFormatError, NDJSONStreamingResponse, iter_items, observe_many  # noqa: E402
+
+ITEMS = [{"amount": 12.5, "currency": "USD"}, {"amount": 3, "note": "a, [b] {c} \"d\" é"}, [], 7, "x", None]
+
+
+def parse(body: bytes, chunk_size: int) -> list:
+    async def chunks():
+        for i in range(0, len(body), chunk_size):
+            yield body[i:i + chunk_size]
+
+    async def collect():
+        return [item async for item in iter_items(chunks())]
+
+    return asyncio.run(collect())
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1 << 20])
+def test_json_array(chunk_size):
+    body = (" \n" + json.dumps(ITEMS, ensure_ascii=False, indent=1)).encode()
+    assert parse(body, chunk_size) == list(enumerate(ITEMS))
+    assert parse(b"[]", chunk_size) == []
+    assert parse(b"[ 1 , 22 ,333 ]", chunk_size) == [(0, 1), (1, 22), (2, 333)]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1 << 20])
+def test_ndjson(chunk_size):
+    body = "\n".join(json.dumps(item, ensure_ascii=False) for item in ITEMS[:2]).encode()
+    assert parse(body + b"\n\n" + body, chunk_size) == list(enumerate(ITEMS[:2] * 2))
+    assert parse(b"  \n ", chunk_size) == []
+
+
+@pytest.mark.parametrize("body, index", [
+    (b"[1, 2", 2),
+    (b"[1 2]", 1),
+    (b"[1, {]", 1),
+    (b'{"a": 1}\n{"a": \n{"a": 3}\n', 1),
+])
+def test_format_errors_report_the_item(body, index):
+    with pytest.raises(BatchFormatError) as error:
+        parse(body, 2)
+    assert error.value.index == index
+
+
+def test_observe_many_matches_observe():
+    # Through the Histogram internals: fails if the pinned prometheus_client changes them
+    values = [0.001, 0.05, 0.05, 0.3, 2.0, 7.5, 120.0]
+    registry = CollectorRegistry()
+    bulk = Histogram("bulk_seconds", "h", ["route"], registry=registry)
+    single = Histogram("single_seconds", "h", ["route"], registry=registry)
+    observe_many(bulk.labels("/pay"), values)
+    for value in values:
+        single.labels("/pay").observe(value)
+    samples = {name: [(s.name.replace(name, ""), s.labels, s.value) for s in family.samples
+                      if not s.name.endswith("_created")]
+               for family in registry.collect() for name in [family.name]}
+    assert samples["bulk_seconds"] == samples["single_seconds"]
+
+
+def test_observe_many_without_histogram_internals():
+    class Child:
+        def __init__(self):
+            self.values = []
+
+        def observe(self, value):
+            self.values.append(value)
+
+    child = Child()
+    observe_many(child, [0.5, 2.0, 0.5])
+    assert child.values == [0.5, 2.0, 0.5]
+
+
+def test_observe_many_native():
+    values = [0.0, 0.5, 0.5, 3.0, 1000.0]
+    registry = CollectorRegistry()
+    bulk = NativeHistogram("bulk", "h", registry=registry).labels()
+    single = NativeHistogram("single", "h", registry=registry).labels()
+    observe_many(bulk, values)
+    for value in values:
+        single.observe(value)
+    assert bulk.snapshot() == single.snapshot()
+    observe_many(bulk, [])
+    assert bulk.snapshot() == single.snapshot()
+
+
+def stream_response(messages: list, connected: bool, read_all: bool = True, results: int = 100) -> tuple:
+    """Run an NDJSONStreamingResponse over a request receiving `messages`; (body lines sent, stream closed)
+
+    Once `messages` are taken, receive() has a disconnect waiting, or nothing if `connected`.
+    """
+    closed, sent = [], []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        if connected:
+            await asyncio.Event().wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message.get("body"):
+            sent.append(message["body"].decode())
+
+    async def stream(chunks):
+        try:
+            async for chunk in chunks:
+                yield f"read {len(chunk)}\n"
+                if not read_all:
+                    break  # a reader blocked on its workers
+            for i in range(results):
+                yield f"result {i}\n"
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        request = Request({"type": "http", "method": "POST", "path": "/", "headers": []}, receive)
+        await NDJSONStreamingResponse(request, stream)({}, receive, send)
+
+    asyncio.run(scenario())
+    return sent, closed == [True]
+
+
+BODY = [{"type": "http.request", "body": b"ab", "more_body": True},
+        {"type": "http.request", "body": b"cde", "more_body": False}]
+
+
+def test_response_stops_on_a_disconnect():
+    sent, closed = stream_response(list(BODY), connected=False)
+    assert sent == ["read 2\n", "read 3\n"]
+    assert closed
+
+
+def test_response_stops_on_a_disconnect_while_the_reader_waits():
+    # The poll keeps the body's last chunk for the reader, then sees the disconnect
+    sent, closed = stream_response(list(BODY), connected=False, read_all=False)
+    assert sent == ["read 2\n", "result 0\n"]
+    assert closed
+
+
+def test_response_keeps_the_body_for_the_reader():
+    sent, closed = stream_response(list(BODY), connected=True, results=3)
+    assert sent == ["read 2\n", "read 3\n", "result 0\n", "result 1\n", "result 2\n"]
+    assert closed
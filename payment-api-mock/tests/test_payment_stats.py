@@ -0,0 +1,101 @@
+"""
+PaymentStats: DDSketch quantile accuracy and merging, time-slot rings per window
+
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from payment_stats import DDSketch, PaymentStats  # noqa: E402
+
+T0 = 1_700_000_000.0  # a multiple of 60: slots start at T0
+
+
+def exact_quantile(values: list, q: float) -> float:
+    return sorted(values)[int(q * (len(values) - 1))]
+
+
+def test_quantiles_within_relative_accuracy():
+    rng = random.Random(12)
+    values = [rng.lognormvariate(3, 1.5) for _ in range(20_000)]
+    sketch = DDSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    for q in (0, 0.01, 0.5, 0.9, 0.99, 0.999, 1):
+        exact = exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * exact
+    assert sketch.count == len(values)
+
+
+def test_merge_equals_one_sketch_of_everything():
+    rng = random.Random(3)
+    values = [rng.uniform(0.001, 5000) for _ in range(5_000)]
+    whole, a, b = DDSketch(), DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        whole.add(value)
+        (a if i % 2 else b).add(value)
+    a.merge(b)
+    assert a.bins == whole.bins
+    for q in (0.5, 0.95, 0.99):
+        assert a.quantile(q) == whole.quantile(q)
+
+
+def test_zeros_and_collapsed_low_buckets():
+    sketch = DDSketch(max_bins=64)
+    for _ in range(10):
+        sketch.add(0.0)
+    for i in range(1, 1001):
+        sketch.add(float(i) ** 3)
+    assert len(sketch.bins) <= 64
+    assert sketch.quantile(0.005) == 0.0
+    # Collapsing folds the low buckets: high quantiles keep their accuracy
+    exact = exact_quantile([0.0] * 10 + [float(i) ** 3 for i in range(1, 1001)], 0.99)
+    assert abs(sketch.quantile(0.99) - exact) <= 0.01 * exact
+    assert DDSketch().quantile(0.5) == 0.0
+
+
+def test_windows_only_see_their_slots():
+    stats = PaymentStats()
+    stats.record("success", "USD", "eu", 10.0, 0.1, now=T0)  # 10 min old at query time
+    stats.record("failed", "EUR", "us", 20.0, 0.2, now=T0 + 400)  # 3m20s old
+    for i in range(3):
+        stats.record("success", "USD", "us", 30.0, 0.3, now=T0 + 590 + i)  # last 10 s
+    now = T0 + 600
+
+    one_minute = stats.snapshot("1m", now=now)
+    assert one_minute["total_payments"] == 3
+    assert one_minute["window_seconds"] == 60
+    assert one_minute["success_rate"] == 1.0
+
+    five_minutes = stats.snapshot("5m", now=now)
+    assert five_minutes["total_payments"] == 4
+    assert five_minutes["by_status"] == {"failed": 1, "success": 3}
+    assert five_minutes["by_currency"]["EUR"] == {"count": 1, "success_rate": 0.0}
+    assert five_minutes["by_region"]["us"] == {"count": 4, "success_rate": 0.75}
+    assert five_minutes["amount"]["max"] == 30.0
+    assert five_minutes["avg_processing_time"] == round((0.2 + 0.9) / 4, 4)
+
+    one_hour = stats.snapshot("1h", now=now)
+    assert one_hour["total_payments"] == 5
+    assert one_hour["amount"]["min"] == 10.0
+
+    with pytest.raises(ValueError):
+        stats.snapshot("2m", now=now)
+
+
+def test_reused_slots_are_reset():
+    stats = PaymentStats()
+    stats.record("success", "USD", "eu", 1.0, 0.1, now=T0)
+    # 5 min of fine slots later, the same slot index is reused for a new epoch
+    stats.record("success", "USD", "eu", 2.0, 0.1, now=T0 + 300)
+    snapshot = stats.snapshot("5m", now=T0 + 300)
+    assert snapshot["total_payments"] == 1
+    assert snapshot["amount"]["sum"] == 2.0
+    assert stats.snapshot("1h", now=T0 + 300)["total_payments"] == 2
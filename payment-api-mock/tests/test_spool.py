@@ -0,0 +1,99 @@
+"""
+SegmentSpool: segment rotation, chunked replay with commit, size cap, adoption
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+import time
+
+from prometheus_client import REGISTRY
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from spool import SegmentSpool  # noqa: E402
+
+DEAD_PID = 999_999_999  # above any pid_max
+
+
+def lines(start: int, n: int) -> list:
+    return [f"payment,status=success amount={i} {1_700_000_000_000_000_000 + i}" for i in range(start, start + n)]
+
+
+def replay_all(spool) -> list:
+    replayed = []
+    while (chunk := spool.peek()) is not None:
+        segment, data, points = chunk
+        assert data.endswith(b"\n") and data.count(b"\n") == points
+        replayed.extend(data.decode().splitlines())
+        spool.commit(segment, len(data), points)
+    return replayed
+
+
+def test_replays_every_line_in_order_across_segments(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=2000, chunk_bytes=500, fsync=False)
+    written = []
+    for batch in range(10):
+        written.extend(lines(batch * 20, 20))
+        assert spool.append(lines(batch * 20, 20)) == 0
+    assert len(os.listdir(tmp_path)) > 1
+    assert spool.bytes == sum(len(line) + 1 for line in written)
+
+    assert replay_all(spool) == written
+    assert spool.bytes == 0
+    assert os.listdir(tmp_path) == []
+
+    # The next batch opens a new segment
+    spool.append(lines(500, 3))
+    assert replay_all(spool) == lines(500, 3)
+    spool.close()
+
+
+def test_uncommitted_chunk_is_replayed_again(tmp_path):
+    spool = SegmentSpool(str(tmp_path), chunk_bytes=100, fsync=False)
+    spool.append(lines(0, 10))
+    segment, first, points = spool.peek()
+    assert spool.peek()[1] == first  # not committed: same chunk
+    spool.commit(segment, len(first), points)
+    assert spool.peek()[1] != first
+    spool.close()
+
+
+def test_oldest_age_follows_replay(tmp_path):
+    spool = SegmentSpool(str(tmp_path), chunk_bytes=10, fsync=False)
+    now = time.time_ns()
+    spool.append([f"payment amount=1 {now - 100 * 10**9}", f"payment amount=2 {now - 10 * 10**9}"])
+    age = REGISTRY.get_sample_value("payment_influx_spool_oldest_age_seconds")
+    assert 99 < age < 110
+    segment, data, points = spool.peek()
+    assert points == 1
+    spool.commit(segment, len(data), points)
+    age = REGISTRY.get_sample_value("payment_influx_spool_oldest_age_seconds")
+    assert 9 < age < 20
+    spool.close()
+
+
+def test_max_bytes_discards_oldest_segments(tmp_path):
+    spool = SegmentSpool(str(tmp_path), segment_bytes=1000, max_bytes=3000, fsync=False)
+    discarded = sum(spool.append(lines(batch * 10, 10)) for batch in range(20))
+    assert spool.bytes <= 3000
+    replayed = replay_all(spool)
+    assert discarded + len(replayed) == 200
+    assert replayed == lines(200 - len(replayed), len(replayed))  # the newest points are kept
+    spool.close()
+
+
+def test_adopts_segments_of_dead_processes(tmp_path):
+    orphan = lines(0, 5)
+    with open(tmp_path / f"{DEAD_PID}-00000001.lp", "w") as f:
+        f.write("\n".join(orphan) + "\n")
+    open(tmp_path / f"{DEAD_PID}-00000002.lp", "w").close()  # empty: deleted
+    live = tmp_path / f"{os.getppid()}-00000001.lp"
+    live.write_text(lines(100, 1)[0] + "\n")  # a live process's: left alone
+
+    spool = SegmentSpool(str(tmp_path), fsync=False)
+    assert replay_all(spool) == orphan
+    assert sorted(os.listdir(tmp_path)) == [live.name]
+    spool.close()
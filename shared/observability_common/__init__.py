@@ -0,0 +1,11 @@
+"""
+Observability code shared by the payment API and the eBanking exporter
+
+- tracing: lightweight spans with W3C trace context
+- otlp: batched span export (tail sampling, OTLP/HTTP, file and in-memory exporters)
+- native_histogram: sparse exponential-bucket histograms and protobuf exposition
+- event_log: columnar event log to record and replay simulated workloads
+
+The Docker images copy this package next to the service modules (both are
+built from the repository root); for local runs, `pip install -e shared`.
+"""
@@ -0,0 +1,173 @@
+"""
+Columnar event log: record generated events, replay them at 1x, 10x or max speed
+
+Simulators draw their events from unseeded RNGs, so no two runs are alike. An
+event log pins a workload down: EventWriter appends fixed-width rows (a
+timestamp, small integer label codes, float values) and EventReader streams
+them back from an mmap, paced by the recorded timestamps.
+
+File layout (native byte order, recorded in the header):
+
+    b"EVLOG\\x00\\x01\\x00"  magic + format version
+    uint32 + JSON           meta: columns [[name, array typecode], ...],
+                            labels {column: [values]} and free-form keys
+    chunks                  uint32 row count, then each column as a packed
+                            array, padded to 8 bytes
+
+Rows are buffered per column in array.array and written one chunk at a time, so
+appending a row costs one array append per column and a crash loses at most
+one chunk. Label columns store the index of their value in meta["labels"][column].
+"""
+
+import array
+import json
+import mmap
+import struct
+import sys
+import time
+
+MAGIC = b"EVLOG\x00\x01\x00"
+_HEADER = struct.Struct("=I")
+_CHUNK = struct.Struct("=I")
+
+
+def _padding(n: int) -> int:
+    return -n % 8
+
+
+class EventWriter:
+    def __init__(self, path: str, columns, labels: dict = None, meta: dict = None, chunk_rows: int = 4096):
+        """`columns`: (name, array typecode) pairs, e.g. [("t", "d"), ("series", "H"), ("value", "d")]"""
+        self.path = path
+        self.columns = [(name, typecode) for name, typecode in columns]
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._buffers = [array.array(typecode) for _, typecode in self.columns]
+        self._appends = [buffer.append for buffer in self._buffers]
+        header = {
+            **(meta or {}),
+            "columns": self.columns,
+            "labels": labels or {},
+            "byteorder": sys.byteorder,
+            "created": time.time(),
+        }
+        body = json.dumps(header).encode()
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + _HEADER.pack(len(body)) + body + b"\0" * _padding(len(body) + 4))
+
+    def append(self, *row):
+        for append, value in zip(self._appends, row):
+            append(value)
+        self.rows += 1
+        if len(self._buffers[0]) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        n = len(self._buffers[0])
+        if not n:
+            return
+        parts = [_CHUNK.pack(n), b"\0" * 4]
+        for buffer in self._buffers:
+            data = buffer.tobytes()
+            parts.append(data)
+            parts.append(b"\0" * _padding(len(data)))
+            del buffer[:]
+        self._file.write(b"".join(parts))
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class EventReader:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path}: not an event log")
+        (length,) = _HEADER.unpack_from(self._mmap, len(MAGIC))
+        start = len(MAGIC) + _HEADER.size
+        self.meta = json.loads(self._mmap[start:start + length])
+        if self.meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path}: recorded on a {self.meta['byteorder']}-endian machine")
+        self.columns = [(name, typecode) for name, typecode in self.meta["columns"]]
+        self.labels = self.meta["labels"]
+        self._data = start + length + _padding(length + 4)
+
+    def chunks(self):
+        """One {column: memoryview} per chunk, straight from the mmap"""
+        view = memoryview(self._mmap)
+        offset, end = self._data, len(self._mmap)
+        itemsizes = [array.array(typecode).itemsize for _, typecode in self.columns]
+        while offset + 8 <= end:
+            (n,) = _CHUNK.unpack_from(self._mmap, offset)
+            offset += 8
+            chunk = {}
+            for (name, typecode), itemsize in zip(self.columns, itemsizes):
+                size = n * itemsize
+                if offset + size > end:
+                    return  # truncated last chunk (writer killed mid-write)
+                chunk[name] = view[offset:offset + size].cast(typecode)
+                offset += size + _padding(size)
+            yield chunk
+
+    def __len__(self) -> int:
+        return sum(len(next(iter(chunk.values()))) for chunk in self.chunks())
+
+    def rows(self):
+        for chunk in self.chunks():
+            yield from zip(*chunk.values())
+
+    def replay(self, speed: float = None, time_column: str = "t"):
+        """(seconds to wait, row) pairs; rows keep their recorded spacing divided by `speed`, None is max speed
+
+        The wait is computed against the replay start, so a slow consumer catches
+        up instead of drifting.
+        """
+        if not speed:
+            for row in self.rows():
+                yield 0.0, row
+            return
+        t = [name for name, _ in self.columns].index(time_column)
+        started = time.monotonic()
+        origin = None
+        for row in self.rows():
+            if origin is None:
+                origin = row[t]
+            delay = (row[t] - origin) / speed - (time.monotonic() - started)
+            yield (delay if delay > 0 else 0.0), row
+
+    def close(self):
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # chunk views are still referenced, the map is released with them
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def parse_speed(value: str):
+    """REPLAY_SPEED: "1", "10", "10x" or "max" (None)"""
+    value = str(value).strip().lower()
+    if value in ("max", "0", ""):
+        return None
+    speed = float(value[:-1] if value.endswith("x") else value)
+    if speed <= 0:
+        raise ValueError("replay speed must be positive or 'max'")
+    return speed
@@ -0,0 +1,322 @@
+"""
+Native (sparse exponential-bucket) histograms and protobuf exposition
+
+A native histogram has no fixed buckets: an observation v > 0 lands in bucket
+ceil(log2(v) * 2**schema), so bucket boundaries grow by a factor 2**(2**-schema)
+(schema 3: ~9% per bucket, quantiles within ~4.5%) and only buckets that were hit
+are stored. The whole histogram is one series per label set. If a child exceeds
+`max_buckets`, its schema is lowered (buckets merged pairwise) like client_golang.
+
+Prometheus only ingests native histograms from the protobuf exposition format
+(needs --enable-feature=native-histograms, which makes it ask for protobuf
+first). generate_protobuf() renders a whole registry in that format, encoding
+the io.prometheus.client.MetricFamily messages by hand so no protobuf
+dependency is needed. Text/OpenMetrics scrapes of a native histogram only see
+its _count, _sum and +Inf bucket.
+
+Native histograms keep their state in process memory, so they are not
+available in multiprocess mode.
+"""
+
+import math
+import struct
+import threading
+
+from prometheus_client import REGISTRY
+from prometheus_client.core import HistogramMetricFamily
+
+CONTENT_TYPE_PROTOBUF = ('application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; '
+                         'encoding=delimited')
+
+# Same defaults as client_golang
+DEFAULT_ZERO_THRESHOLD = 2.0 ** -128
+MIN_SCHEMA = -4
+MAX_SCHEMA = 8
+
+
+def accepts_protobuf(accept: str) -> bool:
+    return bool(accept) and "application/vnd.google.protobuf" in accept \
+        and "proto=io.prometheus.client.MetricFamily" in accept
+
+
+def bucket_index(value: float, schema: int) -> int:
+    """Index of the bucket (base**(i-1), base**i] holding `value` > 0"""
+    return math.ceil(math.log2(value) * 2.0 ** schema)
+
+
+# ========================
+# HISTOGRAM
+# ========================
+
+class _NativeChild:
+    __slots__ = ("_lock", "schema", "max_buckets", "zero_threshold", "buckets", "zero_count", "count", "sum")
+
+    def __init__(self, schema: int, max_buckets: int, zero_threshold: float):
+        self._lock = threading.Lock()
+        self.schema = schema
+        self.max_buckets = max_buckets
+        self.zero_threshold = zero_threshold
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, amount: float):
+        with self._lock:
+            self.count += 1
+            self.sum += amount
+            if amount <= self.zero_threshold:
+                self.zero_count += 1
+                return
+            key = bucket_index(amount, self.schema)
+            buckets = self.buckets
+            buckets[key] = buckets.get(key, 0) + 1
+            if len(buckets) > self.max_buckets and self.schema > MIN_SCHEMA:
+                self._reduce_resolution()
+
+    def observe_buckets(self, indices, counts, total: float, schema: int, zero_count: int = 0):
+        """Bulk observe: per-bucket counts computed at `schema` (>= this child's), plus their sum"""
+        with self._lock:
+            shift = schema - self.schema
+            buckets = self.buckets
+            n = zero_count
+            for key, count in zip(indices, counts):
+                key, count = int(key), int(count)
+                if shift:
+                    key = -((-key) >> shift)  # ceil(key / 2**shift)
+                buckets[key] = buckets.get(key, 0) + count
+                n += count
+            self.zero_count += zero_count
+            self.count += n
+            self.sum += float(total)
+            while len(buckets) > self.max_buckets and self.schema > MIN_SCHEMA:
+                self._reduce_resolution()
+
+    def _reduce_resolution(self):
+        # Halve the resolution: bucket i at schema s is inside bucket ceil(i/2) at s-1
+        merged = {}
+        for key, count in self.buckets.items():
+            key = (key + 1) // 2
+            merged[key] = merged.get(key, 0) + count
+        self.buckets = merged
+        self.schema -= 1
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return self.schema, self.zero_threshold, self.zero_count, self.count, self.sum, dict(self.buckets)
+
+
+class NativeHistogram:
+    """Histogram with sparse exponential buckets; same labels(...).observe() call sites"""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), schema: int = 3, max_buckets: int = 160,
+                 zero_threshold: float = DEFAULT_ZERO_THRESHOLD, registry=REGISTRY):
+        if not MIN_SCHEMA <= schema <= MAX_SCHEMA:
+            raise ValueError(f"schema must be between {MIN_SCHEMA} and {MAX_SCHEMA}")
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = tuple(labelnames)
+        self.schema = schema
+        self.max_buckets = max_buckets
+        self.zero_threshold = zero_threshold
+        self._children = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *values, **kwargs) -> _NativeChild:
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self._labelnames)
+        else:
+            if len(values) != len(self._labelnames):
+                raise ValueError(f"{self._name}: expected {len(self._labelnames)} label values, got {len(values)}")
+            values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(
+                    values, _NativeChild(self.schema, self.max_buckets, self.zero_threshold))
+        return child
+
+    def describe(self):
+        yield HistogramMetricFamily(self._name, self._documentation, labels=self._labelnames)
+
+    def collect(self):
+        family = HistogramMetricFamily(self._name, self._documentation, labels=self._labelnames)
+        # Full bucket data for generate_protobuf(), keyed like the samples' labels
+        family.native_histograms = {}
+        for values, child in list(self._children.items()):
+            snapshot = child.snapshot()
+            family.add_metric(values, [("+Inf", snapshot[3])], snapshot[4])
+            family.native_histograms[values] = snapshot
+        yield family
+
+
+# ========================
+# PROTOBUF EXPOSITION
+# ========================
+
+# io.prometheus.client.MetricType
+_COUNTER, _GAUGE, _SUMMARY, _UNTYPED, _HISTOGRAM, _GAUGE_HISTOGRAM = range(6)
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _uint(field: int, n: int) -> bytes:
+    return _varint(field << 3) + _varint(int(n))
+
+
+def _sint(field: int, n: int) -> bytes:
+    return _varint(field << 3) + _varint(_zigzag(int(n)))
+
+
+def _double(field: int, value: float) -> bytes:
+    return _varint(field << 3 | 1) + struct.pack("<d", value)
+
+
+def _bytes(field: int, data: bytes) -> bytes:
+    return _varint(field << 3 | 2) + _varint(len(data)) + data
+
+
+def _string(field: int, value: str) -> bytes:
+    return _bytes(field, value.encode("utf-8"))
+
+
+def _labels(labels: dict) -> bytes:
+    return b"".join(_bytes(1, _string(1, name) + _string(2, value)) for name, value in labels.items())
+
+
+def _exemplar(exemplar) -> bytes:
+    body = _labels(exemplar.labels) + _double(2, exemplar.value)
+    if exemplar.timestamp is not None:
+        seconds, fraction = divmod(float(exemplar.timestamp), 1)
+        body += _bytes(3, _uint(1, int(seconds)) + _uint(2, int(fraction * 1e9)))
+    return body
+
+
+def _native_fields(snapshot) -> bytes:
+    """Histogram fields 5-14: schema, zero bucket, positive spans and deltas"""
+    schema, zero_threshold, zero_count, _, _, buckets = snapshot
+    out = [_sint(5, schema), _double(6, zero_threshold), _uint(7, zero_count)]
+    spans, deltas = [], []
+    previous_key, previous_count = None, 0
+    for key in sorted(buckets):
+        count = buckets[key]
+        if previous_key is not None and key == previous_key + 1:
+            spans[-1][1] += 1
+        else:
+            # First span: offset is the index itself; later ones: the gap since the last span
+            spans.append([key if previous_key is None else key - previous_key - 1, 1])
+        deltas.append(count - previous_count)
+        previous_key, previous_count = key, count
+    out.extend(_bytes(12, _sint(1, offset) + _uint(2, length)) for offset, length in spans)
+    out.extend(_sint(13, delta) for delta in deltas)
+    return b"".join(out)
+
+
+def _histogram_metrics(family) -> list:
+    gauge = family.type == "gaugehistogram"
+    count_suffix, sum_suffix = ("_gcount", "_gsum") if gauge else ("_count", "_sum")
+    native = getattr(family, "native_histograms", {})
+    series = {}
+    for sample in family.samples:
+        labels = {k: v for k, v in sample.labels.items() if k != "le"}
+        entry = series.setdefault(tuple(labels.items()), {"labels": labels, "buckets": [], "count": 0, "sum": 0.0})
+        if sample.name == family.name + "_bucket":
+            bound = float(sample.labels["le"])
+            if not math.isinf(bound):
+                bucket = _uint(1, sample.value) + _double(2, bound)
+                if sample.exemplar is not None:
+                    bucket += _bytes(3, _exemplar(sample.exemplar))
+                entry["buckets"].append(_bytes(3, bucket))
+        elif sample.name == family.name + count_suffix:
+            entry["count"] = sample.value
+        elif sample.name == family.name + sum_suffix:
+            entry["sum"] = sample.value
+    metrics = []
+    for key, entry in series.items():
+        body = _uint(1, entry["count"]) + _double(2, entry["sum"]) + b"".join(entry["buckets"])
+        snapshot = native.get(tuple(value for _, value in key))
+        if snapshot is not None:
+            body += _native_fields(snapshot)
+        metrics.append(_labels(entry["labels"]) + _bytes(7, body))
+    return metrics
+
+
+def _summary_metrics(family) -> list:
+    series = {}
+    for sample in family.samples:
+        labels = {k: v for k, v in sample.labels.items() if k != "quantile"}
+        entry = series.setdefault(tuple(labels.items()), {"labels": labels, "quantiles": [], "count": 0, "sum": 0.0})
+        if sample.name == family.name + "_count":
+            entry["count"] = sample.value
+        elif sample.name == family.name + "_sum":
+            entry["sum"] = sample.value
+        elif "quantile" in sample.labels:
+            entry["quantiles"].append(
+                _bytes(3, _double(1, float(sample.labels["quantile"])) + _double(2, sample.value)))
+    return [_labels(e["labels"]) + _bytes(4, _uint(1, e["count"]) + _double(2, e["sum"]) + b"".join(e["quantiles"]))
+            for e in series.values()]
+
+
+def _family(name: str, documentation: str, metric_type: int, metrics: list) -> bytes:
+    body = _string(1, name) + _string(2, documentation) + _uint(3, metric_type)
+    body += b"".join(_bytes(4, metric) for metric in metrics)
+    return _varint(len(body)) + body
+
+
+def generate_protobuf(registry=REGISTRY) -> bytes:
+    """Length-delimited io.prometheus.client.MetricFamily messages for every metric in `registry`"""
+    output = []
+    for family in registry.collect():
+        if family.type in ("histogram", "gaugehistogram"):
+            metric_type = _HISTOGRAM if family.type == "histogram" else _GAUGE_HISTOGRAM
+            output.append(_family(family.name, family.documentation, metric_type, _histogram_metrics(family)))
+        elif family.type == "summary":
+            output.append(_family(family.name, family.documentation, _SUMMARY, _summary_metrics(family)))
+        else:
+            # counter (_total samples), gauge, info (_info gauge), stateset (gauges), unknown (untyped)
+            metric_type, field = {"counter": (_COUNTER, 3), "gauge": (_GAUGE, 2), "info": (_GAUGE, 2),
+                                  "stateset": (_GAUGE, 2)}.get(family.type, (_UNTYPED, 5))
+            by_name = {}
+            for sample in family.samples:
+                if sample.name.endswith("_created"):
+                    continue
+                metric = _labels(sample.labels) + _bytes(field, _double(1, sample.value))
+                if sample.timestamp is not None:
+                    metric += _uint(6, int(float(sample.timestamp) * 1000))
+                by_name.setdefault(sample.name, []).append(metric)
+            for name, metrics in by_name.items():
+                output.append(_family(name, family.documentation, metric_type, metrics))
+    return b"".join(output)
+
+
+def make_wsgi_app(registry=REGISTRY):
+    """prometheus_client's WSGI app, answering protobuf scrapes with generate_protobuf()"""
+    from prometheus_client import make_wsgi_app as make_text_app
+
+    text_app = make_text_app(registry)
+
+    def app(environ, start_response):
+        if accepts_protobuf(environ.get("HTTP_ACCEPT", "")):
+            body = generate_protobuf(registry)
+            start_response("200 OK", [("Content-Type", CONTENT_TYPE_PROTOBUF),
+                                      ("Content-Length", str(len(body)))])
+            return [body]
+        return text_app(environ, start_response)
+
+    return app
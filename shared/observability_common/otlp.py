@@ -0,0 +1,275 @@
+"""
+Batched span export: tail sampling, OTLP/HTTP, file and in-memory exporters
+
+BatchSpanProcessor plugs into tracing.add_span_processor(). While a request
+runs, its finished spans are only appended to a list on the trace. When the
+local root span ends, the whole trace is either dropped or queued, so the
+per-request cost on the serving thread is a few appends. A trace is exported if:
+
+- it was head-sampled (tracing.set_sample_ratio, or the caller's sampled flag),
+- something marked it with span.keep() (e.g. an exemplar points to it),
+- a span failed (an `error` attribute), or
+- the root span took at least `tail_latency` seconds.
+
+A background thread exports the queue in batches of up to `max_export_batch_size`
+spans every `schedule_delay` seconds, or sooner once a batch is full. When the
+queue is full, new traces are dropped, never the request. Spans that end after
+their local root are not exported. Span links are exported as OTLP `links`.
+
+Exporters take a list of finished spans and return True on success:
+OTLPHttpExporter posts OTLP/JSON to `<endpoint>/v1/traces` (Tempo, the
+OpenTelemetry Collector), FileExporter appends one OTLP/JSON request per line
+(the Collector's otlpjsonfile format) and InMemoryExporter keeps the spans for tests.
+"""
+
+import json
+import logging
+import threading
+import urllib.request
+from collections import deque
+
+from prometheus_client import Counter
+
+from .tracing import add_span_processor, set_sample_ratio
+
+logger = logging.getLogger(__name__)
+
+# OTLP Span.SpanKind / Status.StatusCode
+_SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+_STATUS_ERROR = 2
+
+
+# ========================
+# OTLP/JSON ENCODING
+# ========================
+
+def _value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _attributes(attributes: dict) -> list:
+    return [{"key": key, "value": _value(value)} for key, value in attributes.items()]
+
+
+# Span names and attributes repeat (routes, methods, status codes): their JSON
+# fragments are cached, and spans are assembled as strings rather than dicts.
+_MAX_CACHED = 10000
+_fragments = {}
+
+
+def _fragment(key, value) -> str:
+    cache_key = (key, value, type(value))
+    fragment = _fragments.get(cache_key)
+    if fragment is None:
+        if len(_fragments) >= _MAX_CACHED:
+            _fragments.clear()
+        if key is None:
+            fragment = json.dumps(value)
+        else:
+            fragment = json.dumps({"key": key, "value": _value(value)}, separators=(",", ":"))
+        _fragments[cache_key] = fragment
+    return fragment
+
+
+def _span(span) -> str:
+    attributes = ",".join([_fragment(key, value) for key, value in span.attributes.items()])
+    parent = f'"parentSpanId":"{span.parent:016x}",' if span.parent is not None else ""
+    status = ""
+    if "error" in span.attributes:
+        status = f',"status":{{"code":{_STATUS_ERROR},"message":{_fragment(None, str(span.attributes["error"]))}}}'
+    links = ""
+    if span.links:
+        links = ',"links":[' + ",".join(f'{{"traceId":"{trace_id:032x}","spanId":"{span_id:016x}"}}'
+                                       for trace_id, span_id in span.links) + "]"
+    return (f'{{"traceId":"{span.trace.id:032x}","spanId":"{span.id:016x}",{parent}'
+            f'"name":{_fragment(None, span.name)},"kind":{_SPAN_KINDS.get(span.kind, 1)},'
+            f'"startTimeUnixNano":"{span.start_ns}","endTimeUnixNano":"{span.end_ns}",'
+            f'"attributes":[{attributes}]{links}{status}}}')
+
+
+def encode_spans(spans, service_name: str, resource_attributes: dict = None) -> bytes:
+    """ExportTraceServiceRequest in OTLP/JSON"""
+    resource = {"service.name": service_name, "telemetry.sdk.language": "python"}
+    resource.update(resource_attributes or {})
+    head = json.dumps({"attributes": _attributes(resource)}, separators=(",", ":"))
+    scope = json.dumps({"name": service_name})
+    body = ",".join([_span(span) for span in spans])
+    return f'{{"resourceSpans":[{{"resource":{head},"scopeSpans":[{{"scope":{scope},"spans":[{body}]}}]}}]}}'.encode()
+
+
+# ========================
+# EXPORTERS
+# ========================
+
+class OTLPHttpExporter:
+    def __init__(self, endpoint: str, service_name: str, resource_attributes: dict = None, headers: dict = None,
+                 timeout: float = 10.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.resource_attributes = resource_attributes
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.timeout = timeout
+
+    def export(self, spans) -> bool:
+        body = encode_spans(spans, self.service_name, self.resource_attributes)
+        request = urllib.request.Request(self.url, data=body, headers=self.headers, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return 200 <= response.status < 300
+        except OSError as e:
+            logger.warning(f"OTLP export to {self.url} failed: {e}")
+            return False
+
+
+class FileExporter:
+    def __init__(self, path: str, service_name: str, resource_attributes: dict = None):
+        self.path = path
+        self.service_name = service_name
+        self.resource_attributes = resource_attributes
+
+    def export(self, spans) -> bool:
+        line = encode_spans(spans, self.service_name, self.resource_attributes) + b"\n"
+        try:
+            with open(self.path, "ab") as f:
+                f.write(line)
+            return True
+        except OSError as e:
+            logger.warning(f"Trace export to {self.path} failed: {e}")
+            return False
+
+
+class InMemoryExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans) -> bool:
+        self.spans.extend(spans)
+        return True
+
+    def clear(self):
+        self.spans = []
+
+
+# ========================
+# BATCH SPAN PROCESSOR
+# ========================
+
+class BatchSpanProcessor:
+    def __init__(self, exporter, tail_latency: float = None, max_queue_size: int = 2048,
+                 max_export_batch_size: int = 512, schedule_delay: float = 5.0, metric_prefix: str = None):
+        self.exporter = exporter
+        self.tail_latency = tail_latency
+        self.max_queue_size = max_queue_size
+        self.max_export_batch_size = max_export_batch_size
+        self.schedule_delay = schedule_delay
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._export_lock = threading.Lock()
+        self._thread = None
+        self._spans = Counter(
+            f"{metric_prefix}_trace_spans_total",
+            "Finished spans by outcome (exported, sampled_out, dropped, failed)",
+            ["outcome"]
+        ) if metric_prefix else None
+
+    def _count(self, outcome: str, n: int):
+        if self._spans is not None and n:
+            self._spans.labels(outcome).inc(n)
+
+    def _sampled(self, root, spans) -> bool:
+        trace = root.trace
+        if trace.sampled or trace.keep:
+            return True
+        if self.tail_latency is not None and root.end_ns - root.start_ns >= self.tail_latency * 1e9:
+            return True
+        return any("error" in span.attributes for span in spans)
+
+    def on_end(self, span):
+        trace = span.trace
+        if not span.local_root:
+            trace.spans.append(span)
+            return
+        spans = trace.spans
+        spans.append(span)
+        trace.spans = []
+        if not self._sampled(span, spans):
+            self._count("sampled_out", len(spans))
+            return
+        if len(self._queue) + len(spans) > self.max_queue_size:
+            self._count("dropped", len(spans))
+            return
+        self._queue.extend(spans)
+        if len(self._queue) >= self.max_export_batch_size:
+            self._wake.set()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping:
+            self._wake.wait(self.schedule_delay)
+            self._wake.clear()
+            self._export_all()
+
+    def _export_all(self):
+        with self._export_lock:
+            while self._queue:
+                batch = []
+                while self._queue and len(batch) < self.max_export_batch_size:
+                    batch.append(self._queue.popleft())
+                try:
+                    ok = self.exporter.export(batch)
+                except Exception as e:
+                    logger.error(f"Span export failed: {e}")
+                    ok = False
+                self._count("exported" if ok else "failed", len(batch))
+
+    def force_flush(self):
+        """Export everything queued so far (blocks the caller)"""
+        self._export_all()
+
+    def shutdown(self):
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.schedule_delay + 10)
+            self._thread = None
+        self._export_all()
+
+
+def setup_tracing(exporter: str, service_name: str, endpoint: str = "http://localhost:4318",
+                  file: str = "traces.jsonl", sample_ratio: float = 1.0, tail_latency: float = None,
+                  max_queue_size: int = 2048, max_export_batch_size: int = 512, schedule_delay: float = 5.0,
+                  resource_attributes: dict = None, metric_prefix: str = None):
+    """Register a BatchSpanProcessor for `exporter` (otlp, file, memory or none); None if tracing is off"""
+    set_sample_ratio(sample_ratio)
+    if exporter == "otlp":
+        span_exporter = OTLPHttpExporter(endpoint, service_name, resource_attributes)
+    elif exporter == "file":
+        span_exporter = FileExporter(file, service_name, resource_attributes)
+    elif exporter == "memory":
+        span_exporter = InMemoryExporter()
+    elif exporter == "none":
+        return None
+    else:
+        raise ValueError(f"Unknown traces exporter '{exporter}', expected otlp, file, memory or none")
+    processor = BatchSpanProcessor(
+        span_exporter,
+        tail_latency=tail_latency,
+        max_queue_size=max_queue_size,
+        max_export_batch_size=max_export_batch_size,
+        schedule_delay=schedule_delay,
+        metric_prefix=metric_prefix
+    )
+    add_span_processor(processor)
+    logger.info(f"Tracing: {exporter} exporter, head sampling {sample_ratio:.2%}, tail latency {tail_latency}")
+    return processor
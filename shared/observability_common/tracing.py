@@ -0,0 +1,171 @@
+"""
+Lightweight spans with W3C trace context
+
+A span is a few slots (ids, name, timestamps, attributes) kept in a ContextVar,
+so creating one costs about as much as a dict: every request gets one, and
+nothing is exported unless a span processor is registered (see otlp.py).
+Incoming `traceparent` headers are continued, and the current span can be
+written back to a response with `span.traceparent`.
+
+All spans of a trace share one _Trace object, which carries two decisions:
+
+- `sampled`: head sampling, taken when the trace starts. A caller's sampled
+  flag is followed, otherwise the trace ID is compared with the ratio set by
+  set_sample_ratio(), like OpenTelemetry's TraceIdRatioBased sampler.
+- `keep`: set by span.keep() while the trace runs (e.g. because a metric
+  exemplar now points to it), so tail sampling exports it anyway.
+
+A trace's spans are held until its local root ends. Work items of a long
+operation (the payments of a batch) should rather start their own trace with
+`link=` the operation's span: each is then sampled and exported on its own.
+"""
+
+import contextvars
+import random
+import time
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_span_processors = []
+
+# Traces whose lower 64 trace ID bits are below this bound are head-sampled
+_TRACE_ID_LIMIT = 2 ** 64
+_sample_bound = _TRACE_ID_LIMIT
+
+
+class _Trace:
+    # IDs are kept as ints and only formatted as hex when read
+    __slots__ = ("id", "sampled", "keep", "spans")
+
+    def __init__(self, trace_id: int, sampled: bool):
+        self.id = trace_id
+        self.sampled = sampled
+        self.keep = False
+        self.spans = []  # finished non-root spans, buffered by the span processor
+
+    @property
+    def trace_id(self) -> str:
+        return f"{self.id:032x}"
+
+
+class Span:
+    __slots__ = ("name", "trace", "id", "parent", "kind", "local_root", "start_ns", "end_ns",
+                 "attributes", "links", "_token")
+
+    def __init__(self, name: str, trace: _Trace, parent: int = None, attributes: dict = None,
+                 kind: str = "internal", local_root: bool = True, start_ns: int = None, links: tuple = ()):
+        self.name = name
+        self.trace = trace
+        self.id = random.getrandbits(64)
+        self.parent = parent
+        self.kind = kind
+        self.local_root = local_root
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes if attributes is not None else {}
+        self.links = links  # (trace ID, span ID) of related spans in other traces
+        self._token = None
+
+    @property
+    def trace_id(self) -> str:
+        return f"{self.trace.id:032x}"
+
+    @property
+    def span_id(self) -> str:
+        return f"{self.id:016x}"
+
+    @property
+    def parent_id(self):
+        return f"{self.parent:016x}" if self.parent is not None else None
+
+    @property
+    def duration(self) -> float:
+        """Seconds, up to now while the span is open"""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    @property
+    def traceparent(self) -> str:
+        sampled = self.trace.sampled or self.trace.keep
+        return f"00-{self.trace.id:032x}-{self.id:016x}-{'01' if sampled else '00'}"
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def keep(self):
+        self.trace.keep = True
+
+    def end(self, end_ns: int = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        for processor in _span_processors:
+            processor.on_end(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.attributes.setdefault("error", type(exc).__name__)
+        self.end()
+        _current_span.reset(self._token)
+        return False
+
+
+def parse_traceparent(header: str):
+    """(trace ID, parent span ID, sampled) as ints from a version-00 traceparent, or None"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        trace_id, span_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+    if not trace_id or not span_id:
+        return None
+    return trace_id, span_id, bool(flags & 1)
+
+
+def start_span(name: str, traceparent: str = None, attributes: dict = None, kind: str = "internal",
+               start_ns: int = None, link: Span = None) -> Span:
+    """Child of the current span, else of `traceparent`, else the root of a new trace; use as `with`
+
+    With `link`, always the root of a new trace that links to that span, and is
+    head-sampled if the span's trace is.
+    """
+    if link is not None:
+        trace = _Trace(random.getrandbits(128), link.trace.sampled)
+        return Span(name, trace, None, attributes, kind, True, start_ns, ((link.trace.id, link.id),))
+    parent = _current_span.get()
+    if parent is not None:
+        return Span(name, parent.trace, parent.id, attributes, kind, False, start_ns)
+    context = parse_traceparent(traceparent)
+    if context is not None:
+        trace_id, parent_id, sampled = context
+        return Span(name, _Trace(trace_id, sampled), parent_id, attributes, kind, True, start_ns)
+    bits = random.getrandbits(128)
+    trace = _Trace(bits, (bits & (_TRACE_ID_LIMIT - 1)) < _sample_bound)
+    return Span(name, trace, None, attributes, kind, True, start_ns)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_sample_ratio(ratio: float):
+    """Head sampling ratio for new traces (0.0 to 1.0)"""
+    global _sample_bound
+    if not 0.0 <= ratio <= 1.0:
+        raise ValueError("sample ratio must be between 0 and 1")
+    _sample_bound = round(ratio * _TRACE_ID_LIMIT)
+
+
+def add_span_processor(processor):
+    """`processor.on_end(span)` is called for every finished span"""
+    _span_processors.append(processor)
+
+
+def remove_span_processor(processor):
+    _span_processors.remove(processor)
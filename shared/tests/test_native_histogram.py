@@ -0,0 +1,162 @@
+"""
+Native histograms: bucket layout, resolution reduction and the protobuf encoding
+
+The exposition is decoded with a minimal protobuf reader and checked against
+io.prometheus.client.MetricFamily field numbers.
+
+    python -m pytest tests
+"""
+
+import os
+import struct
+import sys
+
+from prometheus_client import CollectorRegistry, Counter, Histogram
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from observability_common.native_histogram import (  # noqa: E402
+    NativeHistogram, accepts_protobuf, bucket_index, generate_protobuf)
+
+
+def varint(data: bytes, pos: int) -> tuple:
+    value, shift = 0, 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+
+def fields(data: bytes) -> dict:
+    """field number -> list of values (int, float or bytes)"""
+    out, pos = {}, 0
+    while pos < len(data):
+        key, pos = varint(data, pos)
+        field, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = varint(data, pos)
+        elif wire_type == 1:
+            value, pos = struct.unpack("<d", data[pos:pos + 8])[0], pos + 8
+        elif wire_type == 2:
+            length, pos = varint(data, pos)
+            value, pos = data[pos:pos + length], pos + length
+        else:
+            raise AssertionError(f"unexpected wire type {wire_type}")
+        out.setdefault(field, []).append(value)
+    return out
+
+
+def families(data: bytes) -> dict:
+    """name -> decoded MetricFamily, from length-delimited messages"""
+    out, pos = {}, 0
+    while pos < len(data):
+        length, pos = varint(data, pos)
+        family = fields(data[pos:pos + length])
+        pos += length
+        out[family[1][0].decode()] = family
+    return out
+
+
+def labels(metric: dict) -> dict:
+    pairs = (fields(pair) for pair in metric.get(1, []))
+    return {pair[1][0].decode(): pair[2][0].decode() for pair in pairs}
+
+
+def native_buckets(histogram: dict) -> dict:
+    """Absolute bucket index -> count, from the positive spans and deltas"""
+    indices, key = [], None
+    for span in histogram.get(12, []):
+        span = fields(span)
+        offset, length = unzigzag(span[1][0]), span[2][0]
+        key = offset if key is None else key + offset
+        for _ in range(length):
+            indices.append(key)
+            key += 1
+    buckets, count = {}, 0
+    for index, delta in zip(indices, histogram.get(13, [])):
+        count += unzigzag(delta)
+        buckets[index] = count
+    return buckets
+
+
+def test_bucket_index():
+    # Schema 0: buckets (2**(i-1), 2**i]
+    assert [bucket_index(v, 0) for v in (0.75, 1, 1.5, 2, 3, 1024)] == [0, 0, 1, 1, 2, 10]
+    # Schema 3: 8 buckets per power of two
+    assert bucket_index(2, 3) == 8
+    assert bucket_index(2.0001, 3) == 9
+    assert bucket_index(0.5, 3) == -8
+
+
+def test_native_histogram_encoding():
+    registry = CollectorRegistry()
+    histogram = NativeHistogram("latency_seconds", "Latency", ["route"], schema=0, registry=registry)
+    for value in (0.0, 1.0, 1.5, 2.0, 3.0, 1024.0):
+        histogram.labels("/pay").observe(value)
+
+    family = families(generate_protobuf(registry))["latency_seconds"]
+    assert family[2] == [b"Latency"]
+    assert family[3] == [4]  # HISTOGRAM
+    (metric,) = (fields(m) for m in family[4])
+    assert labels(metric) == {"route": "/pay"}
+    data = fields(metric[7][0])
+    assert data[1] == [6]  # sample_count
+    assert data[2] == [sum((1.0, 1.5, 2.0, 3.0, 1024.0))]
+    assert unzigzag(data[5][0]) == 0  # schema
+    assert data[7] == [1]  # zero_count
+    assert native_buckets(data) == {0: 1, 1: 2, 2: 1, 10: 1}
+
+
+def test_max_buckets_lowers_the_schema():
+    registry = CollectorRegistry()
+    histogram = NativeHistogram("h", "h", schema=3, max_buckets=4, registry=registry)
+    child = histogram.labels()
+    for value in (1.0, 1.1, 1.3, 1.5, 1.7, 1.9):
+        child.observe(value)
+    schema, _, _, count, _, buckets = child.snapshot()
+    assert schema < 3 and len(buckets) <= 4
+    assert count == sum(buckets.values()) == 6
+    expected = {}
+    for value in (1.0, 1.1, 1.3, 1.5, 1.7, 1.9):
+        key = bucket_index(value, schema)
+        expected[key] = expected.get(key, 0) + 1
+    assert buckets == expected
+
+
+def test_classic_metrics_encoding():
+    registry = CollectorRegistry()
+    counter = Counter("payments", "Payments", ["status"], registry=registry)
+    counter.labels("success").inc(3)
+    classic = Histogram("size_bytes", "Size", buckets=(10, 100), registry=registry)
+    classic.observe(5)
+    classic.observe(50)
+
+    decoded = families(generate_protobuf(registry))
+    assert "payments_created" not in decoded
+    counter_family = decoded["payments_total"]
+    assert counter_family[3] == [0]  # COUNTER
+    (metric,) = (fields(m) for m in counter_family[4])
+    assert labels(metric) == {"status": "success"}
+    assert fields(metric[3][0])[1] == [3.0]
+
+    (metric,) = (fields(m) for m in decoded["size_bytes"][4])
+    data = fields(metric[7][0])
+    assert data[1] == [2] and data[2] == [55.0]
+    buckets = [fields(b) for b in data[3]]
+    assert [(b[1][0], b[2][0]) for b in buckets] == [(1, 10.0), (2, 100.0)]  # cumulative, +Inf omitted
+    assert 5 not in data  # no native fields on a classic histogram
+
+
+def test_accepts_protobuf():
+    assert accepts_protobuf("application/vnd.google.protobuf; proto=io.prometheus.client.MetricFamily; "
+                            "encoding=delimited;q=0.7,text/plain;version=0.0.4;q=0.3")
+    assert not accepts_protobuf("text/plain;version=0.0.4")
+    assert not accepts_protobuf("")
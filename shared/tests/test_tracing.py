@@ -0,0 +1,52 @@
+"""
+Linked spans: one trace per batch item, exported when the item ends
+
+    python -m pytest tests
+"""
+
+import json
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from observability_common.otlp import BatchSpanProcessor, InMemoryExporter, encode_spans  # noqa: E402
+from observability_common.tracing import add_span_processor, remove_span_processor, start_span  # noqa: E402
+
+
+def test_linked_span_starts_its_own_trace():
+    with start_span("batch") as batch:
+        with start_span("child") as child:
+            pass
+        with start_span("item", link=batch) as item:
+            pass
+    assert child.trace is batch.trace
+    assert item.trace is not batch.trace and item.trace.id != batch.trace.id
+    assert item.parent is None and item.local_root
+    assert item.links == ((batch.trace.id, batch.id),)
+    assert item.trace.sampled == batch.trace.sampled
+
+    (encoded,) = json.loads(encode_spans([item], "test"))["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert encoded["links"] == [{"traceId": batch.trace_id, "spanId": batch.span_id}]
+    assert encoded["traceId"] == item.trace_id and "parentSpanId" not in encoded
+    (encoded,) = json.loads(encode_spans([child], "test"))["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert "links" not in encoded
+
+
+def test_linked_items_are_not_held_until_the_batch_ends():
+    exporter = InMemoryExporter()
+    processor = BatchSpanProcessor(exporter, tail_latency=0.0)
+    add_span_processor(processor)
+    try:
+        with start_span("batch") as batch:
+            for i in range(3):
+                with start_span("item", link=batch):
+                    pass
+            assert batch.trace.spans == []
+            processor.force_flush()
+            assert [span.name for span in exporter.spans] == ["item"] * 3
+        processor.force_flush()
+        assert [span.name for span in exporter.spans] == ["item"] * 3 + ["batch"]
+    finally:
+        remove_span_processor(processor)